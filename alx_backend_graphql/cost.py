@@ -0,0 +1,164 @@
+"""
+Static cost and depth analysis of GraphQL documents.
+
+The analysis runs on the parsed and validated document, before anything is
+executed. Every field that returns an object costs 1, multiplied by the
+number of times it can be resolved: connection fields multiply their
+``edges`` by the requested page size (``first``/``last``, capped at the
+server maximum) and plain list fields by ``list_weight``. Scalars are free.
+"""
+from graphql import (
+    GraphQLError,
+    get_named_type,
+    is_composite_type,
+    is_list_type,
+    is_non_null_type,
+)
+from graphql.execution.values import get_argument_values
+from graphql.language import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+)
+
+
+class QueryCostError(GraphQLError):
+    """
+    Raised when a document exceeds the configured cost or depth budget.
+    """
+
+    def __init__(self, message, cost, depth, max_cost, max_depth):
+        super().__init__(
+            message,
+            extensions={
+                'code': 'QUERY_TOO_COMPLEX',
+                'cost': cost,
+                'depth': depth,
+                'maxCost': max_cost,
+                'maxDepth': max_depth,
+            },
+        )
+
+
+def _get_operation(document, operation_name):
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    if operation_name:
+        operations = [op for op in operations if op.name and op.name.value == operation_name]
+    return operations[0] if len(operations) == 1 else None
+
+
+class _Analyzer:
+
+    def __init__(self, schema, fragments, variables, max_page_size, list_weight):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+        self.max_page_size = max_page_size
+        self.list_weight = list_weight
+
+    def _page_size(self, field_def, node):
+        if 'first' not in field_def.args and 'last' not in field_def.args:
+            return None
+        try:
+            args = get_argument_values(field_def, node, self.variables)
+        except GraphQLError:
+            args = {}
+        requested = args.get('first') if args.get('first') is not None else args.get('last')
+        if requested is None:
+            return self.max_page_size
+        return max(0, min(requested, self.max_page_size))
+
+    def _fields(self, parent_type, selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, InlineFragmentNode):
+                type_ = parent_type
+                if selection.type_condition is not None:
+                    type_ = self.schema.get_type(selection.type_condition.name.value)
+                yield from self._fields(type_, selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is not None:
+                    type_ = self.schema.get_type(fragment.type_condition.name.value)
+                    yield from self._fields(type_, fragment.selection_set)
+
+    def selection_cost(self, parent_type, selection_set, page_size=None):
+        """
+        Return ``(cost, depth)`` of ``selection_set`` evaluated on ``parent_type``.
+        """
+        total_cost, max_depth = 0, 0
+        for type_, node in self._fields(parent_type, selection_set):
+            name = node.name.value
+            if name.startswith('__') or not hasattr(type_, 'fields') or name not in type_.fields:
+                continue
+            field_def = type_.fields[name]
+            named_type = get_named_type(field_def.type)
+            if not is_composite_type(named_type) or node.selection_set is None:
+                continue
+
+            field_type = field_def.type
+            if is_non_null_type(field_type):
+                field_type = field_type.of_type
+
+            child_page_size = self._page_size(field_def, node)
+            if child_page_size is not None:
+                multiplier = 1
+            elif is_list_type(field_type):
+                multiplier = page_size if name == 'edges' and page_size is not None else self.list_weight
+            else:
+                multiplier = 1
+
+            child_cost, child_depth = self.selection_cost(named_type, node.selection_set, child_page_size)
+            total_cost += multiplier * (1 + child_cost)
+            max_depth = max(max_depth, 1 + child_depth)
+        return total_cost, max_depth
+
+
+def analyze_query(schema, document, operation_name=None, variables=None, max_page_size=100, list_weight=None):
+    """
+    Compute ``(cost, depth)`` for the operation of ``document`` that will be
+    executed. ``schema`` is a ``graphql.GraphQLSchema``. Unbounded list fields
+    are weighted like a full page unless ``list_weight`` says otherwise.
+    """
+    operation = _get_operation(document, operation_name)
+    if operation is None:
+        return 0, 0
+    root_type = schema.get_root_type(operation.operation)
+    if root_type is None:
+        return 0, 0
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    analyzer = _Analyzer(
+        schema,
+        fragments,
+        variables,
+        max_page_size,
+        max_page_size if list_weight is None else list_weight,
+    )
+    return analyzer.selection_cost(root_type, operation.selection_set)
+
+
+def check_query_cost(schema, document, operation_name=None, variables=None,
+                     max_cost=None, max_depth=None, max_page_size=100, list_weight=None):
+    """
+    Analyze ``document`` and raise ``QueryCostError`` if it is over budget.
+    Returns ``(cost, depth)`` otherwise.
+    """
+    cost, depth = analyze_query(schema, document, operation_name, variables, max_page_size, list_weight)
+    if max_depth is not None and depth > max_depth:
+        raise QueryCostError(
+            f"Query depth {depth} exceeds the maximum depth of {max_depth}",
+            cost, depth, max_cost, max_depth,
+        )
+    if max_cost is not None and cost > max_cost:
+        raise QueryCostError(
+            f"Query cost {cost} exceeds the maximum cost of {max_cost}",
+            cost, depth, max_cost, max_depth,
+        )
+    return cost, depth
@@ -0,0 +1,113 @@
+"""
+Automatic persisted queries and the parsed/validated document cache.
+
+Clients following the Apollo APQ protocol send
+``extensions.persistedQuery.sha256Hash`` instead of (or together with) the
+query text. Documents that parsed and validated successfully are kept in a
+process-wide LRU keyed by that hash, so repeat requests skip both steps.
+Plain requests without a hash use the same cache, keyed by the hash of their
+query text.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql import GraphQLError
+
+DEFAULT_CACHE_SIZE = 1000
+
+APQ_VERSION = 1
+
+
+class PersistedQueryNotFound(GraphQLError):
+
+    def __init__(self):
+        super().__init__(
+            "PersistedQueryNotFound",
+            extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+        )
+
+
+class PersistedQueryMismatch(GraphQLError):
+
+    def __init__(self):
+        super().__init__(
+            "provided sha does not match query",
+            extensions={'code': 'PERSISTED_QUERY_HASH_MISMATCH'},
+        )
+
+
+def hash_query(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def get_persisted_query_hash(request, data):
+    """
+    Return the APQ hash sent with the request, or None.
+    """
+    extensions = request.GET.get('extensions') or data.get('extensions')
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    if not isinstance(extensions, dict):
+        return None
+    persisted = extensions.get('persistedQuery')
+    if not isinstance(persisted, dict) or persisted.get('version', APQ_VERSION) != APQ_VERSION:
+        return None
+    return persisted.get('sha256Hash')
+
+
+class DocumentCache:
+    """
+    Thread-safe LRU of validated ``DocumentNode`` objects with hit/miss counters.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                self.misses += 1
+                return None
+            self._documents.move_to_end(key)
+            self.hits += 1
+            return document
+
+    def set(self, key, document):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._documents),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+document_cache = DocumentCache(getattr(settings, 'CRM_PERSISTED_QUERY_CACHE_SIZE', DEFAULT_CACHE_SIZE))
@@ -5,7 +5,7 @@ class Query(CRMQuery, graphene.ObjectType):
     """
     Extend the CRM Query with additional fields if needed.
     """
-    pass
+    hello = graphene.String(default_value="Hello, GraphQL!", description="Minimal query for connectivity checks")
 
 
 class Mutation(CRMMutation, graphene.ObjectType):
@@ -62,7 +62,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'alx_backend_graphql_crm.urls'
+ROOT_URLCONF = 'alx_backend_graphql.urls'
 
 TEMPLATES = [
     {
@@ -80,7 +80,7 @@ TEMPLATES = [
     },
 ]
 
-WSGI_APPLICATION = 'alx_backend_graphql_crm.wsgi.application'
+WSGI_APPLICATION = 'alx_backend_graphql.wsgi.application'
 
 
 # Database
@@ -93,6 +93,42 @@ DATABASES = {
     }
 }
 
+# CRM_DATABASE_MODE=production switches to the production SQLite mode:
+# WAL and the pragmas below on every connection, persistent connections,
+# BEGIN IMMEDIATE with a busy timeout on the writer (crm/backends/sqlite3)
+# and queries on a read-only connection (crm/routers.py).
+CRM_DATABASE_MODE = os.environ.get('CRM_DATABASE_MODE', 'default')
+CRM_DATABASE_REPLICA = 'replica'
+CRM_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    # With WAL, NORMAL can only lose the last commits on power loss.
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative: KiB per connection.
+    'cache_size': -16000,
+    'temp_store': 'memory',
+}
+
+if CRM_DATABASE_MODE == 'production':
+    _database = {
+        'ENGINE': 'crm.backends.sqlite3',
+        'NAME': os.environ.get('CRM_DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    }
+    DATABASES = {
+        'default': dict(_database, OPTIONS={
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': CRM_SQLITE_PRAGMAS,
+        }),
+        CRM_DATABASE_REPLICA: dict(_database, OPTIONS={
+            'timeout': 20,
+            'pragmas': dict(CRM_SQLITE_PRAGMAS, query_only='on'),
+        }, TEST={'MIRROR': 'default'}),
+    }
+    DATABASE_ROUTERS = ['crm.routers.ReadWriteRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -136,7 +172,132 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 GRAPHENE = {
-    "SCHEMA": "alx_backend_graphql_crm.schema.schema"
+    "SCHEMA": "alx_backend_graphql.schema.schema",
+    # Per-field timing and SQL counts (see crm/instrumentation.py)
+    "MIDDLEWARE": ["crm.instrumentation.TracingMiddleware"],
+}
+
+# Requests carrying this header get Apollo tracing (per-resolver timings and
+# SQL per field) in the response `extensions`.
+CRM_TRACING_HEADER = 'X-CRM-Trace'
+
+# One JSON line per GraphQL operation on the `crm.graphql` logger, at INFO.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_line': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'graphql': {'class': 'logging.StreamHandler', 'formatter': 'json_line'},
+    },
+    'loggers': {
+        'crm.graphql': {
+            'handlers': ['graphql'],
+            'level': os.environ.get('CRM_GRAPHQL_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Hard upper bound on the page size of the allCustomers/allProducts/allOrders
+# connections, whatever `first`/`last` the client asks for.
+CRM_MAX_PAGE_SIZE = 100
+
+# Static query cost budget enforced by the /graphql/ view before execution.
+# List fields without `first`/`last` are weighted like a full page.
+CRM_MAX_QUERY_COST = 25000
+CRM_MAX_QUERY_DEPTH = 10
+
+# Number of parsed and validated documents kept by the persisted query cache.
+CRM_PERSISTED_QUERY_CACHE_SIZE = 1000
+
+# Rows per INSERT / IN (...) query in the bulk mutations (see crm/bulk.py).
+CRM_BULK_CHUNK_SIZE = 1000
+
+# UpdateLowStockProducts defaults: products with stock below the threshold
+# get the increment added to their stock. The partial low-stock index covers
+# stock < 10 (crm.models.LOW_STOCK_INDEX_THRESHOLD); another threshold cannot
+# use it, and `manage.py check` warns about it (crm.W001).
+CRM_LOW_STOCK_THRESHOLD = 10
+CRM_RESTOCK_INCREMENT = 10
+
+# Opt-in result cache for read-only queries (see crm/cache.py), disabled by
+# default. Entries are invalidated per model when a mutation commits; with
+# several processes (web workers, cron, Celery) use the 'django' backend over
+# a CACHES entry they all share (Redis, memcached) so they see the same model
+# versions, e.g.:
+# CRM_RESPONSE_CACHE = {
+#     'BACKEND': 'django',
+#     'TTL': 60,
+#     'FIELDS': ['allProducts', 'products'],
+# }
+CRM_RESPONSE_CACHE = None
+
+# Index behind the name/email filters and the `search` argument (see
+# crm/search.py): 'auto' uses the FTS5 trigram tables when the database has
+# them and plain icontains otherwise; 'fts5', 'ngram' or 'none' force a
+# backend. 'ngram' is an in-process index: only use it when a single process
+# writes customers and products, or renames elsewhere are missed until the
+# TTL below.
+CRM_SEARCH_BACKEND = 'auto'
+# Seconds before the in-process n-gram index is rebuilt from the database.
+CRM_SEARCH_NGRAM_TTL = 300
+
+# Rows fetched per database round trip by the /export/<resource>/ streams.
+CRM_EXPORT_CHUNK_SIZE = 2000
+
+# Default period, in days, of the crmReport query and the weekly report task.
+CRM_REPORT_DAYS = 7
+
+# cleanup_inactive_customers: customers without an order in this many days
+# are deleted, this many per transaction.
+CRM_INACTIVE_CUSTOMER_DAYS = 365
+CRM_CLEANUP_BATCH_SIZE = 500
+
+# How cron jobs and tasks run their GraphQL documents (see crm/executor.py):
+# 'inprocess' against the schema, or 'http' by POSTing to CRM_GRAPHQL_URL.
+CRM_JOB_EXECUTOR = 'inprocess'
+CRM_GRAPHQL_URL = 'http://localhost:8000/graphql/'
+
+# Order reminder pipeline (see crm/reminders.py): one reminder per customer
+# with orders in the last DAYS days, RATE sends per second over WORKERS
+# threads. Reruns resume from the WATERMARK file.
+CRM_REMINDERS = {
+    'SENDER': 'crm.reminders.FileSender',
+    'DAYS': 7,
+    'BATCH_SIZE': 500,
+    'WORKERS': 4,
+    'RATE': 10,
+    'RETRIES': 3,
+    'WATERMARK': '/tmp/order_reminders_watermark.json',
+}
+
+# Job log of the cron jobs and Celery tasks (see crm/joblog.py): JSON lines
+# per job in DIR, written in batches by a background thread every
+# FLUSH_INTERVAL seconds, rotated past MAX_BYTES or after ROTATE_SECONDS and
+# gzipped, keeping BACKUP_COUNT old files. Read with `manage.py job_logs`.
+CRM_JOB_LOG = {
+    'DIR': '/tmp/crm_job_logs',
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'ROTATE_SECONDS': 24 * 60 * 60,
+    'BACKUP_COUNT': 14,
+    'COMPRESS': True,
+    'FLUSH_INTERVAL': 1.0,
+}
+
+# /healthz and /readyz (see crm/health.py): check results are cached for
+# their TTL in seconds. Cron jobs record their runs in CRON_DIR and are
+# reported stale once the last run is older than CRON_MAX_AGE seconds.
+CRM_HEALTH = {
+    'DB_TTL': 5,
+    'BROKER_TTL': 15,
+    'BROKER_TIMEOUT': 0.5,
+    'CRON_DIR': '/tmp/crm_cron_runs',
+    'CRON_MAX_AGE': {
+        'log_crm_heartbeat': 15 * 60,
+        'update_low_stock': 13 * 60 * 60,
+    },
 }
 
 CRONJOBS = [
@@ -152,6 +313,10 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Preload the job modules and the GraphQL schema when a Celery worker starts
+# instead of on its first task (see crm/bootstrap.py).
+CRM_WORKER_WARM_START = True
+
 # Import crontab after TIME_ZONE is defined
 try:
     from celery.schedules import crontab
@@ -162,6 +327,10 @@ try:
             'task': 'crm.tasks.generate_crm_report',
             'schedule': crontab(day_of_week='mon', hour=6, minute=0),
         },
+        'reconcile-rollups': {
+            'task': 'crm.tasks.reconcile_rollups',
+            'schedule': crontab(hour=1, minute=30),
+        },
     }
 except ImportError:
     # Celery not installed yet, skip beat schedule
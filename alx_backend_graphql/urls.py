@@ -16,10 +16,16 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from crm.views import export, healthz, metrics, readyz
+from .views import AsyncCRMGraphQLView, CRMGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', csrf_exempt(CRMGraphQLView.as_view(graphiql=True))),
+    path('graphql/async/', csrf_exempt(AsyncCRMGraphQLView.as_view(graphiql=True))),
+    path('export/<str:resource>/', export, name='crm-export'),
+    path('metrics/', metrics, name='crm-metrics'),
+    path('healthz', healthz, name='crm-healthz'),
+    path('readyz', readyz, name='crm-readyz'),
 ]
@@ -0,0 +1,340 @@
+from collections import namedtuple
+from contextlib import nullcontext
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, parse, validate, validate_schema
+
+from crm.cache import get_cache_key, get_cached_response, set_cached_response
+from crm.instrumentation import finish_trace, start_trace, wants_tracing
+from crm.loaders import mark_async
+from crm.pagination import get_max_page_size
+from crm.routers import writer
+from .cost import QueryCostError, check_query_cost
+from .persisted_queries import (
+    PersistedQueryMismatch,
+    PersistedQueryNotFound,
+    document_cache,
+    get_persisted_query_hash,
+    hash_query,
+)
+
+DEFAULT_MAX_QUERY_COST = 25000
+DEFAULT_MAX_QUERY_DEPTH = 10
+
+# What CRMGraphQLView.prepare_graphql_request hands over to execution.
+PreparedRequest = namedtuple(
+    'PreparedRequest', ['schema', 'document', 'operation_ast', 'cache_key', 'cached', 'cost'],
+)
+
+
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView that serves automatic persisted queries from a cache of
+    validated documents, rejects over-budget documents before executing them,
+    answers cacheable reads from ``crm.cache`` and reports the computed cost
+    in the response ``extensions``.
+    """
+
+    def get_cost_limits(self):
+        return {
+            'max_cost': getattr(settings, 'CRM_MAX_QUERY_COST', DEFAULT_MAX_QUERY_COST),
+            'max_depth': getattr(settings, 'CRM_MAX_QUERY_DEPTH', DEFAULT_MAX_QUERY_DEPTH),
+            'max_page_size': get_max_page_size(),
+            'list_weight': getattr(settings, 'CRM_QUERY_LIST_WEIGHT', None),
+        }
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        prepared = self.prepare_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        if not isinstance(prepared, PreparedRequest):
+            return prepared
+        if prepared.cached is not None:
+            result = ExecutionResult(data=prepared.cached)
+        else:
+            result = self.execute_document(
+                request, prepared.schema, prepared.document, prepared.operation_ast, variables, operation_name
+            )
+        return self.finish_graphql_request(prepared, result)
+
+    def prepare_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """
+        Run everything that precedes execution: document lookup, the GET
+        mutation check, the cost budget and the response cache lookup.
+
+        Returns a ``PreparedRequest``, or the ``ExecutionResult`` (or None
+        for GraphiQL) to answer with when the request stops here.
+        """
+        query_hash = get_persisted_query_hash(request, data)
+        if not query and not query_hash:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, errors = self.get_document(schema, query, query_hash)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        limits = self.get_cost_limits()
+        try:
+            cost, depth = check_query_cost(schema, document, operation_name, variables, **limits)
+        except QueryCostError as e:
+            return ExecutionResult(
+                data=None,
+                errors=[e],
+                extensions={'cost': self.format_cost(e.extensions['cost'], e.extensions['depth'], limits)},
+            )
+
+        cache_key = get_cache_key(operation_ast, document, operation_name, variables)
+        cached = get_cached_response(cache_key) if cache_key else None
+        return PreparedRequest(schema, document, operation_ast, cache_key, cached, self.format_cost(cost, depth, limits))
+
+    def finish_graphql_request(self, prepared, result):
+        if prepared.cache_key and prepared.cached is None and not result.errors:
+            set_cached_response(prepared.cache_key, result.data)
+        result.extensions = dict(result.extensions or {}, cost=prepared.cost)
+        return result
+
+    def get_document(self, schema, query, query_hash=None):
+        """
+        Return ``(document, errors)`` for the request, parsing and validating
+        only when the document is not already in the cache.
+
+        A hash without query text must be a cache hit (Apollo APQ); a hash
+        sent with query text registers the query under that hash.
+        """
+        if query_hash and query and hash_query(query) != query_hash:
+            return None, [PersistedQueryMismatch()]
+
+        key = query_hash or hash_query(query)
+        document = document_cache.get(key)
+        if document is not None:
+            return document, None
+        if not query:
+            return None, [PersistedQueryNotFound()]
+
+        try:
+            document = parse(query)
+        except Exception as e:
+            return None, [e]
+
+        validation_errors = validate(
+            schema,
+            document,
+            self.validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        if validation_errors:
+            return None, validation_errors
+
+        document_cache.set(key, document)
+        return document, None
+
+    def execute_document(self, request, schema, document, operation_ast, variables, operation_name):
+        context = self.get_context(request)
+        start_trace(context, detailed=wants_tracing(request))
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name, context)
+            mutation = operation_ast is not None and operation_ast.operation == OperationType.MUTATION
+
+            # Mutations read and write through the writer connection (crm.routers).
+            with writer() if mutation else nullcontext():
+                if mutation and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                ):
+                    with transaction.atomic():
+                        result = execute(schema, document, **execute_options)
+                        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                            transaction.set_rollback(True)
+                else:
+                    result = execute(schema, document, **execute_options)
+        except Exception as e:
+            result = ExecutionResult(errors=[e])
+        return self.add_tracing(context, operation_name, result)
+
+    @staticmethod
+    def add_tracing(context, operation_name, result):
+        """
+        Close the trace of the operation (see crm.instrumentation) and put
+        it in the response ``extensions`` if the client asked for it.
+        """
+        trace = finish_trace(context, operation_name, errors=len(result.errors or ()))
+        if trace is not None and trace.detailed:
+            result.extensions = dict(result.extensions or {}, tracing=trace.as_apollo_tracing())
+        return result
+
+    def get_execute_options(self, request, variables, operation_name, context=None):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": context if context is not None else self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    @staticmethod
+    def format_cost(cost, depth, limits):
+        return {
+            'requestedQueryCost': cost,
+            'maximumAvailable': limits['max_cost'],
+            'depth': depth,
+            'maximumDepth': limits['max_depth'],
+        }
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.format_response(request, execution_result, id, show_graphiql)
+
+    def format_response(self, request, execution_result, id=None, show_graphiql=False):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """
+    CRMGraphQLView executed on the event loop, for ASGI servers.
+
+    Queries run with an async context (``crm.loaders.mark_async``): root
+    resolvers return coroutines using the async ORM, which graphql-core
+    awaits together, so sibling root fields resolve concurrently and no
+    thread is held while the database works. Mutations run the sync
+    ``execute_document`` in a worker thread, so they use the writer
+    connection and, only with ``ATOMIC_MUTATIONS``, ``transaction.atomic``
+    exactly as on the sync view. Parsing, validation, costing and the
+    response cache are shared with it too.
+    """
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            if self.batch:
+                responses = [await self.get_response_async(request, entry) for entry in data]
+                result = "[{}]".format(",".join(response[0] for response in responses))
+                status_code = max((response[1] for response in responses), default=200)
+            else:
+                result, status_code = await self.get_response_async(request, data)
+
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = await self.execute_graphql_request_async(request, data, query, variables, operation_name)
+        return self.format_response(request, execution_result, id)
+
+    async def execute_graphql_request_async(self, request, data, query, variables, operation_name):
+        # The response cache may be backed by a synchronous Django cache.
+        prepared = await sync_to_async(self.prepare_graphql_request)(request, data, query, variables, operation_name)
+        if not isinstance(prepared, PreparedRequest):
+            return prepared
+        if prepared.cached is not None:
+            result = ExecutionResult(data=prepared.cached)
+        else:
+            result = await self.execute_document_async(
+                request, prepared.schema, prepared.document, prepared.operation_ast, variables, operation_name
+            )
+        if prepared.cache_key:
+            return await sync_to_async(self.finish_graphql_request)(prepared, result)
+        return self.finish_graphql_request(prepared, result)
+
+    async def execute_document_async(self, request, schema, document, operation_ast, variables, operation_name):
+        if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+            return await sync_to_async(self.execute_document)(
+                request, schema, document, operation_ast, variables, operation_name
+            )
+        context = mark_async(self.get_context(request))
+        start_trace(context, detailed=wants_tracing(request))
+        try:
+            result = execute(schema, document, **self.get_execute_options(request, variables, operation_name, context))
+            if isawaitable(result):
+                result = await result
+        except Exception as e:
+            result = ExecutionResult(errors=[e])
+        return self.add_tracing(context, operation_name, result)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
+
+    def ready(self):
+        from . import checks, instrumentation, search  # noqa: F401 (checks registers on import)
+
+        search.connect_signals()
+        instrumentation.connect_signals()
@@ -0,0 +1,38 @@
+"""
+SQLite backend for the production database mode (see the DATABASES setting).
+
+It adds two ``OPTIONS`` to Django's backend:
+
+* ``pragmas``: ``{name: value}`` run on every new connection, in order, e.g.
+  ``journal_mode=wal`` so readers never wait for the writer;
+* ``transaction_mode``: ``'IMMEDIATE'`` starts ``atomic`` blocks with
+  ``BEGIN IMMEDIATE``. The write lock is then taken up front, where the
+  busy ``timeout`` applies, instead of on the first write of a deferred
+  transaction, where SQLite fails at once with "database is locked" to
+  avoid a deadlock with another writer.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = (self.settings_dict['OPTIONS'].get('transaction_mode') or 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"Unknown SQLite transaction_mode: {mode}")
+        self.cursor().execute(f'BEGIN {mode}')
@@ -0,0 +1,45 @@
+"""
+Benchmarks run through management commands (``benchmark_*``).
+"""
+import math
+import time
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile of ``samples`` (sorted), ``fraction`` in [0, 1].
+    """
+    if not samples:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(samples)))
+    return samples[rank - 1]
+
+
+def summarize(durations):
+    """
+    Latency figures, in milliseconds, and throughput of a list of
+    per-call durations in seconds.
+    """
+    samples = sorted(durations)
+    total = sum(samples)
+    return {
+        'count': len(samples),
+        'mean_ms': total / len(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'max_ms': samples[-1] * 1000 if samples else 0.0,
+        'per_second': len(samples) / total if total else 0.0,
+    }
+
+
+def timed(function, iterations):
+    """
+    Call ``function`` ``iterations`` times and return the durations.
+    """
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return durations
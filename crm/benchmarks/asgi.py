@@ -0,0 +1,142 @@
+"""
+Load test of the sync view under WSGI against the async view under ASGI.
+
+Both applications are driven in process, without a server or sockets:
+``requests`` POSTs of the same document are issued with at most
+``concurrency`` in flight, from a thread pool for WSGI (one thread per
+in-flight request, as a threaded WSGI server would) and from asyncio tasks
+on one event loop for ASGI (as uvicorn would). Latencies and the overall
+throughput are reported per mode.
+"""
+import asyncio
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from . import summarize
+
+# Sibling root fields: the async view resolves them concurrently.
+DEFAULT_QUERY = """
+    query Dashboard {
+        allCustomers(first: 20, orderBy: "-created_at") { edges { node { id name email } } }
+        allProducts(first: 20, orderBy: "stock") { edges { node { id name stock } } }
+        allOrders(first: 20, orderBy: "-order_date") {
+            edges { node { id totalAmount customer { name } items { quantity product { name } } } }
+        }
+    }
+"""
+
+PATHS = {
+    'wsgi': '/graphql/',
+    'asgi': '/graphql/async/',
+}
+
+
+def _wsgi_request(app, path, body):
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    started = time.perf_counter()
+    content = b''.join(app(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    elapsed = time.perf_counter() - started
+    return elapsed, statuses[0].startswith('200') and b'"errors"' not in content
+
+
+def run_wsgi(body, requests, concurrency):
+    from django.core.wsgi import get_wsgi_application
+
+    app = get_wsgi_application()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda _: _wsgi_request(app, PATHS['wsgi'], body), range(requests)))
+
+
+async def _asgi_request(app, path, body):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'headers': [
+            (b'host', b'127.0.0.1'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('127.0.0.1', 80),
+    }
+    pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    done = asyncio.Event()
+    response = {'status': None, 'body': b''}
+
+    async def receive():
+        if pending:
+            return pending.pop()
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+            if not message.get('more_body'):
+                done.set()
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    elapsed = time.perf_counter() - started
+    return elapsed, response['status'] == 200 and b'"errors"' not in response['body']
+
+
+def run_asgi(body, requests, concurrency):
+    from django.core.asgi import get_asgi_application
+
+    app = get_asgi_application()
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await _asgi_request(app, PATHS['asgi'], body)
+
+        return await asyncio.gather(*(one() for _ in range(requests)))
+
+    return asyncio.run(main())
+
+
+RUNNERS = {
+    'wsgi': run_wsgi,
+    'asgi': run_asgi,
+}
+
+
+def load_test(query=DEFAULT_QUERY, requests=200, concurrency=16, modes=('wsgi', 'asgi')):
+    """
+    Return ``{mode: summary}``; each summary adds ``throughput`` (requests per
+    wall-clock second) and ``failed`` to ``crm.benchmarks.summarize``.
+    """
+    body = json.dumps({'query': query}).encode()
+    results = {}
+    for mode in modes:
+        RUNNERS[mode](body, min(requests, concurrency), concurrency)  # warm up
+        started = time.perf_counter()
+        outcomes = RUNNERS[mode](body, requests, concurrency)
+        wall = time.perf_counter() - started
+        summary = summarize([elapsed for elapsed, ok in outcomes])
+        summary['throughput'] = len(outcomes) / wall if wall else 0.0
+        summary['failed'] = sum(1 for elapsed, ok in outcomes if not ok)
+        results[mode] = summary
+    return results
@@ -0,0 +1,83 @@
+"""
+In-process vs HTTP execution of the cron job documents.
+
+Each document is run ``warmup`` times untimed and then ``iterations``
+times per mode. Without a URL the HTTP mode starts the project's WSGI
+application on an ephemeral localhost port in a background thread, so the
+figures include request parsing, the view and JSON encoding but no network.
+"""
+import threading
+from contextlib import contextmanager
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from crm.executor import HTTPExecutor, InProcessExecutor
+from . import summarize, timed
+
+# name: (document, variables); the low-stock mutation would change the data.
+DOCUMENTS = {
+    'heartbeat': ("{ hello }", None),
+    'low_stock': ("""
+        query LowStock {
+            allProducts(filters: {lowStock: true}, first: 50) {
+                edges { node { id name stock } }
+            }
+        }
+    """, None),
+    'recent_orders': ("""
+        query RecentOrders {
+            allOrders(orderBy: "-order_date", first: 100) {
+                edges { node { id orderDate customer { email } } }
+            }
+        }
+    """, None),
+}
+
+
+class _QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def local_server():
+    """
+    Serve the project on ``127.0.0.1:<free port>`` for the duration of the
+    block and yield the /graphql/ URL.
+    """
+    from django.core.wsgi import get_wsgi_application
+
+    server = make_server('127.0.0.1', 0, get_wsgi_application(), WSGIServer, _QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}/graphql/'
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def _run(executor, iterations, warmup):
+    results = {}
+    for name, (query, variables) in DOCUMENTS.items():
+        run = lambda: executor.execute(query, variables)
+        timed(run, warmup)
+        results[name] = summarize(timed(run, iterations))
+    return results
+
+
+def benchmark_executors(iterations=200, warmup=10, url=None, modes=('inprocess', 'http')):
+    """
+    Return ``{mode: {document: summary}}`` (see ``crm.benchmarks.summarize``).
+    """
+    results = {}
+    if 'inprocess' in modes:
+        results['inprocess'] = _run(InProcessExecutor(), iterations, warmup)
+    if 'http' in modes:
+        if url:
+            results['http'] = _run(HTTPExecutor(url), iterations, warmup)
+        else:
+            with local_server() as local_url:
+                results['http'] = _run(HTTPExecutor(local_url), iterations, warmup)
+    return results
@@ -0,0 +1,123 @@
+"""
+Deterministic benchmark data.
+
+``seed_database`` fills the CRM tables through the bulk paths (so the
+search index and the rollups are built as in production), chunk by chunk
+so that a million rows never sit in memory at once: the orders pick their
+customers and products by offset into the id ranges just created, never
+from a list of ids. The same ``scale`` and ``seed`` always produce the
+same rows, whatever the day: order dates are spread before the fixed
+``REFERENCE_TIME``.
+"""
+import datetime
+import random
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from crm.bulk import bulk_create_customers, bulk_create_orders, bulk_create_products
+from crm.models import Customer, Product, Order, OrderItem, DailyStats, CustomerStats, ProductStats
+from crm.search import get_backend
+
+# name: (customers, products, orders)
+SCALES = {
+    'tiny': (1_000, 200, 2_000),
+    'small': (10_000, 10_000, 10_000),
+    'medium': (100_000, 100_000, 100_000),
+    'large': (1_000_000, 1_000_000, 1_000_000),
+}
+
+CHUNK_SIZE = 10_000
+
+# Orders are spread over this many days before REFERENCE_TIME.
+ORDER_DAYS = 365
+REFERENCE_TIME = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def get_volumes(scale):
+    if scale not in SCALES:
+        raise ValueError(f"Unknown scale: {scale} (choose from {', '.join(SCALES)})")
+    return SCALES[scale]
+
+
+def current_volumes():
+    return (Customer.objects.count(), Product.objects.count(), Order.objects.count())
+
+
+def reset_database():
+    """
+    Delete every CRM row, leaving the schema in place.
+    """
+    with transaction.atomic():
+        for model in (OrderItem, Order.products.through, Order, DailyStats, CustomerStats, ProductStats, Customer, Product):
+            model.objects.all().delete()
+    get_backend().rebuild()
+
+
+def _last_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def _id_range(model, after, count):
+    """
+    The ``(first, last)`` ids of the ``count`` rows just created after id
+    ``after``; they are contiguous since the seeder is the only writer.
+    """
+    ids = model.objects.filter(pk__gt=after).aggregate(first=Min('pk'), last=Max('pk'), count=Count('pk'))
+    if ids['count'] != count or ids['last'] - ids['first'] + 1 != count:
+        raise RuntimeError(f"{model.__name__} ids are not contiguous; seed an empty database (--reset)")
+    return ids['first'], ids['last']
+
+
+def _chunks(total):
+    for start in range(0, total, CHUNK_SIZE):
+        yield start, min(start + CHUNK_SIZE, total)
+
+
+def seed_database(scale='small', seed=42, progress=None):
+    """
+    Create the ``scale`` volumes of customers, products and orders. Each
+    order has one to three lines over random products.
+    """
+    customers, products, orders = get_volumes(scale)
+    rng = random.Random(seed)
+
+    last_customer, last_product = _last_pk(Customer), _last_pk(Product)
+    for start, end in _chunks(customers):
+        bulk_create_customers([
+            SimpleNamespace(name=f"Customer {i}", email=f"customer{i}@bench.example.com", phone=f"+1555{i:07d}")
+            for i in range(start, end)
+        ], chunk_size=CHUNK_SIZE)
+        if progress:
+            progress('customers', end, customers)
+
+    for start, end in _chunks(products):
+        bulk_create_products([
+            SimpleNamespace(
+                name=f"Product {i}",
+                price=Decimal(rng.randrange(100, 50_000)) / 100,
+                stock=rng.randrange(0, 200),
+                description=None,
+            )
+            for i in range(start, end)
+        ], chunk_size=CHUNK_SIZE)
+        if progress:
+            progress('products', end, products)
+
+    first_customer, last_customer = _id_range(Customer, last_customer, customers)
+    first_product, last_product = _id_range(Product, last_product, products)
+    product_ids = range(first_product, last_product + 1)
+    for start, end in _chunks(orders):
+        bulk_create_orders([
+            SimpleNamespace(
+                customer_id=rng.randint(first_customer, last_customer),
+                product_ids=rng.sample(product_ids, rng.randint(1, min(3, len(product_ids)))),
+                items=None,
+                order_date=REFERENCE_TIME - datetime.timedelta(seconds=rng.randrange(ORDER_DAYS * 86400)),
+            )
+            for _ in range(start, end)
+        ], chunk_size=CHUNK_SIZE)
+        if progress:
+            progress('orders', end, orders)
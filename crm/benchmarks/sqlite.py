@@ -0,0 +1,82 @@
+"""
+Reader/writer concurrency on the configured database.
+
+``readers`` threads run the filtered ``allOrders`` page of the suite while
+``writers`` threads place orders, all for ``seconds`` seconds; the figures
+are kept per role. Run it once per database mode to compare them::
+
+    python manage.py benchmark_sqlite
+    CRM_DATABASE_MODE=production python manage.py benchmark_sqlite
+
+With the default rollback journal every write blocks the readers and a
+deferred transaction that cannot upgrade to a write fails at once with
+"database is locked"; in production mode (WAL, ``BEGIN IMMEDIATE``, the
+read-only replica) readers keep going while orders are written.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, router
+
+from crm.executor import InProcessExecutor
+from .suite import ALL_ORDERS, CREATE_ORDER, _Samples, order_fixture, order_input
+
+
+def describe_database():
+    """
+    The settings that matter for concurrency: mode, journal mode and routing.
+    """
+    with connections['default'].cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal_mode = cursor.fetchone()[0]
+    return {
+        'mode': getattr(settings, 'CRM_DATABASE_MODE', 'default'),
+        'engine': settings.DATABASES['default']['ENGINE'],
+        'journal_mode': journal_mode,
+        'routers': [type(r).__name__ for r in router.routers],
+    }
+
+
+def benchmark_concurrency(readers=8, writers=2, seconds=10.0, seed=42):
+    """
+    Return ``{'database': ..., 'readers': figures, 'writers': figures}``
+    (see ``crm.benchmarks.suite``).
+    """
+    executor = InProcessExecutor()
+    read_variables = {'minTotal': '100', 'first': 50}
+    executor.execute(ALL_ORDERS, read_variables)
+    samples = {'readers': _Samples(), 'writers': _Samples()}
+
+    def run(role, call):
+        try:
+            while time.perf_counter() < deadline:
+                samples[role].measure(call)
+        finally:
+            connections.close_all()
+
+    with order_fixture(random.Random(f'{seed}-concurrency')) as (customer_ids, product_ids):
+        threads = [
+            threading.Thread(target=run, args=('readers', lambda: executor.execute(ALL_ORDERS, read_variables)))
+            for _ in range(readers)
+        ]
+        for i in range(writers):
+            rng = random.Random(f'{seed}-writer-{i}')
+            threads.append(threading.Thread(target=run, args=(
+                'writers',
+                lambda rng=rng: executor.execute(CREATE_ORDER, {'input': order_input(rng, customer_ids, product_ids)}),
+            )))
+        started = time.perf_counter()
+        deadline = started + seconds
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+    return {
+        'database': describe_database(),
+        **{role: role_samples.result(wall, threads=readers if role == 'readers' else writers)
+           for role, role_samples in samples.items()},
+    }
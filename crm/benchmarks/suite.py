@@ -0,0 +1,374 @@
+"""
+Benchmark suite for the GraphQL hot paths, run in process against the
+schema (``crm.executor.InProcessExecutor``) on data made by
+``crm.benchmarks.seed``.
+
+Scenarios:
+
+* ``all_orders``: a filtered ``allOrders`` page with nested customer and
+  products;
+* ``bulk_create_customers``: ``bulkCreateCustomers`` with ``bulk_rows``
+  new customers per call;
+* ``create_order``: ``createOrder`` from ``concurrency`` threads at once;
+* ``update_low_stock``: ``updateLowStockProducts`` after a (untimed) step
+  that drops the stock of 1% of the products below the threshold.
+
+Every scenario records latency percentiles, throughput (operations per
+second of wall time), SQL statements per operation, errors and the peak
+RSS of the process so far. Mutating scenarios undo their changes once
+timed, so consecutive runs see the same data. ``run_suite`` returns a dict
+that ``write_results`` saves as JSON and ``compare_results`` diffs against
+an earlier file.
+"""
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+
+from crm.executor import GraphQLExecutionError, InProcessExecutor
+from crm.models import Customer, Order, Product
+from crm.rollups import forget_orders
+from . import summarize
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ('all_orders', 'bulk_create_customers', 'create_order', 'update_low_stock')
+
+# Figures compared by compare_results, and whether higher is better.
+COMPARED = {
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'throughput': True,
+    'sql_per_op': False,
+    'peak_rss_mb': False,
+}
+
+ALL_ORDERS = """
+    query BenchAllOrders($minTotal: Decimal, $first: Int) {
+        allOrders(filters: {totalAmount_Gte: $minTotal}, orderBy: "-order_date", first: $first) {
+            edges { node { id orderDate totalAmount customer { name email } products { name price } } }
+        }
+    }
+"""
+
+BULK_CREATE_CUSTOMERS = """
+    mutation BenchBulkCreateCustomers($input: [CustomerInput]!) {
+        bulkCreateCustomers(input: $input) { customers { id } errors }
+    }
+"""
+
+CREATE_ORDER = """
+    mutation BenchCreateOrder($input: OrderInput!) {
+        createOrder(input: $input) { order { id totalAmount } }
+    }
+"""
+
+UPDATE_LOW_STOCK = """
+    mutation BenchUpdateLowStock($threshold: Int, $increment: Int) {
+        updateLowStockProducts(threshold: $threshold, increment: $increment) { message }
+    }
+"""
+
+# Products kept in stock for create_order, and customers placing the orders.
+ORDER_PRODUCTS = 100
+ORDER_CUSTOMERS = 100
+LOW_STOCK_THRESHOLD = 10
+
+
+class _QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def peak_rss_mb():
+    """
+    High-water mark of the process resident set size, or None.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class _Samples:
+    """
+    Durations, SQL counts and errors of the calls of one scenario, from
+    any number of threads.
+    """
+
+    def __init__(self):
+        self.durations = []
+        self.queries = 0
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def measure(self, call):
+        counter = _QueryCounter()
+        error = None
+        with ExitStack() as stack:
+            # Reads may be routed to another alias (crm.routers).
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            started = time.perf_counter()
+            try:
+                call()
+            except GraphQLExecutionError as e:
+                error = str(e)
+            duration = time.perf_counter() - started
+        with self._lock:
+            self.durations.append(duration)
+            self.queries += counter.count
+            if error is not None:
+                self.errors.append(error)
+
+    def result(self, wall_seconds, **extra):
+        operations = len(self.durations)
+        return {
+            **summarize(self.durations),
+            'wall_seconds': wall_seconds,
+            'throughput': operations / wall_seconds if wall_seconds else 0.0,
+            'sql_queries': self.queries,
+            'sql_per_op': self.queries / operations if operations else 0.0,
+            'errors': len(self.errors),
+            'first_error': self.errors[0] if self.errors else None,
+            'peak_rss_mb': peak_rss_mb(),
+            **extra,
+        }
+
+
+def _timed_calls(samples, calls):
+    started = time.perf_counter()
+    for call in calls:
+        samples.measure(call)
+    return time.perf_counter() - started
+
+
+def all_orders(executor, rng, iterations, page_size=50, **options):
+    variables = {'minTotal': '100', 'first': page_size}
+    executor.execute(ALL_ORDERS, variables)
+    samples = _Samples()
+    wall = _timed_calls(samples, [lambda: executor.execute(ALL_ORDERS, variables)] * iterations)
+    return samples.result(wall, page_size=page_size)
+
+
+def bulk_create_customers(executor, rng, iterations, bulk_rows=10_000, **options):
+    token = f'{rng.getrandbits(32):08x}'
+    batches = [
+        [
+            {'name': f"Bench {batch} {i}", 'email': f"bench-{token}-{batch}-{i}@bench.example.com", 'phone': None}
+            for i in range(bulk_rows)
+        ]
+        for batch in range(iterations)
+    ]
+    samples = _Samples()
+    try:
+        wall = _timed_calls(samples, [
+            lambda batch=batch: executor.execute(BULK_CREATE_CUSTOMERS, {'input': batch}) for batch in batches
+        ])
+    finally:
+        Customer.objects.filter(email__startswith=f'bench-{token}-').delete()
+    rows = bulk_rows * iterations
+    return samples.result(wall, rows=bulk_rows, rows_per_second=rows / wall if wall else 0.0)
+
+
+def _restore_stock(stock):
+    products = [Product(pk=pk, stock=value) for pk, value in stock.items()]
+    Product.objects.bulk_update(products, ['stock'], batch_size=500)
+
+
+@contextmanager
+def order_fixture(rng):
+    """
+    Create buyers and stock up a sample of products for placing orders;
+    yield ``(customer_ids, product_ids)``. On exit the buyers and their
+    orders are deleted (and taken out of the rollups) and the stock is
+    restored.
+    """
+    token = f'{rng.getrandbits(32):08x}'
+    customers = Customer.objects.bulk_create([
+        Customer(name=f"Bench buyer {i}", email=f"buyer-{token}-{i}@bench.example.com")
+        for i in range(ORDER_CUSTOMERS)
+    ])
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    product_ids = rng.sample(product_ids, min(ORDER_PRODUCTS, len(product_ids)))
+    stock = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock'))
+    Product.objects.filter(pk__in=product_ids).update(stock=1_000_000)
+    try:
+        yield [customer.pk for customer in customers], product_ids
+    finally:
+        buyers = Customer.objects.filter(email__startswith=f'buyer-{token}-')
+        forget_orders(Order.objects.filter(customer__in=buyers))
+        buyers.delete()
+        _restore_stock(stock)
+
+
+def order_input(rng, customer_ids, product_ids):
+    return {
+        'customerId': rng.choice(customer_ids),
+        'items': [
+            {'productId': pk, 'quantity': rng.randint(1, 3)}
+            for pk in rng.sample(product_ids, rng.randint(1, min(3, len(product_ids))))
+        ],
+    }
+
+
+def create_order(executor, rng, iterations, concurrency=8, **options):
+    samples = _Samples()
+    with order_fixture(rng) as (customer_ids, product_ids):
+        calls = [
+            lambda input=order_input(rng, customer_ids, product_ids): executor.execute(CREATE_ORDER, {'input': input})
+            for _ in range(iterations)
+        ]
+        if concurrency <= 1:
+            wall = _timed_calls(samples, calls)
+        else:
+            def worker(share):
+                try:
+                    _timed_calls(samples, share)
+                finally:
+                    connections.close_all()
+
+            threads = [threading.Thread(target=worker, args=(calls[i::concurrency],)) for i in range(concurrency)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - started
+    return samples.result(wall, concurrency=concurrency)
+
+
+def update_low_stock(executor, rng, iterations, **options):
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    count = max(1, len(product_ids) // 100) if product_ids else 0
+    samples = _Samples()
+    wall = 0.0
+    for _ in range(iterations):
+        # Untimed: make 1% of the products low on stock, remembering the
+        # stock of every product the mutation is about to top up.
+        low = rng.sample(product_ids, count)
+        stock = dict(Product.objects.filter(stock__lt=LOW_STOCK_THRESHOLD).values_list('pk', 'stock'))
+        stock.update(Product.objects.filter(pk__in=low).values_list('pk', 'stock'))
+        Product.objects.filter(pk__in=low).update(stock=0)
+        try:
+            wall += _timed_calls(samples, [
+                lambda: executor.execute(UPDATE_LOW_STOCK, {'threshold': LOW_STOCK_THRESHOLD, 'increment': 1})
+            ])
+        finally:
+            _restore_stock(stock)
+    return samples.result(wall, products=count)
+
+
+SCENARIO_FUNCTIONS = {
+    'all_orders': all_orders,
+    'bulk_create_customers': bulk_create_customers,
+    'create_order': create_order,
+    'update_low_stock': update_low_stock,
+}
+
+DEFAULT_ITERATIONS = {
+    'all_orders': 100,
+    'bulk_create_customers': 3,
+    'create_order': 200,
+    'update_low_stock': 20,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(scenarios=SCENARIOS, iterations=None, seed=42, scale=None, progress=None, **options):
+    """
+    Run ``scenarios`` and return ``{'meta': ..., 'scenarios': {name: figures}}``.
+    ``iterations`` maps scenario names to call counts; ``options`` (e.g.
+    ``concurrency``, ``bulk_rows``) are passed to every scenario.
+    """
+    iterations = {**DEFAULT_ITERATIONS, **(iterations or {})}
+    executor = InProcessExecutor()
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'database': connection.vendor,
+            'database_mode': getattr(settings, 'CRM_DATABASE_MODE', 'default'),
+            'scale': scale,
+            'seed': seed,
+            'volumes': {
+                'customers': Customer.objects.count(),
+                'products': Product.objects.count(),
+                'orders': Order.objects.count(),
+            },
+            'options': options,
+        },
+        'scenarios': {},
+    }
+    for name in scenarios:
+        if name not in SCENARIO_FUNCTIONS:
+            raise ValueError(f"Unknown scenario: {name} (choose from {', '.join(SCENARIOS)})")
+        # Each scenario gets its own generator so that skipping one does
+        # not change the data the others use.
+        rng = random.Random(f'{seed}-{name}')
+        results['scenarios'][name] = SCENARIO_FUNCTIONS[name](executor, rng, iterations[name], **options)
+        if progress:
+            progress(name, results['scenarios'][name])
+    return results
+
+
+def write_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def read_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current):
+    """
+    Return ``(scenario, figure, before, after, change)`` rows for the
+    figures in ``COMPARED``; ``change`` is the relative change, positive
+    when the figure got better.
+    """
+    rows = []
+    for name, figures in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        for figure, higher_is_better in COMPARED.items():
+            old, new = before.get(figure), figures.get(figure)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            rows.append((name, figure, old, new, change if higher_is_better else -change))
+    return rows
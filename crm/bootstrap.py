@@ -0,0 +1,72 @@
+"""
+Lazy Django initialization for the job entry points (crm.cron, crm.tasks,
+crm/cron_jobs) and the warm start of Celery workers.
+
+Importing a job module neither configures Django nor imports models, the
+GraphQL schema or ``requests``: jobs are wrapped in ``entry_point``, which
+sets Django up on first call when the process has not done so already
+(``manage.py``, django-crontab and the Celery worker all have), and import
+what they need inside the job.
+
+``warm_start`` does the expensive part of a cold start ahead of the first
+task: it imports the job modules and builds and validates the GraphQL
+schema. The Celery worker calls it once before forking its pool, so every
+child inherits the result (``CRM_WORKER_WARM_START``).
+"""
+import functools
+import os
+import threading
+
+SETTINGS_MODULE = 'alx_backend_graphql.settings'
+
+_warm_lock = threading.Lock()
+_warm = False
+
+
+def setup():
+    """
+    Configure Django unless it already is.
+    """
+    from django.apps import apps
+
+    if not apps.ready:
+        import django
+
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', SETTINGS_MODULE)
+        django.setup()
+
+
+def entry_point(func):
+    """
+    Make ``func`` callable from a process where Django is not set up yet.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        setup()
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def warm_start():
+    """
+    Import the job modules and build the GraphQL schema, once per process.
+    Returns whether this call did the work.
+    """
+    global _warm
+    with _warm_lock:
+        if _warm:
+            return False
+        setup()
+        from django.conf import settings
+
+        if not getattr(settings, 'CRM_WORKER_WARM_START', True):
+            return False
+        from graphql.type import assert_valid_schema
+
+        from . import cleanup, joblog, reminders, reports, rollups  # noqa: F401
+        from .executor import get_executor
+
+        assert_valid_schema(get_executor('inprocess').schema.graphql_schema)
+        _warm = True
+        return True
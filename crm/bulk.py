@@ -0,0 +1,211 @@
+"""
+Set-based bulk insert paths used by the bulk mutations.
+
+Rows are validated in memory, uniqueness is checked with one ``IN (...)``
+query per chunk instead of one SELECT per row, and rows are written with
+chunked ``bulk_create``. Each chunk is written inside its own savepoint: if
+it hits an IntegrityError (e.g. a concurrent insert of the same email) only
+that chunk is retried row by row, and just the offending rows are reported.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import Customer, Product, Order, OrderItem
+from .orders import OrderPlacementError, get_order_lines
+from .rollups import record_orders
+from .search import index_objects
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def get_chunk_size(chunk_size=None):
+    return chunk_size or getattr(settings, 'CRM_BULK_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _insert_chunks(model, objs, chunk_size, describe):
+    """
+    ``bulk_create`` ``objs`` chunk by chunk and return ``(created, errors)``.
+    """
+    created, errors = [], []
+    for chunk in chunked(objs, chunk_size):
+        try:
+            with transaction.atomic():
+                created.extend(model.objects.bulk_create(chunk))
+            continue
+        except IntegrityError:
+            pass
+        for obj in chunk:
+            try:
+                with transaction.atomic():
+                    obj.save(force_insert=True)
+                created.append(obj)
+            except IntegrityError as e:
+                errors.append(f"{describe(obj)}: {e}")
+    return created, errors
+
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _existing_ids(queryset, ids, chunk_size, *fields):
+    """
+    Look up ``ids`` with one ``pk__in`` query per chunk. Returns a dict of
+    pk to the requested ``fields`` (or to True when none are requested).
+    """
+    found = {}
+    for chunk in chunked(sorted(ids), chunk_size):
+        if fields:
+            for pk, *values in queryset.filter(pk__in=chunk).values_list('pk', *fields):
+                found[pk] = values[0] if len(values) == 1 else values
+        else:
+            found.update((pk, True) for pk in queryset.filter(pk__in=chunk).values_list('pk', flat=True))
+    return found
+
+
+def bulk_create_customers(rows, chunk_size=None):
+    """
+    Create customers from ``rows`` (objects with ``name``, ``email`` and
+    ``phone``) and return ``(customers, errors)``.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    errors = []
+    candidates = {}
+
+    for row in rows:
+        customer = Customer(name=row.name, email=row.email, phone=row.phone)
+        try:
+            customer.full_clean(validate_unique=False, validate_constraints=False)
+        except ValidationError as e:
+            errors.append(f"Error creating customer {row.name}: {e}")
+            continue
+        if customer.email in candidates:
+            errors.append(f"Error creating customer {row.name}: Email {customer.email} is duplicated in this batch")
+            continue
+        candidates[customer.email] = customer
+
+    existing = set()
+    for emails in chunked(list(candidates), chunk_size):
+        existing.update(Customer.objects.filter(email__in=emails).values_list('email', flat=True))
+    for email in existing:
+        customer = candidates.pop(email)
+        errors.append(f"Error creating customer {customer.name}: Email {email} already exists")
+
+    with transaction.atomic():
+        customers, insert_errors = _insert_chunks(
+            Customer,
+            list(candidates.values()),
+            chunk_size,
+            lambda customer: f"Error creating customer {customer.name}",
+        )
+        # bulk_create sends no post_save, so index the new rows here
+        index_objects(Customer, customers)
+    return customers, errors + insert_errors
+
+
+def bulk_create_products(rows, chunk_size=None):
+    """
+    Create products from ``rows`` (objects with ``name``, ``price``, ``stock``
+    and optionally ``description``) and return ``(products, errors)``.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    errors = []
+    candidates = []
+
+    for row in rows:
+        stock = row.stock if row.stock is not None else 0
+        product = Product(name=row.name, description=row.description or '', price=row.price, stock=stock)
+        try:
+            if row.price is None or row.price <= 0:
+                raise ValidationError("Price must be positive")
+            if stock < 0:
+                raise ValidationError("Stock cannot be negative")
+            product.full_clean(validate_unique=False, validate_constraints=False)
+        except ValidationError as e:
+            errors.append(f"Error creating product {row.name}: {e}")
+            continue
+        candidates.append(product)
+
+    with transaction.atomic():
+        products, insert_errors = _insert_chunks(
+            Product,
+            candidates,
+            chunk_size,
+            lambda product: f"Error creating product {product.name}",
+        )
+        index_objects(Product, products)
+    return products, errors + insert_errors
+
+
+def bulk_create_orders(rows, chunk_size=None):
+    """
+    Create orders from ``rows`` (objects with ``customer_id``, ``product_ids``
+    and optionally ``order_date``) and return ``(orders, errors)``.
+
+    All referenced customers and products are resolved up front with one
+    query per chunk of IDs, totals are computed in memory from the fetched
+    prices, and both the orders and their ``OrderItem`` lines are written
+    with chunked ``bulk_create``. Backfilled orders do not reserve stock but
+    are added to the rollups.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    rows = list(rows)
+    errors = []
+
+    customer_ids = {_parse_id(row.customer_id) for row in rows} - {None}
+    product_ids = {
+        _parse_id(pk)
+        for row in rows
+        for pk in [*(row.product_ids or []), *(item.product_id for item in row.items or [])]
+    } - {None}
+    customers = _existing_ids(Customer.objects.all(), customer_ids, chunk_size)
+    prices = _existing_ids(Product.objects.all(), product_ids, chunk_size, 'price')
+
+    orders, order_lines = [], []
+    for index, row in enumerate(rows):
+        label = f"Error creating order {index}"
+        customer_id = _parse_id(row.customer_id)
+        if customer_id not in customers:
+            errors.append(f"{label}: Customer not found")
+            continue
+        try:
+            lines = get_order_lines(row.product_ids, row.items)
+        except OrderPlacementError as e:
+            errors.append(f"{label}: {e}")
+            continue
+        if any(pk not in prices for pk in lines):
+            errors.append(f"{label}: Some product IDs are invalid")
+            continue
+        order = Order(
+            customer_id=customer_id,
+            total_amount=sum(prices[pk] * quantity for pk, quantity in lines.items()),
+        )
+        if row.order_date:
+            order.order_date = row.order_date
+        orders.append(order)
+        order_lines.append(lines)
+
+    with transaction.atomic():
+        created = []
+        for chunk in chunked(orders, chunk_size):
+            created.extend(Order.objects.bulk_create(chunk))
+        items = [
+            OrderItem(order_id=order.pk, product_id=pk, quantity=quantity, unit_price=prices[pk])
+            for order, lines in zip(created, order_lines)
+            for pk, quantity in lines.items()
+        ]
+        OrderItem.objects.bulk_create(items, batch_size=chunk_size)
+        record_orders(
+            (order, [(pk, quantity, prices[pk]) for pk, quantity in lines.items()])
+            for order, lines in zip(created, order_lines)
+        )
+    return created, errors
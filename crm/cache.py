@@ -0,0 +1,224 @@
+"""
+Opt-in result cache for read-only GraphQL queries.
+
+A cached response is keyed by the normalized document, the operation name,
+the variables (which carry any filter input) and the current *version* of
+every model the root fields read. Mutations call ``invalidate_models`` and
+the versions of the models they wrote are bumped once the transaction
+commits, so later reads miss the old entries instead of serving them.
+
+Writes that do not go through ``invalidate_models`` (raw SQL, another
+application) are only picked up when entries expire after ``TTL``.
+
+Enable it with ``CRM_RESPONSE_CACHE`` in settings, e.g.::
+
+    CRM_RESPONSE_CACHE = {
+        'BACKEND': 'django',         # CACHES[CACHE_ALIAS], or 'locmem'
+        'TTL': 60,
+        'MAX_ENTRIES': 1000,
+        'FIELDS': ['allProducts', 'products'],
+    }
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from graphql import OperationType, print_ast
+from graphql.language import FieldNode
+
+from .models import Customer, Product, Order
+
+# Models each cacheable root field reads, directly or through nested types.
+ROOT_FIELD_MODELS = {
+    'customers': (Customer,),
+    'products': (Product,),
+    'orders': (Order, Customer, Product),
+    'allCustomers': (Customer,),
+    'allProducts': (Product,),
+    'allOrders': (Order, Customer, Product),
+    'crmReport': (Order, Customer, Product),
+    'customerLifetimeValue': (Order, Customer),
+}
+
+
+class LocMemResponseCache:
+    """
+    In-process LRU with a per-entry TTL. Entries and model versions live in
+    this process only: a write made by another process (a second web
+    worker, a cron job, a Celery task) does not bump them, so its readers
+    may be served stale entries for up to ``TTL``. Use it with a single
+    process; otherwise use ``DjangoResponseCache`` over a shared cache.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, labels):
+        with self._lock:
+            return [self._versions.get(label, 0) for label in labels]
+
+    def bump_version(self, label):
+        with self._lock:
+            self._versions[label] = self._versions.get(label, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class DjangoResponseCache:
+    """
+    Stores entries and model versions in one of Django's ``CACHES``, which
+    makes invalidation visible to every process sharing that cache.
+    """
+    version_prefix = 'crm:response-cache:version:'
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    def get_versions(self, labels):
+        keys = [self.version_prefix + label for label in labels]
+        versions = self.cache.get_many(keys)
+        return [versions.get(key, 0) for key in keys]
+
+    def bump_version(self, label):
+        key = self.version_prefix + label
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, None)
+
+    def clear(self):
+        self.cache.clear()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_config():
+    return getattr(settings, 'CRM_RESPONSE_CACHE', None)
+
+
+def get_backend():
+    """
+    Return the configured backend, or None when the cache is disabled.
+    """
+    global _backend
+    config = get_config()
+    if not config:
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if config.get('BACKEND', 'locmem') == 'django':
+                    _backend = DjangoResponseCache(config.get('CACHE_ALIAS', 'default'))
+                else:
+                    _backend = LocMemResponseCache(config.get('MAX_ENTRIES', 1000))
+    return _backend
+
+
+def reset_backend():
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def _model_label(model):
+    return model._meta.label_lower
+
+
+def invalidate_models(*models):
+    """
+    Bump the cache version of ``models`` once the current transaction commits
+    (immediately when there is none).
+    """
+    backend = get_backend()
+    if backend is None:
+        return
+    labels = sorted({_model_label(model) for model in models})
+
+    def bump():
+        for label in labels:
+            backend.bump_version(label)
+
+    transaction.on_commit(bump)
+
+
+def get_cache_key(operation, document, operation_name, variables):
+    """
+    Return the cache key for ``operation``, or None if it is not cacheable.
+    """
+    config = get_config()
+    backend = get_backend()
+    if backend is None or operation is None or operation.operation != OperationType.QUERY:
+        return None
+
+    allowed = set(config.get('FIELDS', ROOT_FIELD_MODELS))
+    labels = set()
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, FieldNode):
+            return None
+        name = selection.name.value
+        if name == '__typename':
+            continue
+        if name not in allowed or name not in ROOT_FIELD_MODELS:
+            return None
+        labels.update(_model_label(model) for model in ROOT_FIELD_MODELS[name])
+
+    labels = sorted(labels)
+    payload = json.dumps(
+        {
+            'query': print_ast(document),
+            'operation': operation_name,
+            'variables': variables or {},
+            'versions': dict(zip(labels, backend.get_versions(labels))),
+        },
+        sort_keys=True,
+        cls=DjangoJSONEncoder,
+    )
+    return 'crm:response-cache:' + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_response(key):
+    return get_backend().get(key)
+
+
+def set_cached_response(key, data):
+    get_backend().set(key, data, get_config().get('TTL', 60))
@@ -1,8 +1,9 @@
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 
 # Set the default Django settings module for the 'celery' program.
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql.settings')
 
 app = Celery('crm')
 
@@ -19,3 +20,14 @@ app.autodiscover_tasks()
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
+
+
+@worker_init.connect
+@worker_process_init.connect
+def warm_start(**kwargs):
+    # Once before the prefork pool forks, so the children inherit the loaded
+    # schema; in a child (or a pool that does not fork) it runs only if the
+    # parent did not. See crm.bootstrap.
+    from .bootstrap import warm_start
+
+    warm_start()
@@ -0,0 +1,22 @@
+"""
+System checks for settings that must agree with the schema.
+"""
+from django.core.checks import Warning, register
+
+from .inventory import get_low_stock_threshold
+from .models import LOW_STOCK_INDEX_THRESHOLD
+
+
+@register()
+def check_low_stock_threshold(app_configs, **kwargs):
+    threshold = get_low_stock_threshold()
+    if threshold == LOW_STOCK_INDEX_THRESHOLD:
+        return []
+    return [
+        Warning(
+            f"CRM_LOW_STOCK_THRESHOLD is {threshold} but the partial index crm_product_low_stock_idx "
+            f"covers stock < {LOW_STOCK_INDEX_THRESHOLD}, so low-stock queries cannot use it.",
+            hint="Change crm.models.LOW_STOCK_INDEX_THRESHOLD to match and run makemigrations.",
+            id='crm.W001',
+        )
+    ]
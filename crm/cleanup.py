@@ -0,0 +1,130 @@
+"""
+Batched deletion of inactive customers.
+
+A customer is inactive when they have placed no order in the last
+``days`` days (including customers who never ordered). Each batch is
+selected with one anti-join, ``NOT EXISTS (SELECT 1 FROM crm_order ...)``,
+keyset-paged by id, and deleted in its own short transaction: order lines
+and orders with one set-based DELETE each, then the customers themselves.
+Nothing is cascaded in Python, and no write lock is held for longer than
+one batch, so the SQLite writer is never blocked for the whole run.
+
+A customer who orders while the cleanup runs is never deleted: the batch
+is selected inside its transaction (``SELECT ... FOR UPDATE`` where the
+database supports it, so new orders for those customers wait for the
+batch) and inactivity is checked again right before the deletes. On
+SQLite the transaction reads one snapshot, and a write committed by
+another connection in between makes the batch fail instead of deleting
+the new order. Cached responses are invalidated for every batch.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .cache import invalidate_models
+from .models import Customer, Order, OrderItem
+from .rollups import forget_orders
+
+DEFAULT_INACTIVE_DAYS = 365
+DEFAULT_BATCH_SIZE = 500
+
+
+def get_inactive_days():
+    return getattr(settings, 'CRM_INACTIVE_CUSTOMER_DAYS', DEFAULT_INACTIVE_DAYS)
+
+
+def get_cleanup_batch_size():
+    return getattr(settings, 'CRM_CLEANUP_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def inactive_customers(cutoff):
+    """
+    Customers without an order placed on or after ``cutoff``.
+    """
+    recent_orders = Order.objects.filter(customer=OuterRef('pk'), order_date__gte=cutoff)
+    return Customer.objects.filter(~Exists(recent_orders))
+
+
+def _delete_batch(ids, cutoff):
+    """
+    Delete those of the customers ``ids`` still inactive at ``cutoff``
+    with their orders; return the customer and order counts.
+    """
+    # Orders committed since the batch was selected are visible to this query.
+    ids = list(inactive_customers(cutoff).filter(pk__in=ids).values_list('pk', flat=True))
+    if not ids:
+        return 0, 0
+    qn = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    order_table = qn(Order._meta.db_table)
+    order_pk = qn(Order._meta.pk.column)
+    order_customer = qn(Order._meta.get_field('customer').column)
+    item_table = qn(OrderItem._meta.db_table)
+    item_order = qn(OrderItem._meta.get_field('order').column)
+    forget_orders(Order.objects.filter(customer_id__in=ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {item_table} WHERE {item_order} IN "
+            f"(SELECT {order_pk} FROM {order_table} WHERE {order_customer} IN ({placeholders}))",
+            ids,
+        )
+        cursor.execute(f"DELETE FROM {order_table} WHERE {order_customer} IN ({placeholders})", ids)
+        order_count = cursor.rowcount
+    # Only the customers remain; their search index rows and stats go via the ORM.
+    Customer.objects.filter(pk__in=ids).delete()
+    invalidate_models(Customer, Order)
+    return len(ids), order_count
+
+
+def cleanup_inactive_customers(days=None, batch_size=None, dry_run=False, progress=None):
+    """
+    Delete (or with ``dry_run`` just count) the inactive customers in
+    batches of ``batch_size``. ``progress`` is called after every batch
+    with the running totals. Returns the totals: ``customers``, ``orders``,
+    ``batches``, ``seconds`` and ``rate`` (customers per second).
+    """
+    days = get_inactive_days() if days is None else days
+    batch_size = batch_size or get_cleanup_batch_size()
+    if batch_size <= 0:
+        raise ValueError("Batch size must be positive")
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = inactive_customers(cutoff).order_by('pk').values_list('pk', flat=True)
+
+    totals = {'customers': 0, 'orders': 0, 'batches': 0, 'dry_run': dry_run}
+    started = time.monotonic()
+    last_id = 0
+    while True:
+        if dry_run:
+            ids = list(candidates.filter(pk__gt=last_id)[:batch_size])
+            if not ids:
+                break
+            totals['customers'] += len(ids)
+            totals['orders'] += Order.objects.filter(customer_id__in=ids).count()
+        else:
+            with transaction.atomic():
+                ids = list(candidates.select_for_update().filter(pk__gt=last_id)[:batch_size])
+                if not ids:
+                    break
+                customer_count, order_count = _delete_batch(ids, cutoff)
+            totals['customers'] += customer_count
+            totals['orders'] += order_count
+        last_id = ids[-1]
+        totals['batches'] += 1
+        if progress:
+            progress(dict(totals, seconds=time.monotonic() - started))
+
+    totals['seconds'] = time.monotonic() - started
+    totals['rate'] = totals['customers'] / totals['seconds'] if totals['seconds'] else 0.0
+    return totals
+
+
+def format_cleanup(totals):
+    verb = "Would delete" if totals['dry_run'] else "Deleted"
+    return (
+        f"{verb} {totals['customers']} inactive customers ({totals['orders']} orders) "
+        f"in {totals['batches']} batches, {totals['seconds']:.2f}s, {totals['rate']:.1f} customers/s"
+    )
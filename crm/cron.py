@@ -1,125 +1,81 @@
-import os
-import sys
-import django
-from datetime import datetime
-import requests
-import json
+"""
+Entry points of the django-crontab jobs (``CRONJOBS`` in settings).
 
+Importing this module is cheap and has no side effects: Django is set up
+on first call if needed (see crm.bootstrap) and the executor, health
+checks and job log are imported inside the jobs.
+"""
+from .bootstrap import entry_point
+
+LOW_STOCK_MUTATION = """
+    mutation {
+        updateLowStockProducts {
+            updatedProducts {
+                id
+                name
+                stock
+            }
+            message
+        }
+    }
+"""
 
-sys.path.append('/home/leone/Coding/ProDevAlx/alx-backend-graphql_crm')
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
-django.setup()
 
+@entry_point
 def log_crm_heartbeat():
     """
-    Logs a heartbeat message to confirm CRM application health.
-    Optionally queries the GraphQL hello field to verify endpoint responsiveness.
+    Logs a heartbeat record to confirm CRM application health, with the
+    readiness checks of /readyz (database, Celery broker, cron job ages)
+    run in process.
     """
+    from . import health
+    from .joblog import job_run
 
-    timestamp = datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
-    
-
-    heartbeat_message = f"{timestamp} CRM is alive"
-    
-    try:
-        query = {
-            "query": "{ hello }"
-        }
-        
-        response = requests.post(
-            'http://localhost:8000/graphql',
-            json=query,
-            headers={'Content-Type': 'application/json'},
-            timeout=5
+    with job_run('log_crm_heartbeat') as run:
+        try:
+            report = health.readiness()
+        except Exception as e:
+            run.fail(f"Error running health checks: {e}")
+            run.log('heartbeat', message="CRM is alive")
+            return
+        checks = ', '.join(
+            f"{name} {check['status']}" + (f" ({check['error']})" if check.get('error') else '')
+            for name, check in report['checks'].items()
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'data' in data and 'hello' in data['data']:
-                heartbeat_message += " - GraphQL endpoint responsive"
-            else:
-                heartbeat_message += " - GraphQL endpoint error"
-        else:
-            heartbeat_message += f" - GraphQL endpoint returned status {response.status_code}"
-            
-    except requests.exceptions.RequestException as e:
-        heartbeat_message += f" - GraphQL endpoint unreachable: {str(e)}"
-    except Exception as e:
-        heartbeat_message += f" - Error testing GraphQL: {str(e)}"
-    
-    try:
-        with open('/tmp/crm_heartbeat_log.txt', 'a') as log_file:
-            log_file.write(heartbeat_message + '\n')
-    except Exception as e:
-        print(f"Failed to write heartbeat log: {str(e)}")
-        print(heartbeat_message)
+        run.log('heartbeat', message="CRM is alive", health=report['status'], checks=checks)
 
 
+@entry_point
 def update_low_stock():
     """
-    Executes the UpdateLowStockProducts mutation via GraphQL endpoint
-    and logs updated product names and new stock levels.
+    Executes the UpdateLowStockProducts mutation (in process by default,
+    see crm.executor) and logs updated product names and new stock levels
+    to the job log.
     """
-    # Get current timestamp
-    timestamp = datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
-    
-    try:
-        # GraphQL mutation to update low stock products
-        mutation = {
-            "query": """
-                mutation {
-                    updateLowStockProducts {
-                        updatedProducts {
-                            id
-                            name
-                            stock
-                        }
-                        message
-                    }
-                }
-            """
-        }
-        
-        response = requests.post(
-            'http://localhost:8000/graphql',
-            json=mutation,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
+    from .executor import ExecutorError, GraphQLExecutionError, get_executor
+    from .joblog import job_run
+
+    with job_run('update_low_stock') as run:
+        try:
+            data = get_executor().execute(LOW_STOCK_MUTATION)
+        except GraphQLExecutionError as e:
+            # Handle GraphQL errors
+            run.fail(f"GraphQL error: {e.errors[0]}")
+            return
+        except ExecutorError as e:
+            # Handle connection errors (HTTP mode)
+            run.fail(f"Connection error: {e}")
+            return
+        except Exception as e:
+            # Handle other errors
+            run.fail(f"Error: {e}")
+            return
+
+        result = data['updateLowStockProducts']
+        updated_products = result.get('updatedProducts') or []
+        run.count('products', len(updated_products))
+        run.log(
+            'restocked',
+            message=result.get('message', 'No message'),
+            products=[{'name': product['name'], 'stock': product['stock']} for product in updated_products],
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            if 'data' in data and 'updateLowStockProducts' in data['data']:
-                result = data['data']['updateLowStockProducts']
-                updated_products = result.get('updatedProducts', [])
-                message = result.get('message', 'No message')
-                
-                # Log the results
-                with open('/tmp/low_stock_updates_log.txt', 'a') as log_file:
-                    log_file.write(f"[{timestamp}] {message}\n")
-                    
-                    for product in updated_products:
-                        product_name = product['name']
-                        new_stock = product['stock']
-                        log_file.write(f"[{timestamp}] Updated product: {product_name}, New stock: {new_stock}\n")
-                
-            else:
-                # Handle GraphQL errors
-                error_message = data.get('errors', [{'message': 'Unknown GraphQL error'}])[0]['message']
-                with open('/tmp/low_stock_updates_log.txt', 'a') as log_file:
-                    log_file.write(f"[{timestamp}] GraphQL error: {error_message}\n")
-        
-        else:
-            # Handle HTTP errors
-            with open('/tmp/low_stock_updates_log.txt', 'a') as log_file:
-                log_file.write(f"[{timestamp}] HTTP error: Status {response.status_code}\n")
-    
-    except requests.exceptions.RequestException as e:
-        # Handle connection errors
-        with open('/tmp/low_stock_updates_log.txt', 'a') as log_file:
-            log_file.write(f"[{timestamp}] Connection error: {str(e)}\n")
-    except Exception as e:
-        # Handle other errors
-        with open('/tmp/low_stock_updates_log.txt', 'a') as log_file:
-            log_file.write(f"[{timestamp}] Error: {str(e)}\n")
\ No newline at end of file
@@ -1,60 +1,29 @@
 #!/usr/bin/env python3
-# filepath: /home/leone/Coding/ProDevAlx/alx-backend-graphql_crm/crm/cron_jobs/send_order_reminders.py
-
+"""
+Send the order reminders from cron: python crm/cron_jobs/send_order_reminders.py
+"""
 import os
 import sys
-import django
-from datetime import datetime, timedelta
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
-import json
+from io import StringIO
 
+# The project root, so that the script runs from any working directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-sys.path.append('/home/leone/Coding/ProDevAlx/alx-backend-graphql_crm')
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'graphql_crm.settings')
-django.setup()
 
 def main():
+    from crm.bootstrap import setup
+
+    setup()
+    from django.core.management import call_command
 
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    seven_days_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-    
-    transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-    client = Client(transport=transport, fetch_schema_from_transport=True)
-    
- 
-    query = gql("""
-        query GetRecentOrders($dateFilter: String!) {
-            orders(orderDate_Gte: $dateFilter) {
-                id
-                orderDate
-                customer {
-                    email
-                }
-            }
-        }
-    """)
-    
+    # The command records the run, its counts and failed sends in the job log.
     try:
-        variables = {"dateFilter": seven_days_ago}
-        result = client.execute(query, variable_values=variables)
-        
-        orders = result.get('orders', [])
-        
-        with open('/tmp/order_reminders_log.txt', 'a') as log_file:
-            for order in orders:
-                order_id = order['id']
-                customer_email = order['customer']['email']
-                log_entry = f"[{timestamp}] Order ID: {order_id}, Customer Email: {customer_email}\n"
-                log_file.write(log_entry)
-        
-        print("Order reminders processed!")
+        out = StringIO()
+        call_command('send_order_reminders', stdout=out)
+        print(f"Order reminders processed! {out.getvalue().strip()}")
         
     except Exception as e:
-        with open('/tmp/order_reminders_log.txt', 'a') as log_file:
-            log_file.write(f"[{timestamp}] Error processing reminders: {str(e)}\n")
         print(f"Error: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
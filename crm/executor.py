@@ -0,0 +1,175 @@
+"""
+GraphQL execution for scheduled jobs (cron, Celery, scripts).
+
+``InProcessExecutor`` runs documents directly against
+``alx_backend_graphql.schema.schema``: no web worker has to be up, jobs do
+not queue behind user traffic and nothing is serialized to JSON and back.
+Parsed and validated documents are shared with the /graphql/ view through
+the persisted query cache, so a job that runs the same document every few
+minutes parses it once per process.
+
+``HTTPExecutor`` keeps the old behaviour of POSTing to the endpoint, for
+jobs that run on a host without the application code or that should
+exercise the full HTTP stack. ``CRM_JOB_EXECUTOR`` picks the default.
+
+Both return the ``data`` dict and raise ``GraphQLExecutionError`` when the
+response carries errors, or ``ExecutorError`` when the endpoint cannot be
+reached.
+"""
+import threading
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import transaction
+from graphene_django.settings import graphene_settings
+from graphene_django.views import instantiate_middleware
+from graphql import OperationType, get_operation_ast, parse, validate
+from graphql import execute as execute_document
+
+from .instrumentation import finish_trace, start_trace
+from .routers import writer
+
+DEFAULT_GRAPHQL_URL = 'http://localhost:8000/graphql/'
+DEFAULT_HTTP_TIMEOUT = 10
+
+
+class ExecutorError(Exception):
+    """
+    The document could not be executed at all.
+    """
+
+
+class GraphQLExecutionError(ExecutorError):
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def make_context():
+    """
+    Return a fresh execution context. Pass the same one to several
+    ``execute`` calls of a job to share its DataLoader caches.
+    """
+    return SimpleNamespace()
+
+
+class InProcessExecutor:
+    mode = 'inprocess'
+
+    def __init__(self, schema=None):
+        self._schema = schema
+        self._lock = threading.Lock()
+
+    @property
+    def schema(self):
+        # Imported on first use so that importing a job module stays cheap.
+        if self._schema is None:
+            with self._lock:
+                if self._schema is None:
+                    from alx_backend_graphql.schema import schema
+
+                    self._schema = schema
+        return self._schema
+
+    def get_document(self, query):
+        from alx_backend_graphql.persisted_queries import document_cache, hash_query
+
+        key = hash_query(query)
+        document = document_cache.get(key)
+        if document is None:
+            try:
+                document = parse(query)
+            except Exception as e:
+                raise GraphQLExecutionError([str(e)])
+            errors = validate(self.schema.graphql_schema, document)
+            if errors:
+                raise GraphQLExecutionError([error.message for error in errors])
+            document_cache.set(key, document)
+        return document
+
+    def execute(self, query, variables=None, operation_name=None, context=None):
+        document = self.get_document(query)
+        operation = get_operation_ast(document, operation_name)
+        context = context if context is not None else make_context()
+        start_trace(context)
+        options = {
+            'context_value': context,
+            'variable_values': variables,
+            'operation_name': operation_name,
+            'middleware': list(instantiate_middleware(graphene_settings.MIDDLEWARE)),
+        }
+        if operation is not None and operation.operation == OperationType.MUTATION:
+            # A failed mutation leaves nothing behind, as with ATOMIC_MUTATIONS.
+            with writer(), transaction.atomic():
+                result = execute_document(self.schema.graphql_schema, document, **options)
+                if result.errors:
+                    transaction.set_rollback(True)
+        else:
+            result = execute_document(self.schema.graphql_schema, document, **options)
+        finish_trace(context, operation_name, errors=len(result.errors or ()))
+        if result.errors:
+            raise GraphQLExecutionError([error.message for error in result.errors])
+        return result.data
+
+
+class HTTPExecutor:
+    mode = 'http'
+
+    def __init__(self, url=None, timeout=None):
+        self.url = url or getattr(settings, 'CRM_GRAPHQL_URL', DEFAULT_GRAPHQL_URL)
+        self.timeout = timeout or DEFAULT_HTTP_TIMEOUT
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        return self._session
+
+    def execute(self, query, variables=None, operation_name=None, context=None):
+        import requests
+
+        payload = {'query': query, 'variables': variables, 'operationName': operation_name}
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise ExecutorError(f"GraphQL endpoint unreachable: {e}")
+        try:
+            body = response.json()
+        except ValueError:
+            raise ExecutorError(f"GraphQL endpoint returned status {response.status_code}")
+        if body.get('errors'):
+            raise GraphQLExecutionError([error.get('message', 'Unknown GraphQL error') for error in body['errors']])
+        if response.status_code != 200:
+            raise ExecutorError(f"GraphQL endpoint returned status {response.status_code}")
+        return body.get('data')
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(mode=None):
+    """
+    Return the shared executor for ``mode`` (default ``CRM_JOB_EXECUTOR``).
+    """
+    mode = mode or getattr(settings, 'CRM_JOB_EXECUTOR', InProcessExecutor.mode)
+    with _executors_lock:
+        if mode not in _executors:
+            if mode == InProcessExecutor.mode:
+                _executors[mode] = InProcessExecutor()
+            elif mode == HTTPExecutor.mode:
+                _executors[mode] = HTTPExecutor()
+            else:
+                raise ValueError(f"Unknown CRM_JOB_EXECUTOR: {mode}")
+        return _executors[mode]
+
+
+def execute(query, variables=None, operation_name=None, context=None, mode=None):
+    """
+    Run ``query`` with the default (or ``mode``) executor and return its data.
+    """
+    return get_executor(mode).execute(query, variables, operation_name, context)
@@ -1,14 +1,36 @@
 import django_filters
 from django.db.models import Q
+from django_filters.constants import EMPTY_VALUES
+from .inventory import get_low_stock_threshold
 from .models import Customer, Product, Order
+from . import search
+
+
+class SearchFilter(django_filters.CharFilter):
+    """
+    Case-insensitive partial match answered from the search index (see
+    crm.search). ``field_name`` may follow a relation, e.g. ``customer__name``;
+    the matching rows of the related model are then looked up first.
+    """
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        *path, field = self.field_name.split('__')
+        model = qs.model
+        for name in path:
+            model = model._meta.get_field(name).related_model
+        matching = search.contains(model, field, value)
+        if path:
+            return self.get_method(qs)(**{'__'.join(path) + '__in': matching})
+        return self.get_method(qs)(pk__in=matching)
 
 
 class CustomerFilter(django_filters.FilterSet):
     """
     Filter class for Customer model with various search options.
     """
-    name = django_filters.CharFilter(lookup_expr='icontains', help_text="Case-insensitive partial match for customer name")
-    email = django_filters.CharFilter(lookup_expr='icontains', help_text="Case-insensitive partial match for customer email")
+    name = SearchFilter(help_text="Case-insensitive partial match for customer name")
+    email = SearchFilter(help_text="Case-insensitive partial match for customer email")
     created_at__gte = django_filters.DateFilter(field_name='created_at', lookup_expr='gte', help_text="Filter customers created after this date")
     created_at__lte = django_filters.DateFilter(field_name='created_at', lookup_expr='lte', help_text="Filter customers created before this date")
     
@@ -19,6 +41,11 @@ class CustomerFilter(django_filters.FilterSet):
         model = Customer
         fields = ['name', 'email', 'created_at__gte', 'created_at__lte', 'phone_pattern']
     
+    # Fields allCustomers can be ordered by (each backed by a (field, id) index)
+    order_by_fields = ['name', 'email', 'created_at']
+    # Pattern filters no index can serve (see check_query_plans)
+    unindexed_filters = ['phone_pattern']
+    
     def filter_phone_pattern(self, queryset, name, value):
         """
         Custom filter method to match phone numbers with specific patterns.
@@ -32,7 +59,7 @@ class ProductFilter(django_filters.FilterSet):
     """
     Filter class for Product model with price and stock filtering.
     """
-    name = django_filters.CharFilter(lookup_expr='icontains', help_text="Case-insensitive partial match for product name")
+    name = SearchFilter(help_text="Case-insensitive partial match for product name")
     price__gte = django_filters.NumberFilter(field_name='price', lookup_expr='gte', help_text="Filter products with price greater than or equal to this value")
     price__lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte', help_text="Filter products with price less than or equal to this value")
     stock__gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte', help_text="Filter products with stock greater than or equal to this value")
@@ -40,18 +67,20 @@ class ProductFilter(django_filters.FilterSet):
     stock = django_filters.NumberFilter(field_name='stock', lookup_expr='exact', help_text="Filter products with exact stock amount")
     
     # Custom filter for low stock
-    low_stock = django_filters.BooleanFilter(method='filter_low_stock', help_text="Filter products with low stock (less than 10)")
+    low_stock = django_filters.BooleanFilter(method='filter_low_stock', help_text="Filter products with low stock (below CRM_LOW_STOCK_THRESHOLD)")
     
     class Meta:
         model = Product
         fields = ['name', 'price__gte', 'price__lte', 'stock__gte', 'stock__lte', 'stock', 'low_stock']
     
+    order_by_fields = ['name', 'price', 'stock', 'created_at']
+    
     def filter_low_stock(self, queryset, name, value):
         """
         Custom filter method to find products with low stock.
         """
         if value:
-            return queryset.filter(stock__lt=10)
+            return queryset.filter(stock__lt=get_low_stock_threshold())
         return queryset
 
 
@@ -65,8 +94,8 @@ class OrderFilter(django_filters.FilterSet):
     order_date__lte = django_filters.DateFilter(field_name='order_date', lookup_expr='lte', help_text="Filter orders created before this date")
     
     # Related field filters
-    customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains', help_text="Filter orders by customer name (case-insensitive partial match)")
-    product_name = django_filters.CharFilter(field_name='products__name', lookup_expr='icontains', help_text="Filter orders by product name (case-insensitive partial match)")
+    customer_name = SearchFilter(field_name='customer__name', help_text="Filter orders by customer name (case-insensitive partial match)")
+    product_name = SearchFilter(field_name='products__name', help_text="Filter orders by product name (case-insensitive partial match)")
     
     # Custom filter for specific product ID
     product_id = django_filters.NumberFilter(method='filter_by_product_id', help_text="Filter orders that include a specific product ID")
@@ -79,6 +108,8 @@ class OrderFilter(django_filters.FilterSet):
             'customer_name', 'product_name', 'product_id'
         ]
     
+    order_by_fields = ['total_amount', 'order_date']
+    
     def filter_by_product_id(self, queryset, name, value):
         """
         Custom filter method to find orders containing a specific product.
@@ -0,0 +1,177 @@
+"""
+Liveness and readiness checks behind ``/healthz`` and ``/readyz``.
+
+The checks skip GraphQL entirely and their results are cached per process
+for a few seconds (``CRM_HEALTH``), so a probe hitting the endpoints every
+second costs one ``SELECT 1`` and one broker connect per TTL; between
+refreshes a check is a clock read and a dict copy.
+
+* ``database``: ``SELECT 1`` on the default connection;
+* ``broker``: a TCP connect to ``CELERY_BROKER_URL``;
+* ``cron``: the age of the last run of each scheduled job, recorded by
+  ``crm.joblog.job_run`` with ``record_run`` as the mtime of one file per
+  job in ``CRON_DIR``. A job older than its ``CRON_MAX_AGE`` is ``stale``.
+
+``/healthz`` reports the database alone; ``/readyz`` reports every check
+and answers 503 when one of them is in error. A stale job does not make
+the process unready, it only marks it ``degraded``.
+"""
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DEFAULTS = {
+    'DB_TTL': 5,
+    'BROKER_TTL': 15,
+    'BROKER_TIMEOUT': 0.5,
+    'CRON_TTL': 5,
+    'CRON_DIR': '/tmp/crm_cron_runs',
+    'CRON_MAX_AGE': {},
+}
+
+# Ports of the broker schemes that have a default.
+BROKER_PORTS = {'redis': 6379, 'rediss': 6379, 'amqp': 5672, 'amqps': 5671}
+
+OK, ERROR, STALE, UNKNOWN = 'ok', 'error', 'stale', 'unknown'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CRM_HEALTH', {})}
+
+
+class CachedCheck:
+    """
+    Runs ``check`` at most once per ``ttl_key`` seconds (a ``CRM_HEALTH``
+    key) and returns a copy of the last result in between.
+    """
+
+    def __init__(self, check, ttl_key):
+        self.check = check
+        self.ttl_key = ttl_key
+        self._result = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, config):
+        now = time.monotonic()
+        if now >= self._expires:
+            # One thread refreshes; the others keep serving the last result.
+            if self._lock.acquire(blocking=self._result is None):
+                try:
+                    if now >= self._expires:
+                        try:
+                            self._result = self.check(config)
+                        except Exception as e:
+                            self._result = {'status': ERROR, 'error': str(e)}
+                        self._expires = time.monotonic() + config[self.ttl_key]
+                finally:
+                    self._lock.release()
+        return dict(self._result)
+
+    def clear(self):
+        self._expires = 0.0
+        self._result = None
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def check_database(config):
+    started = time.perf_counter()
+    try:
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except Exception as e:
+        return {'status': ERROR, 'error': str(e), 'ms': _elapsed_ms(started)}
+    return {'status': OK, 'ms': _elapsed_ms(started)}
+
+
+def check_broker(config):
+    url = getattr(settings, 'CELERY_BROKER_URL', None)
+    if not url:
+        return {'status': UNKNOWN, 'error': "CELERY_BROKER_URL is not set"}
+    parts = urlsplit(url)
+    port = parts.port or BROKER_PORTS.get(parts.scheme)
+    if not parts.hostname or not port:
+        return {'status': UNKNOWN, 'error': f"Cannot probe a {parts.scheme}:// broker"}
+    started = time.perf_counter()
+    try:
+        socket.create_connection((parts.hostname, port), timeout=config['BROKER_TIMEOUT']).close()
+    except OSError as e:
+        return {'status': ERROR, 'error': str(e) or type(e).__name__, 'ms': _elapsed_ms(started)}
+    return {'status': OK, 'ms': _elapsed_ms(started)}
+
+
+def record_run(job, config=None):
+    """
+    Record that ``job`` just ran (called by ``crm.joblog.job_run``).
+    """
+    directory = (config or get_config())['CRON_DIR']
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, job)
+    with open(path, 'a'):
+        os.utime(path)
+
+
+def check_cron(config):
+    now = time.time()
+    jobs = {}
+    try:
+        names = set(os.listdir(config['CRON_DIR']))
+    except FileNotFoundError:
+        names = set()
+    for name in sorted(names | set(config['CRON_MAX_AGE'])):
+        max_age = config['CRON_MAX_AGE'].get(name)
+        try:
+            age = now - os.stat(os.path.join(config['CRON_DIR'], name)).st_mtime
+        except FileNotFoundError:
+            jobs[name] = {'status': UNKNOWN, 'max_age': max_age}
+            continue
+        status = STALE if max_age is not None and age > max_age else OK
+        jobs[name] = {'status': status, 'age': round(age, 1), 'max_age': max_age}
+    status = STALE if any(job['status'] == STALE for job in jobs.values()) else OK
+    return {'status': status, 'jobs': jobs}
+
+
+database = CachedCheck(check_database, 'DB_TTL')
+broker = CachedCheck(check_broker, 'BROKER_TTL')
+cron = CachedCheck(check_cron, 'CRON_TTL')
+
+
+def clear():
+    for check in (database, broker, cron):
+        check.clear()
+
+
+def _report(checks):
+    statuses = {check['status'] for check in checks.values()}
+    if ERROR in statuses:
+        status = ERROR
+    elif STALE in statuses:
+        status = 'degraded'
+    else:
+        status = OK
+    return {'status': status, 'checks': checks}
+
+
+def liveness():
+    """
+    ``{'status', 'checks'}`` with the database check only.
+    """
+    return _report({'database': database(get_config())})
+
+
+def readiness():
+    """
+    ``{'status', 'checks'}`` with every check; ``status`` is ``error``,
+    ``degraded`` (a stale cron job) or ``ok``.
+    """
+    config = get_config()
+    return _report({'database': database(config), 'broker': broker(config), 'cron': cron(config)})
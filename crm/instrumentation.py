@@ -0,0 +1,326 @@
+"""
+Per-field timing and SQL instrumentation of GraphQL execution.
+
+``TracingMiddleware`` (listed in ``GRAPHENE['MIDDLEWARE']``) times every
+root field of ``Query`` and ``Mutation``. SQL statements are attributed to
+the field being executed through a ``connection.execute_wrapper`` hook
+installed on every database connection (``connect_signals``); a root field
+keeps collecting after its resolver returns, because querysets are only
+evaluated while graphql-core completes the returned value.
+
+Every request is then:
+
+* logged at INFO as one JSON line on the ``crm.graphql`` logger: total
+  time, SQL count and time, and the same figures per root field;
+* added to the in-process Prometheus counters served by ``/metrics``;
+* when the request carries the ``CRM_TRACING_HEADER`` header, returned in
+  the response ``extensions.tracing`` in the Apollo tracing format. Only
+  then are nested fields timed as well, each with its own SQL figures.
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from inspect import isawaitable
+
+from django.conf import settings
+
+logger = logging.getLogger('crm.graphql')
+
+DEFAULT_TRACING_HEADER = 'X-CRM-Trace'
+
+_TRACE_ATTR = '_crm_trace'
+
+# The trace of the request running in this context, and the path of the
+# field its SQL is attributed to.
+_current_trace = ContextVar('crm_current_trace', default=None)
+_current_path = ContextVar('crm_current_path', default=None)
+
+
+def get_tracing_header():
+    return getattr(settings, 'CRM_TRACING_HEADER', DEFAULT_TRACING_HEADER)
+
+
+def wants_tracing(request):
+    value = request.headers.get(get_tracing_header(), '')
+    return value.lower() not in ('', '0', 'false', 'no')
+
+
+def _path_list(path):
+    return list(path.as_list()) if path is not None else []
+
+
+def _path_key(path):
+    """
+    Dotted field path without list indexes, e.g. ``allOrders.edges.node.customer``.
+    """
+    return '.'.join(str(key) for key in path.as_list() if not isinstance(key, int))
+
+
+class Trace:
+    """
+    Timings of one GraphQL operation.
+    """
+
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.operation_name = None
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter_ns()
+        self.resolvers = []
+        self.fields = defaultdict(lambda: {'calls': 0, 'duration': 0, 'sql_count': 0, 'sql_duration': 0})
+        self.sql_count = 0
+        self.sql_duration = 0
+        self._lock = threading.Lock()
+
+    def add_resolver(self, info, started, duration):
+        root = info.path.prev is None
+        with self._lock:
+            if root:
+                field = self.fields[f'{info.parent_type.name}.{info.field_name}']
+                field['calls'] += 1
+                field['duration'] += duration
+            if self.detailed:
+                self.resolvers.append({
+                    'path': _path_list(info.path),
+                    'parentType': info.parent_type.name,
+                    'fieldName': info.field_name,
+                    'returnType': str(info.return_type),
+                    'startOffset': started - self.started,
+                    'duration': duration,
+                })
+
+    def add_query(self, path, duration):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_duration += duration
+            if path is not None:
+                root, key = path
+                for name in {root, key}:
+                    field = self.fields[name]
+                    field['sql_count'] += 1
+                    field['sql_duration'] += duration
+
+    def finish(self):
+        self.duration = time.perf_counter_ns() - self.started
+        self.ended_at = datetime.now(timezone.utc)
+
+    def as_apollo_tracing(self):
+        return {
+            'version': 1,
+            'startTime': self.started_at.isoformat(),
+            'endTime': self.ended_at.isoformat(),
+            'duration': self.duration,
+            'execution': {'resolvers': self.resolvers},
+            'sql': {
+                'count': self.sql_count,
+                'duration': self.sql_duration,
+                'byField': {
+                    name: {'count': field['sql_count'], 'duration': field['sql_duration']}
+                    for name, field in self.fields.items() if field['sql_count']
+                },
+            },
+        }
+
+
+def start_trace(context, detailed=False):
+    """
+    Attach a new trace to ``context`` and make it current. Call
+    ``finish_trace`` with the same context once execution is over.
+    """
+    trace = Trace(detailed)
+    if isinstance(context, dict):
+        context[_TRACE_ATTR] = trace
+    else:
+        setattr(context, _TRACE_ATTR, trace)
+    _current_trace.set(trace)
+    return trace
+
+
+def get_trace(context):
+    if isinstance(context, dict):
+        return context.get(_TRACE_ATTR)
+    return getattr(context, _TRACE_ATTR, None)
+
+
+class TracingMiddleware:
+    """
+    Graphene middleware timing root fields, and every field when the trace
+    is detailed.
+    """
+
+    def resolve(self, next, root, info, **args):
+        is_root = info.path.prev is None
+        trace = get_trace(info.context) if info.context is not None else None
+        if trace is None:
+            if not is_root or info.context is None:
+                return next(root, info, **args)
+            # Executed without the view (e.g. crm.executor): trace anyway.
+            trace = start_trace(info.context)
+        if not is_root and not trace.detailed:
+            return next(root, info, **args)
+
+        _current_trace.set(trace)
+        if is_root:
+            if info.operation.name is not None:
+                trace.operation_name = info.operation.name.value
+            key = f'{info.parent_type.name}.{info.field_name}'
+            path = (key, key)
+            # Not reset afterwards: a root field also collects the SQL run
+            # while graphql-core completes the value it returned.
+            _current_path.set(path)
+            token = None
+        else:
+            current = _current_path.get()
+            key = _path_key(info.path)
+            path = (current[0] if current else key, key)
+            token = _current_path.set(path)
+
+        started = time.perf_counter_ns()
+        try:
+            result = next(root, info, **args)
+        except Exception:
+            trace.add_resolver(info, started, time.perf_counter_ns() - started)
+            raise
+        finally:
+            if token is not None:
+                _current_path.reset(token)
+
+        if isawaitable(result):
+            return self._await(result, trace, info, started, path)
+        trace.add_resolver(info, started, time.perf_counter_ns() - started)
+        return result
+
+    @staticmethod
+    async def _await(result, trace, info, started, path):
+        # Runs in its own task, so the path set here does not leak to siblings.
+        _current_trace.set(trace)
+        _current_path.set(path)
+        try:
+            return await result
+        finally:
+            trace.add_resolver(info, started, time.perf_counter_ns() - started)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    trace = _current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter_ns()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.add_query(_current_path.get(), time.perf_counter_ns() - started)
+
+
+def _install_sql_wrapper(sender, connection, **kwargs):
+    # The wrapper list lives on the connection object, which survives reconnects.
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+def connect_signals():
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(_install_sql_wrapper, dispatch_uid='crm.instrumentation.sql')
+
+
+class Metrics:
+    """
+    Thread-safe Prometheus-style counters, rendered by ``render``.
+    """
+
+    HELP = {
+        'crm_graphql_requests_total': "GraphQL operations executed",
+        'crm_graphql_errors_total': "GraphQL operations that returned errors",
+        'crm_graphql_request_seconds_total': "Time spent executing GraphQL operations",
+        'crm_graphql_field_calls_total': "Root field resolutions",
+        'crm_graphql_field_seconds_total': "Time spent resolving root fields",
+        'crm_graphql_sql_queries_total': "SQL queries run by root fields",
+        'crm_graphql_sql_seconds_total': "Time spent in SQL by root fields",
+    }
+
+    def __init__(self):
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] += value
+
+    def get(self, name, **labels):
+        with self._lock:
+            return self._values.get((name, tuple(sorted(labels.items()))), 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = []
+        for name in self.HELP:
+            samples = [(labels, value) for (metric, labels), value in values if metric == name]
+            if not samples:
+                continue
+            lines.append(f'# HELP {name} {self.HELP[name]}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f'{name}{{{label_text}}} {value:g}' if label_text else f'{name} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def finish_trace(context, operation_name=None, errors=0):
+    """
+    Close the trace of ``context``: log it, count it and return it (or None
+    when nothing was traced).
+    """
+    trace = get_trace(context)
+    _current_trace.set(None)
+    _current_path.set(None)
+    if trace is None:
+        return None
+    if isinstance(context, dict):
+        context.pop(_TRACE_ATTR, None)
+    else:
+        delattr(context, _TRACE_ATTR)
+    trace.finish()
+
+    root_fields = {name: field for name, field in trace.fields.items() if field['calls']}
+    metrics.inc('crm_graphql_requests_total')
+    metrics.inc('crm_graphql_request_seconds_total', trace.duration / 1e9)
+    if errors:
+        metrics.inc('crm_graphql_errors_total')
+    for name, field in root_fields.items():
+        metrics.inc('crm_graphql_field_calls_total', field['calls'], field=name)
+        metrics.inc('crm_graphql_field_seconds_total', field['duration'] / 1e9, field=name)
+        metrics.inc('crm_graphql_sql_queries_total', field['sql_count'], field=name)
+        metrics.inc('crm_graphql_sql_seconds_total', field['sql_duration'] / 1e9, field=name)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            'event': 'graphql.operation',
+            'operation': operation_name or trace.operation_name,
+            'duration_ms': round(trace.duration / 1e6, 3),
+            'sql_queries': trace.sql_count,
+            'sql_ms': round(trace.sql_duration / 1e6, 3),
+            'errors': errors,
+            'fields': {
+                name: {
+                    'duration_ms': round(field['duration'] / 1e6, 3),
+                    'sql_queries': field['sql_count'],
+                    'sql_ms': round(field['sql_duration'] / 1e6, 3),
+                }
+                for name, field in root_fields.items()
+            },
+        }))
+    return trace
@@ -0,0 +1,65 @@
+"""
+Set-based stock maintenance.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import LOW_STOCK_INDEX_THRESHOLD, Product
+
+DEFAULT_LOW_STOCK_THRESHOLD = LOW_STOCK_INDEX_THRESHOLD
+DEFAULT_RESTOCK_INCREMENT = 10
+
+
+def get_low_stock_threshold():
+    return getattr(settings, 'CRM_LOW_STOCK_THRESHOLD', DEFAULT_LOW_STOCK_THRESHOLD)
+
+
+def get_restock_increment():
+    return getattr(settings, 'CRM_RESTOCK_INCREMENT', DEFAULT_RESTOCK_INCREMENT)
+
+
+def _supports_update_returning():
+    return connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert
+
+
+def _update_returning_ids(threshold, increment):
+    qn = connection.ops.quote_name
+    table = qn(Product._meta.db_table)
+    stock = qn(Product._meta.get_field('stock').column)
+    pk = qn(Product._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {stock} = {stock} + %s WHERE {stock} < %s RETURNING {pk}",
+            [increment, threshold],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def restock_low_stock_products(threshold=None, increment=None):
+    """
+    Add ``increment`` to the stock of every product below ``threshold`` and
+    return the updated products.
+
+    The increment is applied by a single ``UPDATE ... SET stock = stock + n``
+    so concurrent stock changes are never overwritten. Where the backend
+    supports ``UPDATE ... RETURNING`` that same statement reports the
+    affected IDs; elsewhere the rows are locked with ``SELECT ... FOR UPDATE``
+    first. The products are then re-read once, inside the same transaction.
+    """
+    threshold = get_low_stock_threshold() if threshold is None else threshold
+    increment = get_restock_increment() if increment is None else increment
+    if increment <= 0:
+        raise ValueError("Increment must be positive")
+
+    with transaction.atomic():
+        if _supports_update_returning():
+            ids = _update_returning_ids(threshold, increment)
+        else:
+            ids = list(
+                Product.objects.select_for_update()
+                .filter(stock__lt=threshold)
+                .values_list('pk', flat=True)
+            )
+            Product.objects.filter(pk__in=ids).update(stock=F('stock') + increment)
+        return list(Product.objects.filter(pk__in=ids).order_by('pk'))
@@ -0,0 +1,452 @@
+"""
+Structured, buffered log of cron job and Celery task runs.
+
+Jobs wrap a run in ``job_run``::
+
+    with job_run('update_low_stock') as run:
+        products = restock_low_stock_products()
+        run.count('products', len(products))
+        run.log('restocked', products=[product.name for product in products])
+
+Every record is one JSON line with the time, job name, run ID and event;
+when the block exits a ``run`` record adds the status, the error if any,
+the duration and the row counts, and the run is recorded for the cron
+check of ``/readyz`` (``crm.health.record_run``). ``read_records`` and the
+``job_logs`` command read them back.
+
+Records are handed to a queue and written by a background thread in
+batches: one ``write`` per file per batch instead of an ``open`` per line.
+The writer is started on first use in each process (so also in every
+forked Celery worker) and ``job_run`` flushes it on exit, so a short-lived
+cron process has its records on disk before it returns.
+
+Each job writes ``<DIR>/<job>.jsonl``. A file is rotated once it would
+grow past ``MAX_BYTES`` or its first record is ``ROTATE_SECONDS`` old; the
+rotated file is gzipped and only the ``BACKUP_COUNT`` newest are kept.
+Several processes may log the same job: rotation is done under an
+exclusive lock file and writers reopen the file when it was rotated
+under them.
+
+Configure it with ``CRM_JOB_LOG`` in settings.
+"""
+import atexit
+import datetime
+import glob
+import gzip
+import json
+import math
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+
+from . import health
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is not coordinated between processes
+    fcntl = None
+
+DEFAULTS = {
+    'DIR': '/tmp/crm_job_logs',
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'ROTATE_SECONDS': 24 * 60 * 60,
+    'BACKUP_COUNT': 14,
+    'COMPRESS': True,
+    'FLUSH_INTERVAL': 1.0,
+    'BATCH_SIZE': 1000,
+    'QUEUE_SIZE': 100_000,
+}
+
+SUFFIX = '.jsonl'
+
+_STOP = object()
+
+_current_run = ContextVar('crm_job_run', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CRM_JOB_LOG', {})}
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class _Encoder(DjangoJSONEncoder):
+
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            return str(o)
+
+
+class _JobFile:
+    """
+    The open log file of one job, in the writer thread.
+    """
+
+    def __init__(self, job, config):
+        self.path = os.path.join(config['DIR'], job + SUFFIX)
+        self.lock_path = os.path.join(config['DIR'], f'.{job}.lock')
+        self.config = config
+        self.file = None
+
+    def _open(self):
+        self.file = open(self.path, 'ab')
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.started = None
+        with open(self.path, 'rb') as f:
+            first = f.readline()
+        if first:
+            try:
+                self.started = datetime.datetime.fromisoformat(json.loads(first)['ts']).timestamp()
+            except (ValueError, KeyError, TypeError):
+                self.started = os.stat(self.path).st_mtime
+
+    def _rotated_elsewhere(self):
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return True
+
+    def _due(self, size):
+        # Other processes may have appended since we last wrote.
+        current = os.fstat(self.file.fileno()).st_size
+        if current == 0:
+            return False
+        if current + size > self.config['MAX_BYTES']:
+            return True
+        return self.started is not None and time.time() - self.started >= self.config['ROTATE_SECONDS']
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def write(self, data):
+        if self.file is None or self._rotated_elsewhere():
+            self.close()
+            self._open()
+        if self._due(len(data)):
+            self.rotate()
+        self.file.write(data)
+        self.file.flush()
+        if self.started is None:
+            self.started = time.time()
+
+    def rotate(self):
+        with open(self.lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another process may have rotated it while we waited.
+            if not self._rotated_elsewhere():
+                stamp = _now().strftime('%Y%m%d-%H%M%S-%f')
+                rotated = f'{self.path}.{stamp}'
+                os.rename(self.path, rotated)
+                if self.config['COMPRESS']:
+                    with open(rotated, 'rb') as source, gzip.open(rotated + '.gz', 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                    os.remove(rotated)
+                self._prune()
+            self.close()
+            self._open()
+
+    def _prune(self):
+        backups = sorted(glob.glob(glob.escape(self.path) + '.*'))
+        for path in backups[:max(0, len(backups) - self.config['BACKUP_COUNT'])]:
+            os.remove(path)
+
+
+class JobLogWriter:
+    """
+    Background thread writing queued records in batches.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self.queue = queue.Queue(self.config['QUEUE_SIZE'])
+        self.dropped = 0
+        self._files = {}
+        self._thread = threading.Thread(target=self._run, name='crm-joblog', daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        try:
+            self.queue.put(record, timeout=1)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5):
+        """
+        Wait until everything queued so far is written.
+        """
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """
+        Write what is queued, then stop the thread.
+        """
+        self.queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            # Collect a batch until it is full, a flush or stop comes in,
+            # or FLUSH_INTERVAL has passed since its first record.
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.config['FLUSH_INTERVAL']
+            while len(batch) < self.config['BATCH_SIZE'] and isinstance(batch[-1], dict):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write([item for item in batch if item is not _STOP])
+            if batch[-1] is _STOP:
+                for job_file in self._files.values():
+                    job_file.close()
+                return
+
+    def _write(self, batch):
+        lines, events = {}, []
+        for item in batch:
+            if isinstance(item, threading.Event):
+                events.append(item)
+            else:
+                lines.setdefault(item['job'], []).append(json.dumps(item, cls=_Encoder) + '\n')
+        try:
+            if lines:
+                os.makedirs(self.config['DIR'], exist_ok=True)
+            for job, job_lines in lines.items():
+                if job not in self._files:
+                    self._files[job] = _JobFile(job, self.config)
+                try:
+                    self._files[job].write(''.join(job_lines).encode())
+                except OSError:
+                    self._files[job].close()
+                    self.dropped += len(job_lines)
+        finally:
+            for event in events:
+                event.set()
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    The writer of this process, started on first use and after a fork.
+    """
+    global _writer, _writer_pid
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+                _writer = JobLogWriter()
+                _writer_pid = os.getpid()
+    return _writer
+
+
+def reset_writer():
+    """
+    Stop using the current writer, e.g. after ``CRM_JOB_LOG`` changed.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is not None and _writer_pid == os.getpid():
+            _writer.close()
+        _writer = None
+
+
+def _settings_changed(setting, **kwargs):
+    if setting == 'CRM_JOB_LOG':
+        reset_writer()
+
+
+setting_changed.connect(_settings_changed)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.flush(timeout=2)
+
+
+def emit(job, event, run_id=None, **fields):
+    get_writer().put({'ts': _now().isoformat(), 'job': job, 'run_id': run_id, 'event': event, **fields})
+
+
+class JobRun:
+
+    def __init__(self, job, **fields):
+        self.job = job
+        self.run_id = uuid.uuid4().hex[:12]
+        self.fields = fields
+        self.counts = {}
+        self.status = 'ok'
+        self.error = None
+        self.started_at = _now()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def log(self, event, **fields):
+        emit(self.job, event, self.run_id, **fields)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def fail(self, error):
+        """
+        Mark the run as failed without raising.
+        """
+        self.status = 'error'
+        self.error = str(error)
+
+    def finish(self):
+        emit(
+            self.job, 'run', self.run_id,
+            status=self.status,
+            error=self.error,
+            started=self.started_at.isoformat(),
+            duration_ms=round((time.perf_counter() - self._started) * 1000, 3),
+            counts=self.counts,
+            **self.fields,
+        )
+
+
+def current_run():
+    return _current_run.get()
+
+
+@contextmanager
+def job_run(job, **fields):
+    """
+    Log a run of ``job``; ``fields`` are added to its ``run`` record. An
+    exception marks the run failed and is re-raised.
+    """
+    run = JobRun(job, **fields)
+    token = _current_run.set(run)
+    try:
+        yield run
+    except BaseException as e:
+        run.fail(e)
+        raise
+    finally:
+        _current_run.reset(token)
+        run.finish()
+        get_writer().flush()
+        try:
+            health.record_run(job)
+        except OSError:
+            pass
+
+
+def log_files(job=None, config=None):
+    """
+    The log files of ``job`` (or of every job), oldest first.
+    """
+    directory = (config or get_config())['DIR']
+    pattern = os.path.join(glob.escape(directory), f'{glob.escape(job) if job else "*"}{SUFFIX}*')
+
+    def key(path):
+        # Per job: the rotated files by timestamp, then the current one.
+        name, _, rotated = os.path.basename(path).partition(SUFFIX)
+        return name, not rotated, rotated
+
+    return sorted(glob.glob(pattern), key=key)
+
+
+def read_records(job=None, config=None):
+    """
+    Yield the records of ``job`` (or of every job), skipping corrupt lines.
+    """
+    for path in log_files(job, config):
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except (OSError, EOFError):
+            # Removed by rotation, or still being compressed.
+            continue
+
+
+def parse_since(value, now=None):
+    """
+    ``'30m'``, ``'12h'`` or ``'7d'`` ago, or an ISO date or datetime.
+    """
+    now = now or _now()
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+    if value[-1:] in units and value[:-1].isdigit():
+        return now - datetime.timedelta(**{units[value[-1]]: int(value[:-1])})
+    try:
+        since = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time: {value} (use e.g. 30m, 12h, 7d or an ISO date)")
+    return since if since.tzinfo else since.replace(tzinfo=now.tzinfo)
+
+
+def filter_records(records, job=None, run_id=None, event=None, status=None, since=None):
+    for record in records:
+        if job and record.get('job') != job:
+            continue
+        if run_id and record.get('run_id') != run_id:
+            continue
+        if event and record.get('event') != event:
+            continue
+        if status and record.get('status') != status:
+            continue
+        if since and datetime.datetime.fromisoformat(record['ts']) < since:
+            continue
+        yield record
+
+
+def _percentile(samples, fraction):
+    return samples[max(1, math.ceil(fraction * len(samples))) - 1] if samples else 0.0
+
+
+def summarize_runs(records):
+    """
+    Aggregate the ``run`` records per job: runs, errors, durations, summed
+    counts and the last run.
+    """
+    jobs = {}
+    for record in records:
+        if record.get('event') != 'run':
+            continue
+        job = jobs.setdefault(record['job'], {'runs': 0, 'errors': 0, 'durations': [], 'counts': {}})
+        job['runs'] += 1
+        job['errors'] += record.get('status') == 'error'
+        job['durations'].append(record.get('duration_ms') or 0.0)
+        for name, value in (record.get('counts') or {}).items():
+            job['counts'][name] = job['counts'].get(name, 0) + value
+        job['last'] = record
+    for job in jobs.values():
+        durations = sorted(job.pop('durations'))
+        job.update(
+            mean_ms=sum(durations) / len(durations),
+            p95_ms=_percentile(durations, 0.95),
+            max_ms=durations[-1],
+            last_run=job['last']['ts'],
+            last_status=job.pop('last')['status'],
+        )
+    return jobs
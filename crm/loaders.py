@@ -0,0 +1,231 @@
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+
+from .models import Customer, Order, OrderItem
+
+
+class DataLoader:
+    """
+    Request-scoped batching loader.
+
+    Keys are queued (either explicitly through ``enqueue`` or implicitly by
+    ``load``) and resolved together by a single call to ``batch_load_fn`` the
+    first time one of them is needed. ``batch_load_fn`` receives a list of
+    unique keys and must return a list of values in the same order.
+    """
+
+    def __init__(self, batch_load_fn):
+        self.batch_load_fn = batch_load_fn
+        self._cache = {}
+        self._queue = []
+
+    def prime(self, key, value):
+        """
+        Store a value that is already known so it is never fetched.
+        """
+        self._cache.setdefault(key, value)
+
+    def enqueue(self, keys):
+        """
+        Queue keys to be fetched together with the next dispatch.
+        """
+        self._queue.extend(key for key in keys if key not in self._cache)
+
+    def load(self, key):
+        if key not in self._cache:
+            self.enqueue([key])
+            self.dispatch()
+        return self._cache.get(key)
+
+    def load_many(self, keys):
+        keys = list(keys)
+        self.enqueue(keys)
+        self.dispatch()
+        return [self._cache.get(key) for key in keys]
+
+    def dispatch(self):
+        keys = list(dict.fromkeys(key for key in self._queue if key not in self._cache))
+        self._queue = []
+        if not keys:
+            return
+        for key, value in zip(keys, self.batch_load_fn(keys)):
+            self._cache[key] = value
+
+
+class AsyncDataLoader(DataLoader):
+    """
+    DataLoader for async execution: ``load`` returns a future, and every key
+    loaded (or queued) before the event loop next runs is fetched with one
+    call to ``batch_load_fn`` in a worker thread.
+    """
+
+    def __init__(self, batch_load_fn):
+        super().__init__(batch_load_fn)
+        self._waiting = defaultdict(list)
+        self._task = None
+
+    def load(self, key):
+        if key in self._cache:
+            return self._cache[key]
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[key].append(future)
+        self.enqueue([key])
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+        return future
+
+    def load_many(self, keys):
+        # Issue every load now so that they share one batch.
+        values = [self.load(key) for key in keys]
+
+        async def gather():
+            return [await value if asyncio.isfuture(value) else value for value in values]
+
+        return gather()
+
+    async def _dispatch(self):
+        self._task = None
+        keys = list(dict.fromkeys(key for key in self._queue if key not in self._cache))
+        self._queue = []
+        waiting, self._waiting = self._waiting, defaultdict(list)
+        try:
+            values = await sync_to_async(self.batch_load_fn)(keys) if keys else []
+        except Exception as e:
+            for futures in waiting.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        self._cache.update(zip(keys, values))
+        for key, futures in waiting.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(self._cache.get(key))
+
+
+def load_customers(keys):
+    """
+    Fetch customers by primary key with one ``IN (...)`` query.
+    """
+    customers = Customer.objects.in_bulk(keys)
+    return [customers.get(key) for key in keys]
+
+
+def load_order_products(keys):
+    """
+    Fetch the products of many orders with one query on the through table.
+    """
+    products_by_order = defaultdict(list)
+    rows = (
+        Order.products.through.objects
+        .filter(order_id__in=keys)
+        .select_related('product')
+        .order_by('order_id', 'product_id')
+    )
+    for row in rows:
+        products_by_order[row.order_id].append(row.product)
+    return [products_by_order[key] for key in keys]
+
+
+def load_order_items(keys):
+    """
+    Fetch the lines of many orders, with their products, in one query.
+    """
+    items_by_order = defaultdict(list)
+    rows = (
+        OrderItem.objects
+        .filter(order_id__in=keys)
+        .select_related('product')
+        .order_by('order_id', 'product_id')
+    )
+    for row in rows:
+        items_by_order[row.order_id].append(row)
+    return [items_by_order[key] for key in keys]
+
+
+class Loaders:
+    """
+    The set of loaders that live for the duration of one GraphQL request.
+    """
+    loader_class = DataLoader
+
+    def __init__(self):
+        self.customer = self.loader_class(load_customers)
+        self.order_products = self.loader_class(load_order_products)
+        self.order_items = self.loader_class(load_order_items)
+
+    def prepare_orders(self, orders):
+        """
+        Queue the relations of a whole page of orders so that resolving the
+        first ``customer``, ``products`` or ``items`` field loads them all at once.
+
+        Orders whose relations were already fetched with ``select_related``
+        or ``prefetch_related`` are skipped, and a deferred ``customer_id`` is
+        left alone rather than loaded row by row.
+        """
+        orders = list(orders)
+        if not orders:
+            return orders
+        load_customer = 'customer_id' not in orders[0].get_deferred_fields()
+        for order in orders:
+            if load_customer and not Order.customer.is_cached(order):
+                self.customer.enqueue([order.customer_id])
+            prefetched = getattr(order, '_prefetched_objects_cache', {})
+            if 'products' not in prefetched:
+                self.order_products.enqueue([order.pk])
+            if 'items' not in prefetched:
+                self.order_items.enqueue([order.pk])
+        return orders
+
+
+class AsyncLoaders(Loaders):
+    """
+    Loaders whose ``load`` returns futures, used when the request is
+    executed asynchronously (see ``mark_async``).
+    """
+    loader_class = AsyncDataLoader
+
+
+_CONTEXT_ATTR = '_crm_loaders'
+_ASYNC_ATTR = '_crm_async'
+
+
+def mark_async(context):
+    """
+    Flag ``context`` as executed on an event loop: resolvers then return
+    awaitables and use the async ORM instead of blocking.
+    """
+    if isinstance(context, dict):
+        context[_ASYNC_ATTR] = True
+    else:
+        setattr(context, _ASYNC_ATTR, True)
+    return context
+
+
+def is_async(info):
+    context = info.context
+    if isinstance(context, dict):
+        return context.get(_ASYNC_ATTR, False)
+    return getattr(context, _ASYNC_ATTR, False)
+
+
+def get_loaders(info):
+    """
+    Return the loaders bound to the current request, creating them on first use.
+
+    Without a context object there is nothing to scope the cache to, so a
+    fresh set is returned and batching degrades to one query per lookup.
+    """
+    context = info.context
+    loaders_class = AsyncLoaders if is_async(info) else Loaders
+    if context is None:
+        return loaders_class()
+    if isinstance(context, dict):
+        return context.setdefault(_CONTEXT_ATTR, loaders_class())
+    loaders = getattr(context, _CONTEXT_ATTR, None)
+    if loaders is None:
+        loaders = loaders_class()
+        setattr(context, _CONTEXT_ATTR, loaders)
+    return loaders
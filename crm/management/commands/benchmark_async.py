@@ -0,0 +1,37 @@
+"""
+Load test the sync view (WSGI) against the async view (ASGI).
+
+    python manage.py benchmark_async --requests 500 --concurrency 32
+
+Run it against a database with data in it (e.g. after bulk loading).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.benchmarks.asgi import RUNNERS, load_test
+
+
+class Command(BaseCommand):
+    help = "Compare GraphQL throughput and latency under WSGI and ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per mode")
+        parser.add_argument('--concurrency', type=int, default=16, help="Requests in flight")
+        parser.add_argument('--query', help="Document to send (default: a three-connection dashboard)")
+        parser.add_argument('--mode', choices=sorted(RUNNERS), action='append', help="Only run this mode (repeatable)")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive")
+        kwargs = {'query': options['query']} if options['query'] else {}
+        results = load_test(
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            modes=options['mode'] or ('wsgi', 'asgi'),
+            **kwargs,
+        )
+        self.stdout.write(f"{'mode':<6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'failed':>7}")
+        for mode, summary in results.items():
+            self.stdout.write(
+                f"{mode:<6} {summary['mean_ms']:>9.2f} {summary['p50_ms']:>9.2f} {summary['p95_ms']:>9.2f} "
+                f"{summary['p99_ms']:>9.2f} {summary['throughput']:>9.1f} {summary['failed']:>7}"
+            )
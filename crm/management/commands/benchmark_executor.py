@@ -0,0 +1,49 @@
+"""
+Compare in-process and HTTP execution of the cron job documents.
+
+    python manage.py benchmark_executor --iterations 500
+    python manage.py benchmark_executor --url http://localhost:8000/graphql/
+
+Without --url the HTTP side runs against a throwaway local WSGI server.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.benchmarks.executor import benchmark_executors
+from crm.executor import ExecutorError
+
+
+class Command(BaseCommand):
+    help = "Benchmark in-process vs HTTP GraphQL execution for scheduled jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help="Timed runs per document and mode")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed runs per document and mode")
+        parser.add_argument('--url', help="GraphQL endpoint for the HTTP mode (default: a local server)")
+        parser.add_argument('--mode', choices=['inprocess', 'http'], action='append',
+                            help="Only run this mode (repeatable)")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+        try:
+            results = benchmark_executors(
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                url=options['url'],
+                modes=options['mode'] or ('inprocess', 'http'),
+            )
+        except ExecutorError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'document':<15} {'mode':<10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'req/s':>9}")
+        for mode, documents in results.items():
+            for name, summary in documents.items():
+                self.stdout.write(
+                    f"{name:<15} {mode:<10} {summary['mean_ms']:>9.2f} {summary['p50_ms']:>9.2f} "
+                    f"{summary['p95_ms']:>9.2f} {summary['per_second']:>9.1f}"
+                )
+        if 'inprocess' in results and 'http' in results:
+            for name in results['inprocess']:
+                inprocess, http = results['inprocess'][name]['mean_ms'], results['http'][name]['mean_ms']
+                if inprocess:
+                    self.stdout.write(f"{name}: in-process is {http / inprocess:.1f}x faster than HTTP")
@@ -0,0 +1,41 @@
+"""
+Measure read and write throughput with concurrent readers and writers.
+
+    python manage.py benchmark_sqlite --readers 8 --writers 2 --seconds 10
+    CRM_DATABASE_MODE=production python manage.py benchmark_sqlite
+
+Run it against a seeded database (see run_benchmarks).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.benchmarks.sqlite import benchmark_concurrency
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent GraphQL reads and writes on the configured database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help="Threads running allOrders")
+        parser.add_argument('--writers', type=int, default=2, help="Threads running createOrder")
+        parser.add_argument('--seconds', type=float, default=10.0, help="Duration of the run")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed of the orders")
+
+    def handle(self, *args, **options):
+        if options['readers'] < 0 or options['writers'] < 0 or not options['readers'] + options['writers']:
+            raise CommandError("--readers and --writers must not be negative, nor both zero")
+        results = benchmark_concurrency(options['readers'], options['writers'], options['seconds'], options['seed'])
+        database = results['database']
+        self.stdout.write(
+            f"mode {database['mode']}, journal {database['journal_mode']}, "
+            f"routers: {', '.join(database['routers']) or 'none'}"
+        )
+        self.stdout.write(f"{'role':<8} {'threads':>7} {'ops':>7} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+                          f"{'p99 ms':>9} {'errors':>7}")
+        for role in ('readers', 'writers'):
+            figures = results[role]
+            self.stdout.write(
+                f"{role:<8} {figures['threads']:>7} {figures['count']:>7} {figures['throughput']:>9.1f} "
+                f"{figures['p50_ms']:>9.2f} {figures['p95_ms']:>9.2f} {figures['p99_ms']:>9.2f} {figures['errors']:>7}"
+            )
+            if figures['first_error']:
+                self.stdout.write(f"  first error: {figures['first_error']}")
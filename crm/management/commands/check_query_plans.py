@@ -0,0 +1,222 @@
+"""
+Run EXPLAIN on every filter combination of the allCustomers, allProducts and
+allOrders queries and fail if any of them needs a full table scan.
+
+    python manage.py check_query_plans
+    python manage.py check_query_plans --model product -v 2
+
+Each query is built the way the resolvers build it: the FilterSet applied to
+the model, keyset ordering on ``(order_by, id)`` and a ``LIMIT`` of one page,
+both for the first page and for a page after a cursor. A first page that
+walks an index in order passes only when the index holds every filtered
+column, so no row is read just to be thrown away. Filters listed in a
+FilterSet's ``unindexed_filters`` (pattern matches no index can serve) are
+left out unless ``--include-unindexed`` is given; every indexed subset of
+their combinations is still checked. Text filters are given a three
+character term, the shortest the trigram search index answers.
+"""
+import decimal
+import itertools
+import re
+import warnings
+
+import django_filters
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.expressions import Col
+from django.utils import timezone
+
+from crm.filters import CustomerFilter, ProductFilter, OrderFilter
+from crm.models import Customer, Product, Order
+from crm.pagination import encode_cursor, get_max_page_size, keyset_queryset, seek_condition
+
+TARGETS = {
+    'customer': (Customer, CustomerFilter, False),
+    'product': (Product, ProductFilter, False),
+    # allOrders applies .distinct() because of the product joins
+    'order': (Order, OrderFilter, True),
+}
+
+
+def sample_value(filter_field):
+    """
+    Return a representative raw input value for ``filter_field``.
+    """
+    if isinstance(filter_field, django_filters.BooleanFilter):
+        return 'true'
+    if isinstance(filter_field, django_filters.NumberFilter):
+        return '1'
+    if isinstance(filter_field, django_filters.DateFilter):
+        return '2024-01-01'
+    return 'abc'
+
+
+def sample_cursor(model, field):
+    """
+    Return a cursor whose sort key has the type of ``field``.
+    """
+    if field == 'pk':
+        return encode_cursor(1, 1)
+    values = {
+        'DateTimeField': timezone.now(),
+        'DecimalField': decimal.Decimal('1'),
+        'IntegerField': 1,
+    }
+    return encode_cursor(values.get(model._meta.get_field(field).get_internal_type(), 'a'), 1)
+
+
+def filtered_columns(queryset):
+    """
+    Return the ``(table, column)`` pairs the WHERE clause of ``queryset``
+    compares, leaving out the primary key of the queried table.
+    """
+    query = queryset.query
+    pk_column = query.model._meta.pk.column
+    base_table = query.model._meta.db_table
+    columns = set()
+
+    def collect(node):
+        for child in getattr(node, 'children', ()):
+            collect(child)
+        lhs = getattr(node, 'lhs', None)
+        if isinstance(lhs, Col):
+            table = query.alias_map[lhs.alias].table_name
+            if (table, lhs.target.column) != (base_table, pk_column):
+                columns.add((table, lhs.target.column))
+
+    collect(query.where)
+    return columns
+
+
+def index_columns_sqlite(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA index_info({connection.ops.quote_name(name)})")
+        return {row[2] for row in cursor.fetchall()}
+
+
+def covers_filters_sqlite(access, filtered):
+    """
+    Whether the in-order ``SCAN`` ``access`` can test every filtered column
+    on the entries it walks. SQLite indexes end with the rowid, so the
+    primary key is always there; a scan of the table itself has every
+    column at hand.
+    """
+    table = access.split(' ')[1]
+    if any(other != table for other, _ in filtered):
+        return False
+    match = re.search(r' USING (?:COVERING )?INDEX (\S+)', access)
+    if match is None:
+        return True
+    columns = index_columns_sqlite(match.group(1))
+    return all(column in columns for _, column in filtered)
+
+
+def full_scans_sqlite(plan, seeking=False, filtered=()):
+    """
+    Return the plan lines that read a whole table.
+
+    A first page that ``SCAN``s in the order the query asks for is fine when
+    the scanned index holds every ``filtered`` column: the ``LIMIT`` stops
+    it after one page of matches. Otherwise SQLite may walk the whole table
+    looking rows up before it fills the page. A scan also reads the whole
+    table when the rows must be sorted afterwards (``USE TEMP B-TREE FOR
+    ORDER BY``), when it is the inner side of a join or subquery, or when a
+    cursor page walks the index from the start instead of seeking to the
+    cursor.
+    """
+    details = [line.split(' ', 3)[-1] for line in plan.splitlines()]
+    # A virtual table "scan" is a lookup in the FTS5 search index.
+    accesses = [
+        d for d in details
+        if d.startswith(('SCAN ', 'SEARCH ')) and ' VIRTUAL TABLE INDEX ' not in d
+    ]
+    scans = [d for d in accesses if d.startswith('SCAN ')]
+    if seeking or any('TEMP B-TREE FOR ORDER BY' in d for d in details):
+        return scans
+    scans = [d for d in accesses[1:] if d.startswith('SCAN ') and ' USING ' not in d]
+    if accesses and accesses[0].startswith('SCAN ') and not covers_filters_sqlite(accesses[0], filtered):
+        scans.insert(0, accesses[0])
+    return scans
+
+
+def full_scans_postgresql(plan, seeking=False, filtered=()):
+    # Run with enable_seqscan off, so a remaining Seq Scan has no usable index.
+    return [line.strip() for line in plan.splitlines() if 'Seq Scan' in line]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN every filter combination of the list queries and fail on full table scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(TARGETS), action='append',
+                            help="Only check this model (repeatable)")
+        parser.add_argument('--include-unindexed', action='store_true',
+                            help="Also check combinations that use pattern-match filters")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            find_full_scans = full_scans_sqlite
+        elif connection.vendor == 'postgresql':
+            find_full_scans = full_scans_postgresql
+        else:
+            raise CommandError(f"Query plan checks are not supported on {connection.vendor}")
+
+        checked, failures = 0, []
+        for label in options['model'] or sorted(TARGETS):
+            for description, queryset, seeking in self.queries(label, options['include_unindexed']):
+                plan = self.explain(queryset)
+                checked += 1
+                scans = find_full_scans(plan, seeking, filtered_columns(queryset))
+                if scans:
+                    failures.append((description, plan))
+                    self.stderr.write(f"FULL SCAN {description}: {'; '.join(scans)}")
+                elif options['verbosity'] > 1:
+                    self.stdout.write(f"ok {description}: {plan.replace(chr(10), '; ')}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} of {checked} query plans use a full table scan")
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} query plans, no full table scans"))
+
+    def queries(self, label, include_unindexed):
+        """
+        Yield ``(description, queryset, seeking)`` for every filter combination,
+        ``order_by`` value and page position of ``label``.
+        """
+        model, filterset_class, distinct = TARGETS[label]
+        filters = filterset_class.base_filters
+        names = [
+            name for name in filters
+            if include_unindexed or name not in getattr(filterset_class, 'unindexed_filters', ())
+        ]
+        orderings = [None] + [
+            f'{direction}{field}'
+            for field in filterset_class.order_by_fields
+            for direction in ('', '-')
+        ]
+        limit = get_max_page_size() + 1
+
+        for size in range(len(names) + 1):
+            for combination in itertools.combinations(names, size):
+                data = {name: sample_value(filters[name]) for name in combination}
+                with warnings.catch_warnings():
+                    # DateFilter hands naive datetimes to aware fields.
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    base = filterset_class(data, queryset=model.objects.all()).qs
+                if distinct:
+                    base = base.distinct()
+                for order_by in orderings:
+                    queryset, field, descending, ordering = keyset_queryset(base, order_by)
+                    description = f"{label} filters={list(combination)} order_by={order_by}"
+                    yield description, queryset[:limit], False
+                    after = seek_condition(field, descending, sample_cursor(model, field), forward=True)
+                    yield f"{description} after=cursor", queryset.filter(after)[:limit], True
+
+    def explain(self, queryset):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            if connection.vendor != 'postgresql':
+                return queryset.explain()
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+                return queryset.explain()
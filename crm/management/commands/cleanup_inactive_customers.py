@@ -0,0 +1,48 @@
+"""
+Delete customers with no order in the last year, in batches.
+
+    python manage.py cleanup_inactive_customers --dry-run
+    python manage.py cleanup_inactive_customers --days 365 --batch-size 500
+
+The last line of output is the summary; the run is also recorded in the job
+log (see crm/joblog.py).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.cleanup import cleanup_inactive_customers, format_cleanup, get_cleanup_batch_size, get_inactive_days
+from crm.joblog import job_run
+
+
+class Command(BaseCommand):
+    help = "Delete customers without recent orders in short, batched transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=get_inactive_days(),
+                            help="Customers without an order in this many days are inactive")
+        parser.add_argument('--batch-size', type=int, default=get_cleanup_batch_size(),
+                            help="Customers deleted per transaction")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count what would be deleted")
+
+    def handle(self, *args, **options):
+        def progress(totals):
+            if options['verbosity'] > 1:
+                rate = totals['customers'] / totals['seconds'] if totals['seconds'] else 0.0
+                self.stdout.write(
+                    f"batch {totals['batches']}: {totals['customers']} customers, "
+                    f"{totals['orders']} orders, {rate:.1f} customers/s"
+                )
+
+        with job_run('cleanup_inactive_customers', dry_run=options['dry_run']) as run:
+            try:
+                totals = cleanup_inactive_customers(
+                    days=options['days'],
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                    progress=progress,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            for key in ('customers', 'orders', 'batches'):
+                run.count(key, totals[key])
+        self.stdout.write(format_cleanup(totals))
@@ -0,0 +1,78 @@
+"""
+Read the structured job log (see crm/joblog.py).
+
+    python manage.py job_logs                                  # last runs
+    python manage.py job_logs --job update_low_stock --since 7d --status error
+    python manage.py job_logs --summary --since 30d            # per job aggregates
+    python manage.py job_logs --run-id 3f2a9c0d1b7e --events   # every record of a run
+    python manage.py job_logs --events --json | jq .
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.joblog import filter_records, parse_since, read_records, summarize_runs
+
+
+class Command(BaseCommand):
+    help = "Filter and aggregate the runs of the cron jobs and Celery tasks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', help="Only this job")
+        parser.add_argument('--run-id', help="Only this run")
+        parser.add_argument('--status', choices=['ok', 'error'], help="Only runs with this status")
+        parser.add_argument('--since', help="Only records after this time (30m, 12h, 7d or an ISO date)")
+        parser.add_argument('--events', action='store_true', help="Show every record, not only the runs")
+        parser.add_argument('--summary', action='store_true', help="Aggregate the runs per job")
+        parser.add_argument('--limit', type=int, default=20, help="Show at most this many (latest) records")
+        parser.add_argument('--json', action='store_true', help="Print the records as JSON lines")
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options['since']) if options['since'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+        records = filter_records(
+            read_records(options['job']),
+            run_id=options['run_id'],
+            event=None if options['events'] else 'run',
+            status=options['status'],
+            since=since,
+        )
+
+        if options['summary']:
+            summary = summarize_runs(records)
+            if options['json']:
+                self.stdout.write(json.dumps(summary, indent=2, sort_keys=True))
+                return
+            self.stdout.write(f"{'job':<28} {'runs':>6} {'errors':>6} {'mean ms':>10} {'p95 ms':>10} "
+                              f"{'max ms':>10}  last run")
+            for name, job in sorted(summary.items()):
+                counts = ', '.join(f"{key}={value}" for key, value in sorted(job['counts'].items()))
+                self.stdout.write(
+                    f"{name:<28} {job['runs']:>6} {job['errors']:>6} {job['mean_ms']:>10.1f} {job['p95_ms']:>10.1f} "
+                    f"{job['max_ms']:>10.1f}  {job['last_run']} ({job['last_status']})" + (f"  {counts}" if counts else '')
+                )
+            return
+
+        # Files are read job by job; the timestamps are UTC ISO strings.
+        records = sorted(records, key=lambda record: record['ts'])
+        records = records[-options['limit']:] if options['limit'] else records
+        for record in records:
+            if options['json']:
+                self.stdout.write(json.dumps(record))
+            else:
+                self.stdout.write(self.format_record(record))
+
+    @staticmethod
+    def format_record(record):
+        line = f"{record['ts']} {record['job']} [{record.get('run_id')}] {record['event']}"
+        if record['event'] == 'run':
+            line += f" {record['status']} in {record['duration_ms']:.1f} ms"
+            if record.get('counts'):
+                line += ' ' + ', '.join(f"{key}={value}" for key, value in sorted(record['counts'].items()))
+            if record.get('error'):
+                line += f": {record['error']}"
+            return line
+        extra = {key: value for key, value in record.items() if key not in ('ts', 'job', 'run_id', 'event')}
+        return f"{line} {json.dumps(extra)}" if extra else line
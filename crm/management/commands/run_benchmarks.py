@@ -0,0 +1,81 @@
+"""
+Seed the database and run the GraphQL benchmark suite.
+
+    python manage.py run_benchmarks --scale small --output bench/base.json
+    python manage.py run_benchmarks --scale small --output bench/new.json --compare bench/base.json
+
+Seeding is skipped when the database already holds the volumes of
+--scale; a database holding anything else is only replaced with --reset.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.benchmarks.seed import SCALES, current_volumes, get_volumes, reset_database, seed_database
+from crm.benchmarks.suite import SCENARIOS, compare_results, read_results, run_suite, write_results
+
+
+class Command(BaseCommand):
+    help = "Benchmark the GraphQL hot paths on seeded data and write the figures as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='small',
+                            help="Customers, products and orders to seed: " + ', '.join(
+                                f"{name}={volumes[0]:,}" for name, volumes in SCALES.items()))
+        parser.add_argument('--seed', type=int, default=42, help="Random seed of the data and the scenarios")
+        parser.add_argument('--reset', action='store_true', help="Delete the existing CRM data and reseed")
+        parser.add_argument('--scenario', choices=SCENARIOS, action='append',
+                            help="Only run this scenario (repeatable)")
+        parser.add_argument('--iterations', type=int, help="Calls per scenario (default: per scenario)")
+        parser.add_argument('--concurrency', type=int, default=8, help="Threads placing orders in create_order")
+        parser.add_argument('--bulk-rows', type=int, default=10_000, help="Customers per bulkCreateCustomers call")
+        parser.add_argument('--output', help="Write the results to this JSON file")
+        parser.add_argument('--compare', help="Results file of an earlier run to compare with")
+
+    def handle(self, *args, **options):
+        if options['iterations'] is not None and options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+        baseline = read_results(options['compare']) if options['compare'] else None
+
+        self.prepare_data(options['scale'], options['seed'], options['reset'])
+
+        scenarios = options['scenario'] or SCENARIOS
+        iterations = {name: options['iterations'] for name in scenarios} if options['iterations'] else None
+        results = run_suite(
+            scenarios,
+            iterations=iterations,
+            seed=options['seed'],
+            scale=options['scale'],
+            progress=lambda name, figures: self.stdout.write(self.format_figures(name, figures)),
+            concurrency=options['concurrency'],
+            bulk_rows=options['bulk_rows'],
+        )
+        if options['output']:
+            write_results(results, options['output'])
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            self.stdout.write(f"Compared with {options['compare']} ({baseline['meta'].get('commit') or 'unknown commit'}):")
+            for name, figure, before, after, change in compare_results(baseline, results):
+                self.stdout.write(f"  {name:<22} {figure:<12} {before:>10.2f} -> {after:>10.2f} {change:>+8.1%}")
+
+    def prepare_data(self, scale, seed, reset):
+        volumes = current_volumes()
+        if volumes == get_volumes(scale) and not reset:
+            return
+        if any(volumes) and not reset:
+            raise CommandError(
+                f"The database holds {volumes[0]} customers, {volumes[1]} products and {volumes[2]} orders, "
+                f"not the '{scale}' volumes; pass --reset to replace them"
+            )
+        if any(volumes):
+            reset_database()
+        self.stdout.write(f"Seeding '{scale}' data (seed {seed})...")
+        seed_database(scale, seed, progress=lambda table, done, total: self.stdout.write(
+            f"  {table}: {done}/{total}", ending='\r' if done < total else '\n'))
+
+    @staticmethod
+    def format_figures(name, figures):
+        return (
+            f"{name:<22} {figures['count']:>6} ops  p50 {figures['p50_ms']:>8.2f} ms  p95 {figures['p95_ms']:>8.2f} ms  "
+            f"p99 {figures['p99_ms']:>8.2f} ms  {figures['throughput']:>8.1f} ops/s  "
+            f"{figures['sql_per_op']:>6.1f} SQL/op  {figures['errors']} errors"
+        )
@@ -0,0 +1,56 @@
+"""
+Send one reminder per customer with recent orders.
+
+    python manage.py send_order_reminders --dry-run
+    python manage.py send_order_reminders --days 7 --workers 4 --rate 10
+
+Reruns only cover orders placed since the previous run (see crm/reminders.py).
+The last line of output is the summary; the run is also recorded in the job
+log (see crm/joblog.py).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.joblog import job_run
+from crm.reminders import format_reminders, send_order_reminders
+
+
+class Command(BaseCommand):
+    help = "Send order reminders in keyset-paged, rate-limited batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Remind about orders from this many days back")
+        parser.add_argument('--batch-size', type=int, help="Customers per page")
+        parser.add_argument('--workers', type=int, help="Concurrent sends")
+        parser.add_argument('--rate', type=float, help="Maximum sends per second (0 for no limit)")
+        parser.add_argument('--retries', type=int, help="Retries per failed send")
+        parser.add_argument('--watermark', help="Watermark file")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be sent")
+
+    def handle(self, *args, **options):
+        def progress(totals):
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f"batch {totals['batches']}: {totals['customers']} customers, "
+                    f"{totals['sent']} sent, {totals['failed']} failed"
+                )
+
+        with job_run('send_order_reminders', dry_run=options['dry_run']) as run:
+            try:
+                totals = send_order_reminders(
+                    dry_run=options['dry_run'],
+                    progress=progress,
+                    days=options['days'],
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    rate=options['rate'],
+                    retries=options['retries'],
+                    watermark=options['watermark'],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            for key in ('customers', 'orders', 'sent', 'failed', 'batches'):
+                run.count(key, totals[key])
+            for error in totals['errors']:
+                run.log('send_failed', error=error)
+                self.stderr.write(error)
+        self.stdout.write(format_reminders(totals))
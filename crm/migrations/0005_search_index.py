@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# Mirrors crm.search.SEARCH_FIELDS at the time of this migration.
+SEARCH_TABLES = {
+    'crm_customer': ('name', 'email'),
+    'crm_product': ('name',),
+}
+
+
+def fts5_trigram_available(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.crm_fts5_probe USING fts5(x, tokenize='trigram')")
+        except Exception:
+            return False
+        cursor.execute("DROP TABLE temp.crm_fts5_probe")
+    return True
+
+
+def create_search_tables(apps, schema_editor):
+    """
+    Create and fill the FTS5 trigram tables on SQLite builds that support
+    them. Elsewhere crm.search falls back to its in-process n-gram index.
+    """
+    connection = schema_editor.connection
+    if not fts5_trigram_available(connection):
+        return
+    qn = connection.ops.quote_name
+    for table, fields in SEARCH_TABLES.items():
+        columns = ', '.join(qn(field) for field in fields)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {qn(table + '_search')} USING fts5({columns}, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {qn(table + '_search')} (rowid, {columns}) SELECT id, {columns} FROM {qn(table)}"
+        )
+
+
+def drop_search_tables(apps, schema_editor):
+    qn = schema_editor.connection.ops.quote_name
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {qn(table + '_search')}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
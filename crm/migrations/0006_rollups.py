@@ -0,0 +1,82 @@
+# Generated by Django 4.2.11 on 2026-10-18 04:30
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, F, IntegerField, Sum
+from django.db.models.functions import Round, TruncDate
+
+
+def cents(expression):
+    return Sum(Round(expression * 100), output_field=IntegerField())
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Fill the rollups from the existing orders; crm.rollups keeps them
+    up to date from here on.
+    """
+    Order = apps.get_model('crm', 'Order')
+    OrderItem = apps.get_model('crm', 'OrderItem')
+    DailyStats = apps.get_model('crm', 'DailyStats')
+    CustomerStats = apps.get_model('crm', 'CustomerStats')
+    ProductStats = apps.get_model('crm', 'ProductStats')
+
+    for model, orders, items, key in [
+        (DailyStats, Order.objects.annotate(key=TruncDate('order_date')),
+         OrderItem.objects.annotate(key=TruncDate('order__order_date')), 'date'),
+        (CustomerStats, Order.objects.annotate(key=F('customer_id')),
+         OrderItem.objects.annotate(key=F('order__customer_id')), 'customer_id'),
+    ]:
+        stats = defaultdict(dict)
+        for row in orders.values('key').annotate(count=Count('pk'), revenue=cents(F('total_amount'))).order_by():
+            stats[row['key']].update(orders=row['count'], revenue_cents=row['revenue'])
+        for row in items.values('key').annotate(count=Sum('quantity')).order_by():
+            stats[row['key']]['units'] = row['count']
+        model.objects.bulk_create([model(**{key: value}, **counters) for value, counters in stats.items()], batch_size=500)
+
+    ProductStats.objects.bulk_create([
+        ProductStats(product_id=row['product_id'], orders=row['count'], units=row['units'], revenue_cents=row['revenue'])
+        for row in OrderItem.objects.values('product_id').annotate(
+            count=Count('pk'), units=Sum('quantity'), revenue=cents(F('quantity') * F('unit_price')),
+        ).order_by()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='crm.customer')),
+                ('orders', models.BigIntegerField(default=0)),
+                ('units', models.BigIntegerField(default=0)),
+                ('revenue_cents', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('orders', models.BigIntegerField(default=0)),
+                ('units', models.BigIntegerField(default=0)),
+                ('revenue_cents', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='crm.product')),
+                ('orders', models.BigIntegerField(default=0)),
+                ('units', models.BigIntegerField(default=0)),
+                ('revenue_cents', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
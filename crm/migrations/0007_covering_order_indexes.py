@@ -0,0 +1,73 @@
+# Generated by Django 4.2.11 on 2026-10-18 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='crm_customer_name_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='crm_order_total_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='crm_order_date_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='crm_product_name_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='crm_product_price_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='crm_product_stock_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='crm_product_created_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['name', 'id', 'created_at'], name='crm_customer_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['email', 'id', 'created_at'], name='crm_customer_email_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['total_amount', 'id', 'order_date'], name='crm_order_total_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date', 'id', 'total_amount'], name='crm_order_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id', 'price', 'stock'], name='crm_product_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id', 'stock'], name='crm_product_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock', 'id', 'price'], name='crm_product_stock_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id', 'price', 'stock'], name='crm_product_created_id_idx'),
+        ),
+    ]
@@ -1,6 +1,15 @@
+from decimal import Decimal
+
 from django.db import models
+from django.utils import timezone
 from django.core.validators import RegexValidator
 
+# Products below this stock are covered by the partial low-stock index. The
+# condition is part of the migration: changing it needs a new migration, and
+# a CRM_LOW_STOCK_THRESHOLD that differs from it cannot use the index
+# (see crm.checks).
+LOW_STOCK_INDEX_THRESHOLD = 10
+
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
@@ -17,27 +26,115 @@ class Customer(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # (order_by field, id) pairs back the keyset pagination of allCustomers.
+        # The trailing columns are the range filters of CustomerFilter, so a
+        # filtered page walking one of these in order never reads the table.
+        indexes = [
+            models.Index(fields=['name', 'id', 'created_at'], name='crm_customer_name_id_idx'),
+            models.Index(fields=['email', 'id', 'created_at'], name='crm_customer_email_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
 class Product(models.Model):
     name = models.CharField(max_length=100)
-    description = models.TextField()
+    description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # (order_by field, id) followed by the range filters of ProductFilter.
+        indexes = [
+            models.Index(fields=['name', 'id', 'price', 'stock'], name='crm_product_name_id_idx'),
+            models.Index(fields=['price', 'id', 'stock'], name='crm_product_price_id_idx'),
+            models.Index(fields=['stock', 'id', 'price'], name='crm_product_stock_id_idx'),
+            models.Index(fields=['created_at', 'id', 'price', 'stock'], name='crm_product_created_id_idx'),
+            # ProductFilter.low_stock and UpdateLowStockProducts
+            models.Index(fields=['stock'], condition=models.Q(stock__lt=LOW_STOCK_INDEX_THRESHOLD), name='crm_product_low_stock_idx'),
+        ]
+
     def __str__(self):
         return self.name
-    
+
 
 class Order(models.Model):
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
-    product = models.ManyToManyField(Product)
-    quantity = models.PositiveIntegerField()
-    total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    created_at = models.DateTimeField(auto_now_add=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
+    products = models.ManyToManyField(Product, related_name='orders', through='OrderItem')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    order_date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # (order_by field, id) followed by the range filters of OrderFilter.
+        indexes = [
+            models.Index(fields=['total_amount', 'id', 'order_date'], name='crm_order_total_id_idx'),
+            models.Index(fields=['order_date', 'id', 'total_amount'], name='crm_order_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.customer.name}"
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_items')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('order', 'product')
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name}"
+
+
+# Rollups maintained by crm.rollups. Money is kept in whole cents so that
+# incremental updates never accumulate rounding error.
+class DailyStats(models.Model):
+    date = models.DateField(primary_key=True)
+    orders = models.BigIntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    revenue_cents = models.BigIntegerField(default=0)
+
+    @property
+    def revenue(self):
+        return cents_to_decimal(self.revenue_cents)
+
+    def __str__(self):
+        return f"Stats for {self.date}"
+
+
+class CustomerStats(models.Model):
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    orders = models.BigIntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    revenue_cents = models.BigIntegerField(default=0)
+
+    @property
+    def revenue(self):
+        return cents_to_decimal(self.revenue_cents)
+
+    def __str__(self):
+        return f"Stats for customer {self.customer_id}"
+
+
+class ProductStats(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    orders = models.BigIntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    revenue_cents = models.BigIntegerField(default=0)
+
+    @property
+    def revenue(self):
+        return cents_to_decimal(self.revenue_cents)
+
+    def __str__(self):
+        return f"Stats for product {self.product_id}"
+
+
+def cents_to_decimal(cents):
+    return (Decimal(cents or 0) / 100).quantize(Decimal('0.01'))
@@ -0,0 +1,106 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def collect_fields(info, field_nodes):
+    """
+    Merge the sub-selections of ``field_nodes`` into a mapping of field name to
+    the list of nodes selecting it.
+
+    Aliases are folded onto the underlying field name and fragment spreads and
+    inline fragments are expanded, so ``{ a: id ...F }`` and ``{ id }`` look
+    the same to the optimizer.
+    """
+    fields = {}
+
+    def visit(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = info.fragments.get(selection.name.value)
+                if fragment is not None:
+                    visit(fragment.selection_set)
+            elif isinstance(selection, InlineFragmentNode):
+                visit(selection.selection_set)
+
+    for node in field_nodes:
+        visit(node.selection_set)
+    return fields
+
+
+def connection_node_fields(info):
+    """
+    Return the nodes selecting ``edges { node { ... } }`` on a connection
+    field, i.e. the selection that applies to the paginated model.
+    """
+    edges = collect_fields(info, info.field_nodes).get('edges', [])
+    return collect_fields(info, edges).get('node', [])
+
+
+def _get_model_field(model, graphql_name):
+    try:
+        return model._meta.get_field(to_snake_case(graphql_name))
+    except FieldDoesNotExist:
+        return None
+
+
+def _plan(info, model, field_nodes, prefix=''):
+    """
+    Work out the ``only``/``select_related``/``prefetch_related`` arguments
+    needed to resolve the selection on ``model``.
+    """
+    only = {prefix + model._meta.pk.attname}
+    select_related = []
+    prefetch_related = []
+
+    for name, nodes in collect_fields(info, field_nodes).items():
+        field = _get_model_field(model, name)
+        if field is None:
+            continue
+        if field.many_to_many or field.one_to_many:
+            related_only, related_select, related_prefetch = _plan(info, field.related_model, nodes)
+            if field.one_to_many:
+                related_only.add(field.field.attname)
+            queryset = field.related_model._default_manager.only(*related_only)
+            if related_select:
+                queryset = queryset.select_related(*related_select)
+            if related_prefetch:
+                queryset = queryset.prefetch_related(*related_prefetch)
+            prefetch_related.append(Prefetch(prefix + field.name, queryset=queryset))
+        elif field.is_relation:
+            only.add(prefix + field.attname)
+            select_related.append(prefix + field.name)
+            related_only, related_select, related_prefetch = _plan(
+                info, field.related_model, nodes, prefix=f"{prefix}{field.name}__"
+            )
+            only.update(related_only)
+            select_related.extend(related_select)
+            prefetch_related.extend(related_prefetch)
+        elif field.concrete:
+            only.add(prefix + field.attname)
+
+    return only, select_related, prefetch_related
+
+
+def optimize_queryset(queryset, info, field_nodes=None):
+    """
+    Restrict ``queryset`` to the columns and relations requested by the
+    GraphQL selection set of the field being resolved.
+
+    ``field_nodes`` defaults to ``info.field_nodes``; callers that return the
+    model nested inside another type pass the nodes of that inner selection.
+    """
+    if field_nodes is None:
+        field_nodes = info.field_nodes
+    only, select_related, prefetch_related = _plan(info, queryset.model, field_nodes)
+    queryset = queryset.only(*only)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
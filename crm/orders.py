@@ -0,0 +1,145 @@
+"""
+Order placement with stock reservation.
+"""
+from collections import Counter
+
+from django.db import OperationalError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Customer, Product, Order, OrderItem
+from .rollups import record_orders
+
+
+class OrderPlacementError(Exception):
+    """
+    Raised when an order cannot be placed; nothing has been written.
+    ``retryable`` tells whether the same order may succeed if sent again.
+    """
+    retryable = False
+
+
+class CustomerNotFoundError(OrderPlacementError):
+
+    def __init__(self):
+        super().__init__("Customer not found")
+
+
+class DatabaseBusyError(OrderPlacementError):
+    """
+    The write lock could not be taken within the busy timeout.
+    """
+    retryable = True
+
+    def __init__(self):
+        super().__init__("The database is busy, please retry the order")
+
+
+def _is_busy(error):
+    # SQLite's SQLITE_BUSY and SQLITE_LOCKED messages.
+    return 'is locked' in str(error)
+
+
+class OutOfStockError(OrderPlacementError):
+
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        super().__init__(f"Insufficient stock for product IDs: {', '.join(map(str, product_ids))}")
+
+
+class _ReservationFailed(Exception):
+    pass
+
+
+def get_order_lines(product_ids=None, items=None):
+    """
+    Merge ``product_ids`` (one unit each, repeats allowed) and ``items``
+    (objects with ``product_id`` and ``quantity``) into ``{product_id: quantity}``.
+    """
+    lines = Counter()
+    try:
+        for product_id in product_ids or []:
+            lines[int(product_id)] += 1
+        for item in items or []:
+            quantity = 1 if item.quantity is None else item.quantity
+            if quantity <= 0:
+                raise OrderPlacementError("Quantity must be positive")
+            lines[int(item.product_id)] += quantity
+    except (TypeError, ValueError):
+        raise OrderPlacementError("Some product IDs are invalid")
+    if not lines:
+        raise OrderPlacementError("At least one product must be selected")
+    return dict(lines)
+
+
+def place_order(customer_id, lines, order_date=None):
+    """
+    Create an order for ``lines`` (``{product_id: quantity}``), reserving the
+    stock of every line, and return it.
+
+    Everything runs in one short transaction: a single conditional
+    ``UPDATE ... SET stock = stock - qty WHERE id IN (...) AND stock >= qty``
+    reserves all lines at once, so two checkouts can never both take the
+    last unit and no row is locked for longer than that statement. If fewer
+    rows than lines were updated the transaction is rolled back and the
+    failing lines are reported. Prices are read once, the total is computed
+    in one pass and the lines are written with one ``bulk_create``. The
+    order is added to the rollups (crm.rollups) in the same transaction.
+
+    ``customer_id`` may be any value accepted by ``int``; one that is not
+    raises ``CustomerNotFoundError``. A lock timeout raises the retryable
+    ``DatabaseBusyError``.
+    """
+    if not lines:
+        raise OrderPlacementError("At least one product must be selected")
+    try:
+        customer_id = int(customer_id)
+    except (TypeError, ValueError):
+        raise CustomerNotFoundError()
+    product_ids = sorted(lines)
+    quantity = Case(
+        *[When(pk=product_id, then=Value(lines[product_id])) for product_id in product_ids],
+        output_field=IntegerField(),
+    )
+
+    try:
+        with transaction.atomic():
+            if not Customer.objects.filter(pk=customer_id).exists():
+                raise CustomerNotFoundError()
+
+            reserved = (
+                Product.objects
+                .filter(pk__in=product_ids, stock__gte=quantity)
+                .update(stock=F('stock') - quantity)
+            )
+            if reserved != len(product_ids):
+                # Leaving the block with an exception undoes the partial reservation.
+                raise _ReservationFailed()
+
+            prices = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'price'))
+            total_amount = sum(prices[product_id] * lines[product_id] for product_id in product_ids)
+            order = Order(customer_id=customer_id, total_amount=total_amount)
+            if order_date:
+                order.order_date = order_date
+            order.save()
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product_id=product_id,
+                    quantity=lines[product_id],
+                    unit_price=prices[product_id],
+                )
+                for product_id in product_ids
+            ])
+            record_orders([(order, [(pk, lines[pk], prices[pk]) for pk in product_ids])])
+    except OperationalError as e:
+        if _is_busy(e):
+            raise DatabaseBusyError() from e
+        raise
+    except _ReservationFailed:
+        stock = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock'))
+        if len(stock) != len(product_ids):
+            raise OrderPlacementError("Some product IDs are invalid")
+        raise OutOfStockError([
+            product_id for product_id in product_ids if stock[product_id] < lines[product_id]
+        ] or product_ids)
+    return order
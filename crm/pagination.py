@@ -0,0 +1,159 @@
+import base64
+import datetime
+import decimal
+import json
+
+import graphene
+from django.conf import settings
+from django.db.models import F, Q
+from graphql import GraphQLError
+
+DEFAULT_MAX_PAGE_SIZE = 100
+
+_SEEK_VALUE = '_seek_value'
+
+
+def get_max_page_size():
+    return getattr(settings, 'CRM_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+
+
+def _json_default(value):
+    # Keep full microsecond precision: a truncated timestamp would make the
+    # seek condition match the cursor row again.
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(value, pk):
+    """
+    Encode the sort key of a row as an opaque cursor.
+    """
+    payload = json.dumps([value, pk], default=_json_default)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, AttributeError):
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+    return value, pk
+
+
+def seek_condition(field, descending, cursor, forward):
+    """
+    Build the keyset condition for rows strictly after (``forward``) or
+    before the row identified by ``cursor`` in ``(field, pk)`` order.
+    """
+    value, pk = decode_cursor(cursor)
+    lookup = 'lt' if descending == forward else 'gt'
+    if field == 'pk':
+        return Q(**{f'pk__{lookup}': pk})
+    # The redundant leading range lets the planner seek into the
+    # (field, pk) index instead of walking it from the start.
+    return Q(**{f'{field}__{lookup}e': value}) & (
+        Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk})
+    )
+
+
+def _page_size(requested, name):
+    max_page_size = get_max_page_size()
+    if requested is None:
+        return max_page_size
+    if requested < 0:
+        raise GraphQLError(f"Argument '{name}' must be a non-negative integer")
+    return min(requested, max_page_size)
+
+
+def get_ordering(order_by=None):
+    """
+    Return ``(field, descending, ordering)`` for an ``order_by`` value such as
+    ``'-price'``. ``ordering`` always ends with the primary key so that rows
+    have a total order, matching the ``(field, id)`` indexes on the models.
+    """
+    order_by = order_by or 'pk'
+    descending = order_by.startswith('-')
+    field = order_by.lstrip('-')
+    if field == 'id':
+        field = 'pk'
+    direction = '-' if descending else ''
+    ordering = [f'{direction}pk'] if field == 'pk' else [f'{direction}{field}', f'{direction}pk']
+    return field, descending, ordering
+
+
+def keyset_queryset(queryset, order_by=None):
+    """
+    Annotate ``queryset`` with the sort key carried by cursors and order it
+    for keyset pagination. Returns ``(queryset, field, descending, ordering)``.
+    """
+    field, descending, ordering = get_ordering(order_by)
+    return queryset.annotate(**{_SEEK_VALUE: F(field)}).order_by(*ordering), field, descending, ordering
+
+
+def _page_query(queryset, order_by, first, after, last, before):
+    """
+    Return ``(rows, limit, backward)``: the sliced queryset fetching one row
+    more than the page, so that the extra row tells whether another page
+    follows, and whether it is read backwards (``last``).
+    """
+    if first is not None and last is not None:
+        raise GraphQLError("Pass either 'first' or 'last', not both")
+
+    queryset, field, descending, ordering = keyset_queryset(queryset, order_by)
+    if after:
+        queryset = queryset.filter(seek_condition(field, descending, after, forward=True))
+    if before:
+        queryset = queryset.filter(seek_condition(field, descending, before, forward=False))
+
+    if last is not None:
+        limit = _page_size(last, 'last')
+        reverse = [term[1:] if term.startswith('-') else f'-{term}' for term in ordering]
+        return queryset.order_by(*reverse)[:limit + 1], limit, True
+    limit = _page_size(first, 'first')
+    return queryset[:limit + 1], limit, False
+
+
+def _connection(connection_type, rows, limit, backward, after, before):
+    if backward:
+        has_previous_page = len(rows) > limit
+        rows = rows[:limit][::-1]
+        has_next_page = bool(before)
+    else:
+        has_next_page = len(rows) > limit
+        rows = rows[:limit]
+        has_previous_page = bool(after)
+
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(getattr(row, _SEEK_VALUE), row.pk))
+        for row in rows
+    ]
+    page_info = graphene.relay.PageInfo(
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+        has_previous_page=has_previous_page,
+        has_next_page=has_next_page,
+    )
+    return connection_type(edges=edges, page_info=page_info)
+
+
+def paginate(queryset, connection_type, order_by=None, first=None, after=None, last=None, before=None):
+    """
+    Slice ``queryset`` into a Relay connection using keyset (seek) pagination.
+
+    Rows are ordered by ``(order_by, pk)`` and cursors carry that pair, so
+    every page is a bounded index range scan regardless of how deep the
+    client has paged. Page sizes are capped at ``CRM_MAX_PAGE_SIZE``.
+    """
+    rows, limit, backward = _page_query(queryset, order_by, first, after, last, before)
+    return _connection(connection_type, list(rows), limit, backward, after, before)
+
+
+async def apaginate(queryset, connection_type, order_by=None, first=None, after=None, last=None, before=None):
+    """
+    ``paginate`` for async execution: the page is read with async iteration.
+    """
+    rows, limit, backward = _page_query(queryset, order_by, first, after, last, before)
+    return _connection(connection_type, [row async for row in rows], limit, backward, after, before)
@@ -0,0 +1,257 @@
+"""
+Order reminder pipeline.
+
+Customers with orders placed in the last ``DAYS`` days get one reminder
+each, listing those orders. Customers are read in keyset pages ordered by
+email (``email > last``, served by the unique index), so each customer is
+seen once per run however many orders they placed and only one page of
+``BATCH_SIZE`` customers is held in memory. Each page costs two queries:
+the customers, then their order ids.
+
+A page is dispatched through a bounded thread pool (``WORKERS`` threads),
+every send waits for the shared rate limiter (``RATE`` sends per second)
+and failed sends are retried ``RETRIES`` times with exponential backoff.
+Reminders that still fail are reported in the totals, not retried by
+later runs.
+
+Progress is kept in a watermark file. A run covers the orders placed in
+``[sent_until, until)``; after every page the last email is checkpointed,
+and when the run completes ``sent_until`` moves to ``until``. A rerun,
+even after a crash, therefore neither resends covered orders nor skips
+the rest of an interrupted run.
+
+Configure it with ``CRM_REMINDERS`` in settings, e.g.::
+
+    CRM_REMINDERS = {
+        'SENDER': 'crm.reminders.FileSender',   # or 'crm.reminders.EmailSender'
+        'DAYS': 7,
+        'BATCH_SIZE': 500,
+        'WORKERS': 4,
+        'RATE': 10,
+        'RETRIES': 3,
+        'WATERMARK': '/tmp/order_reminders_watermark.json',
+    }
+"""
+import datetime
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from .joblog import current_run, emit
+from .models import Customer, Order
+
+DEFAULTS = {
+    'SENDER': 'crm.reminders.FileSender',
+    'DAYS': 7,
+    'BATCH_SIZE': 500,
+    'WORKERS': 4,
+    'RATE': 10,
+    'RETRIES': 3,
+    'BACKOFF': 0.5,
+    'WATERMARK': '/tmp/order_reminders_watermark.json',
+}
+
+Reminder = namedtuple('Reminder', ['email', 'name', 'order_ids'])
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CRM_REMINDERS', {})}
+
+
+class FileSender:
+    """
+    Write one ``reminder`` record per reminder to the job log (see
+    crm.joblog) instead of sending mail, under the run it was created in.
+    """
+
+    def __init__(self, config):
+        self.run = current_run()
+
+    def send(self, reminder):
+        fields = {'email': reminder.email, 'order_ids': list(reminder.order_ids)}
+        if self.run is not None:
+            self.run.log('reminder', **fields)
+        else:
+            emit('send_order_reminders', 'reminder', **fields)
+
+
+class EmailSender:
+    """
+    Send the reminder with Django's mail backend (point EMAIL_BACKEND or
+    EMAIL_HOST/EMAIL_PORT at a debugging SMTP server to try it out).
+    """
+
+    def __init__(self, config):
+        self.from_email = config.get('FROM_EMAIL') or settings.DEFAULT_FROM_EMAIL
+
+    def send(self, reminder):
+        orders = ', '.join(f"#{order_id}" for order_id in reminder.order_ids)
+        send_mail(
+            "Your recent orders",
+            f"Hello {reminder.name},\n\nThank you for your orders {orders}.",
+            self.from_email,
+            [reminder.email],
+        )
+
+
+class RateLimiter:
+    """
+    Spaces calls to ``wait`` at least ``1 / rate`` seconds apart across
+    threads. A falsy ``rate`` disables the limit.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def send_with_retry(sender, reminder, limiter, retries, backoff):
+    """
+    Send ``reminder``, retrying ``retries`` times; return the exception of
+    the last attempt, or None on success.
+    """
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            sender.send(reminder)
+            return None
+        except Exception as e:
+            error = e
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+    return error
+
+
+def read_watermark(path):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    for key in ('sent_until', 'until'):
+        if state.get(key):
+            state[key] = parse_datetime(state[key])
+    return state
+
+
+def write_watermark(path, state):
+    """
+    Replace the watermark file atomically, so a crash never leaves it half written.
+    """
+    state = {key: value.isoformat() if isinstance(value, datetime.datetime) else value
+             for key, value in state.items()}
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def reminder_pages(since, until, after_email, batch_size):
+    """
+    Yield lists of ``Reminder`` for the customers with orders placed in
+    ``[since, until)`` and an email after ``after_email``, in email order.
+    """
+    in_window = {'order_date__gte': since, 'order_date__lt': until}
+    customers = (
+        Customer.objects
+        .filter(Exists(Order.objects.filter(customer=OuterRef('pk'), **in_window)))
+        .order_by('email')
+    )
+    while True:
+        page = customers
+        if after_email is not None:
+            page = page.filter(email__gt=after_email)
+        page = list(page.values_list('pk', 'name', 'email')[:batch_size])
+        if not page:
+            return
+        order_ids = {pk: [] for pk, _, _ in page}
+        for customer_id, order_id in (
+            Order.objects
+            .filter(customer_id__in=list(order_ids), **in_window)
+            .order_by('customer_id', 'order_date', 'pk')
+            .values_list('customer_id', 'pk')
+        ):
+            order_ids[customer_id].append(order_id)
+        yield [Reminder(email, name, order_ids[pk]) for pk, name, email in page]
+        after_email = page[-1][2]
+
+
+def send_order_reminders(now=None, sender=None, dry_run=False, progress=None, **options):
+    """
+    Send the reminders due at ``now`` and return the totals. ``options``
+    override the ``CRM_REMINDERS`` settings (lower-case keys).
+    """
+    config = get_config()
+    config.update({key.upper(): value for key, value in options.items() if value is not None})
+    if config['BATCH_SIZE'] < 1 or config['WORKERS'] < 1:
+        raise ValueError("batch_size and workers must be positive")
+    now = now or timezone.now()
+    sender = sender or import_string(config['SENDER'])(config)
+    limiter = RateLimiter(config['RATE'])
+    path = config['WATERMARK']
+
+    state = read_watermark(path)
+    since = now - datetime.timedelta(days=config['DAYS'])
+    if state.get('sent_until'):
+        since = max(since, state['sent_until'])
+    # Resume an interrupted run over the same window.
+    until = state.get('until') or now
+    after_email = state.get('after_email')
+
+    totals = {'customers': 0, 'orders': 0, 'sent': 0, 'failed': 0, 'batches': 0, 'errors': []}
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=config['WORKERS']) as pool:
+        for page in reminder_pages(since, until, after_email, config['BATCH_SIZE']):
+            totals['batches'] += 1
+            totals['customers'] += len(page)
+            totals['orders'] += sum(len(reminder.order_ids) for reminder in page)
+            if not dry_run:
+                errors = pool.map(
+                    lambda reminder: send_with_retry(sender, reminder, limiter, config['RETRIES'], config['BACKOFF']),
+                    page,
+                )
+                for reminder, error in zip(page, errors):
+                    if error is None:
+                        totals['sent'] += 1
+                    else:
+                        totals['failed'] += 1
+                        totals['errors'].append(f"{reminder.email}: {error}")
+                write_watermark(path, {**state, 'until': until, 'after_email': page[-1].email})
+            if progress:
+                progress(dict(totals, seconds=time.monotonic() - started))
+
+    if not dry_run:
+        write_watermark(path, {'sent_until': until})
+    totals['seconds'] = time.monotonic() - started
+    return totals
+
+
+def format_reminders(totals):
+    """
+    One-line summary of a run, the last line of the command output.
+    """
+    return (
+        f"Sent {totals['sent']} reminders for {totals['orders']} orders to {totals['customers']} customers "
+        f"in {totals['batches']} batches ({totals['failed']} failed)"
+    )
@@ -0,0 +1,171 @@
+"""
+CRM report computed from the rollups and the database.
+
+All-time totals and the daily and weekly breakdowns are read from
+``DailyStats`` (see crm.rollups), so they cost one row per day whatever
+the order volume; only the partial first and last day of the period are
+aggregated from the orders. The period's top customers and products are
+grouped ``annotate`` queries over the period's orders. Python only ever holds
+aggregated rows: one per day of the period and ``top`` customers and
+products.
+
+Money is summed as whole cents and converted back to ``Decimal`` at the
+end, so the figures are exact on every backend, including SQLite, where
+decimal columns are stored as floating point.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Customer, OrderItem, Order, DailyStats, cents_to_decimal
+from .rollups import cents
+
+DEFAULT_REPORT_DAYS = 7
+DEFAULT_TOP = 10
+
+CENT = Decimal('0.01')
+
+
+def get_report_days():
+    return getattr(settings, 'CRM_REPORT_DAYS', DEFAULT_REPORT_DAYS)
+
+
+def _period_row(period, orders, revenue_cents):
+    return {'period': period, 'orders': orders, 'revenue': cents_to_decimal(revenue_cents)}
+
+
+def _midnight(date):
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time()))
+
+
+def _daily_rows(start, end):
+    """
+    ``(date, orders, revenue_cents)`` per local day of ``[start, end)``.
+
+    Days entirely inside the range are read from the rollups; the partial
+    first and last days are aggregated from the orders themselves, so the
+    rows add up to exactly the orders placed in the range.
+    """
+    first_full = timezone.localdate(start)
+    if _midnight(first_full) < start:
+        first_full += datetime.timedelta(days=1)
+    end_full = timezone.localdate(end)
+    rows, partial = {}, []
+    if first_full < end_full:
+        rows.update(
+            (date, (orders, revenue_cents))
+            for date, orders, revenue_cents in DailyStats.objects.filter(
+                date__gte=first_full, date__lt=end_full,
+            ).values_list('date', 'orders', 'revenue_cents')
+        )
+        if start < _midnight(first_full):
+            partial.append((start, _midnight(first_full)))
+        if _midnight(end_full) < end:
+            partial.append((_midnight(end_full), end))
+    else:
+        partial.append((start, end))
+    if partial:
+        in_partial = Q()
+        for lower, upper in partial:
+            in_partial |= Q(order_date__gte=lower, order_date__lt=upper)
+        for row in Order.objects.filter(in_partial).annotate(day=TruncDate('order_date')).values('day').annotate(
+            orders=Count('pk'), revenue_cents=cents(F('total_amount')),
+        ).order_by():
+            orders, revenue_cents = rows.get(row['day'], (0, 0))
+            rows[row['day']] = (orders + row['orders'], revenue_cents + row['revenue_cents'])
+    return [(date, *rows[date]) for date in sorted(rows)]
+
+
+def generate_report(start=None, end=None, top=DEFAULT_TOP):
+    """
+    Return the CRM report for orders placed in ``[start, end)``.
+
+    ``end`` defaults to now and ``start`` to ``CRM_REPORT_DAYS`` before it.
+    Totals cover all time. Every period figure covers exactly ``[start,
+    end)``: the ``period_*`` figures and the daily and weekly breakdowns
+    (by local day, the first and last possibly partial) as well as the top
+    ``top`` customers and products (by revenue).
+    """
+    end = end or timezone.now()
+    start = start or end - datetime.timedelta(days=get_report_days())
+    in_period = Q(order_date__gte=start, order_date__lt=end)
+    period_orders = Order.objects.filter(in_period)
+
+    customers = Customer.objects.aggregate(
+        total=Count('pk'),
+        new=Count('pk', filter=Q(created_at__gte=start, created_at__lt=end)),
+    )
+    totals = DailyStats.objects.aggregate(orders=Sum('orders'), revenue=Sum('revenue_cents'))
+
+    daily, weeks = [], defaultdict(lambda: [0, 0])
+    for date, orders, revenue_cents in _daily_rows(start, end):
+        daily.append(_period_row(date, orders, revenue_cents))
+        week = weeks[date - datetime.timedelta(days=date.weekday())]
+        week[0] += orders
+        week[1] += revenue_cents
+    weekly = [_period_row(week, *weeks[week]) for week in sorted(weeks)]
+    period_count = sum(row['orders'] for row in daily)
+    period_revenue = sum((row['revenue'] for row in daily), Decimal('0.00'))
+
+    top_customers = (
+        period_orders
+        .values('customer_id', 'customer__name', 'customer__email')
+        .annotate(orders=Count('pk'), revenue=cents(F('total_amount')))
+        .order_by('-revenue', 'customer_id')[:top]
+    )
+    top_products = (
+        OrderItem.objects
+        .filter(order__order_date__gte=start, order__order_date__lt=end)
+        .values('product_id', 'product__name')
+        .annotate(units=Sum('quantity'), revenue=cents(F('quantity') * F('unit_price')))
+        .order_by('-revenue', 'product_id')[:top]
+    )
+
+    return {
+        'generated_at': timezone.now(),
+        'start': start,
+        'end': end,
+        'total_customers': customers['total'],
+        'new_customers': customers['new'],
+        'total_orders': totals['orders'] or 0,
+        'total_revenue': cents_to_decimal(totals['revenue']),
+        'period_orders': period_count,
+        'period_revenue': period_revenue,
+        'average_order_value': (period_revenue / period_count).quantize(CENT) if period_count else Decimal('0.00'),
+        'daily': daily,
+        'weekly': weekly,
+        'top_customers': [
+            {
+                'customer_id': row['customer_id'],
+                'name': row['customer__name'],
+                'email': row['customer__email'],
+                'orders': row['orders'],
+                'revenue': cents_to_decimal(row['revenue']),
+            }
+            for row in top_customers
+        ],
+        'top_products': [
+            {
+                'product_id': row['product_id'],
+                'name': row['product__name'],
+                'quantity': row['units'],
+                'revenue': cents_to_decimal(row['revenue']),
+            }
+            for row in top_products
+        ],
+    }
+
+
+def format_report(report, timestamp):
+    """
+    One-line summary written to the report log.
+    """
+    return (
+        f"{timestamp} - Report: {report['total_customers']} customers, "
+        f"{report['total_orders']} orders, ${report['total_revenue']} revenue"
+    )
@@ -0,0 +1,203 @@
+"""
+Incrementally maintained order statistics.
+
+``DailyStats``, ``CustomerStats`` and ``ProductStats`` hold order counts,
+units and revenue (in cents) per day, customer and product. The order
+creation paths (``place_order`` and ``bulk_create_orders``) call
+``record_orders`` inside their transaction, which adds the new orders with
+one ``INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x`` per table,
+so the rollups commit or roll back together with the orders and
+concurrent writers never overwrite each other's increments.
+
+``rebuild_rollups`` recomputes them from the orders. It is idempotent: the
+days in the range are replaced, not added to, and the lifetime rows of the
+customers and products ordered in the range are recomputed from all of
+their orders. Run it on closed days (``reconcile_rollups`` defaults to
+the last two full days) or without a range after loading data by other
+means than the order creation paths.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, Sum
+from django.db.models.functions import Round, TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, DailyStats, CustomerStats, ProductStats
+
+COUNTERS = ('orders', 'units', 'revenue_cents')
+
+# Rows per INSERT, well below SQLite's bound parameter limit.
+BATCH_SIZE = 250
+
+
+def to_cents(amount):
+    return int((Decimal(amount) * 100).quantize(Decimal(1)))
+
+
+def cents(expression):
+    """
+    ``SUM(ROUND(expression * 100))``: the exact total of a money
+    expression, in cents.
+    """
+    return Sum(Round(expression * 100), output_field=IntegerField())
+
+
+def _upsert(model, rows, increment=True):
+    """
+    Write ``rows`` (``{pk: {counter: value}}``) into ``model``, adding to
+    existing rows when ``increment`` is set and replacing them otherwise.
+    """
+    rows = list(rows.items())
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    pk = qn(model._meta.pk.column)
+    columns = ', '.join(qn(column) for column in COUNTERS)
+    if increment:
+        updates = ', '.join(f"{qn(column)} = {table}.{qn(column)} + excluded.{qn(column)}" for column in COUNTERS)
+    else:
+        updates = ', '.join(f"{qn(column)} = excluded.{qn(column)}" for column in COUNTERS)
+    pk_field = model._meta.pk
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            params = []
+            for key, counters in batch:
+                params.append(pk_field.get_db_prep_value(key, connection))
+                params.extend(int(counters.get(column) or 0) for column in COUNTERS)
+            values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f"INSERT INTO {table} ({pk}, {columns}) VALUES {values} "
+                f"ON CONFLICT ({pk}) DO UPDATE SET {updates}",
+                params,
+            )
+
+
+def _empty():
+    return dict.fromkeys(COUNTERS, 0)
+
+
+def record_orders(orders):
+    """
+    Add ``orders`` to the rollups. ``orders`` is an iterable of
+    ``(order, lines)`` pairs where ``lines`` yields ``(product_id, quantity,
+    unit_price)``. Call it in the transaction that creates the orders.
+    """
+    days, customers, products = defaultdict(_empty), defaultdict(_empty), defaultdict(_empty)
+    for order, lines in orders:
+        revenue = to_cents(order.total_amount)
+        units = 0
+        for product_id, quantity, unit_price in lines:
+            units += quantity
+            product = products[product_id]
+            product['orders'] += 1
+            product['units'] += quantity
+            product['revenue_cents'] += to_cents(unit_price * quantity)
+        for stats in (days[timezone.localdate(order.order_date)], customers[order.customer_id]):
+            stats['orders'] += 1
+            stats['units'] += units
+            stats['revenue_cents'] += revenue
+
+    _upsert(DailyStats, days)
+    _upsert(CustomerStats, customers)
+    _upsert(ProductStats, products)
+
+
+def forget_orders(orders):
+    """
+    Subtract the orders in the ``orders`` queryset from the day and product
+    rollups before they are deleted; their customers' rows go with the
+    customers. Three grouped queries, however many orders there are.
+    """
+    days, products = defaultdict(_empty), defaultdict(_empty)
+    for row in orders.annotate(day=TruncDate('order_date')).values('day').annotate(
+        count=Count('pk'), revenue=cents(F('total_amount')),
+    ).order_by():
+        days[row['day']].update(orders=-row['count'], revenue_cents=-row['revenue'])
+    items = OrderItem.objects.filter(order__in=orders)
+    for row in items.annotate(day=TruncDate('order__order_date')).values('day').annotate(
+        count=Sum('quantity'),
+    ).order_by():
+        days[row['day']]['units'] = -row['count']
+    for row in items.values('product_id').annotate(
+        count=Count('pk'), units=Sum('quantity'), revenue=cents(F('quantity') * F('unit_price')),
+    ).order_by():
+        products[row['product_id']].update(orders=-row['count'], units=-row['units'], revenue_cents=-row['revenue'])
+    _upsert(DailyStats, days)
+    _upsert(ProductStats, products)
+
+
+def _day_bounds(start, end):
+    """
+    Return the aware datetimes bounding the dates ``start`` to ``end``
+    (inclusive, either may be None).
+    """
+    tz = timezone.get_current_timezone()
+    lower = start and datetime.datetime.combine(start, datetime.time.min, tzinfo=tz)
+    upper = end and datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+    return lower, upper
+
+
+def _in_range(queryset, lower, upper, field='order_date'):
+    if lower:
+        queryset = queryset.filter(**{f'{field}__gte': lower})
+    if upper:
+        queryset = queryset.filter(**{f'{field}__lt': upper})
+    return queryset
+
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Recompute the rollups for the orders placed from ``start`` to ``end``
+    (dates, inclusive). Without a range everything is rebuilt.
+    """
+    lower, upper = _day_bounds(start, end)
+    full = start is None and end is None
+    orders = _in_range(Order.objects.all(), lower, upper)
+    items = _in_range(OrderItem.objects.all(), lower, upper, 'order__order_date')
+
+    with transaction.atomic():
+        days = defaultdict(_empty)
+        for row in orders.annotate(day=TruncDate('order_date')).values('day').annotate(
+            count=Count('pk'), revenue=cents(F('total_amount')),
+        ).order_by():
+            days[row['day']].update(orders=row['count'], revenue_cents=row['revenue'])
+        for row in items.annotate(day=TruncDate('order__order_date')).values('day').annotate(
+            count=Sum('quantity'),
+        ).order_by():
+            days[row['day']]['units'] = row['count']
+        _in_range(DailyStats.objects.all(), start, end and end + datetime.timedelta(days=1), 'date').delete()
+        _upsert(DailyStats, days, increment=False)
+
+        if full:
+            CustomerStats.objects.all().delete()
+            ProductStats.objects.all().delete()
+            customer_orders, customer_items = Order.objects.all(), OrderItem.objects.all()
+            product_items = OrderItem.objects.all()
+        else:
+            customer_ids = orders.values('customer_id')
+            customer_orders = Order.objects.filter(customer_id__in=customer_ids)
+            customer_items = OrderItem.objects.filter(order__customer_id__in=customer_ids)
+            product_items = OrderItem.objects.filter(product_id__in=items.values('product_id'))
+
+        customers = defaultdict(_empty)
+        for row in customer_orders.values('customer_id').annotate(
+            count=Count('pk'), revenue=cents(F('total_amount')),
+        ).order_by():
+            customers[row['customer_id']].update(orders=row['count'], revenue_cents=row['revenue'])
+        for row in customer_items.values('order__customer_id').annotate(count=Sum('quantity')).order_by():
+            customers[row['order__customer_id']]['units'] = row['count']
+        _upsert(CustomerStats, customers, increment=False)
+
+        products = defaultdict(_empty)
+        for row in product_items.values('product_id').annotate(
+            count=Count('pk'), units=Sum('quantity'), revenue=cents(F('quantity') * F('unit_price')),
+        ).order_by():
+            products[row['product_id']].update(orders=row['count'], units=row['units'], revenue_cents=row['revenue'])
+        _upsert(ProductStats, products, increment=False)
+
+    return len(days), len(customers), len(products)
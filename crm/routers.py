@@ -0,0 +1,74 @@
+"""
+Read/write routing for the production database mode (see settings).
+
+``ReadWriteRouter`` sends writes to ``default``, the writer, and reads to
+``CRM_DATABASE_REPLICA``, a read-only connection to the same SQLite file:
+in WAL mode readers see the last committed data without waiting for the
+writer, so the replica is never behind. Reads stay on the writer inside
+``writer()``, which the GraphQL view and ``crm.executor`` enter for
+mutations, and inside a transaction on ``default``, so a mutation always
+sees its own changes.
+
+``writer()`` also runs the mutations of one process one at a time: threads
+queue on a lock instead of polling SQLite's busy handler, which sleeps in
+growing steps. Writers in other processes are kept apart by ``BEGIN
+IMMEDIATE`` and the busy timeout of the backend.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+DEFAULT_REPLICA = 'replica'
+
+_writing = ContextVar('crm_writing', default=False)
+_write_lock = threading.Lock()
+
+
+def get_replica_alias():
+    return getattr(settings, 'CRM_DATABASE_REPLICA', DEFAULT_REPLICA)
+
+
+def is_routed():
+    return any(isinstance(r, ReadWriteRouter) for r in router.routers)
+
+
+@contextmanager
+def writer():
+    """
+    Route every query of the block to the writer connection.
+    """
+    if _writing.get():
+        yield
+        return
+    token = _writing.set(True)
+    locked = is_routed()
+    if locked:
+        _write_lock.acquire()
+    try:
+        yield
+    finally:
+        if locked:
+            _write_lock.release()
+        _writing.reset(token)
+
+
+class ReadWriteRouter:
+
+    def db_for_read(self, model, **hints):
+        if _writing.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replica = get_replica_alias()
+        return replica if replica in settings.DATABASES else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -1,13 +1,21 @@
 import graphene
+from asgiref.sync import sync_to_async
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
-from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
+from graphql import GraphQLError
 import re
-from .models import Customer, Product, Order
-from crm.models import Producttouc
+from .models import Customer, Product, Order, OrderItem, CustomerStats, cents_to_decimal
 from .filters import CustomerFilter, ProductFilter, OrderFilter
+from .bulk import bulk_create_customers, bulk_create_products, bulk_create_orders
+from .cache import invalidate_models
+from .inventory import restock_low_stock_products
+from .orders import OrderPlacementError, get_order_lines, place_order
+from .loaders import get_loaders, is_async
+from .optimizer import optimize_queryset, connection_node_fields
+from .pagination import apaginate, paginate
+from .search import search as search_queryset
+from .reports import DEFAULT_TOP, generate_report
 
 
 # GraphQL Types
@@ -29,13 +37,98 @@ class ProductType(DjangoObjectType):
         fields = ("id", "name", "price", "stock", "created_at")
 
 
+class OrderItemType(DjangoObjectType):
+    """
+    Represents one line of an order: a product, its quantity and unit price.
+    """
+    class Meta:
+        model = OrderItem
+        fields = ("id", "product", "quantity", "unit_price")
+
+
 class OrderType(DjangoObjectType):
     """
     Represents an order in the system.
     """
     class Meta:
         model = Order
-        fields = ("id", "customer", "products", "total_amount", "order_date")
+        fields = ("id", "customer", "products", "items", "total_amount", "order_date")
+
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customer.load(self.customer_id)
+
+    def resolve_products(self, info):
+        if 'products' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.products.all()
+        return get_loaders(info).order_products.load(self.pk)
+
+    def resolve_items(self, info):
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.items.all()
+        return get_loaders(info).order_items.load(self.pk)
+
+
+# Report types (resolved from the dicts built by crm.reports)
+class PeriodStatsType(graphene.ObjectType):
+    """
+    Orders and revenue of one day or week (the week starts on Monday).
+    """
+    period = graphene.Date()
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class TopCustomerType(graphene.ObjectType):
+    customer_id = graphene.ID()
+    name = graphene.String()
+    email = graphene.String()
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class TopProductType(graphene.ObjectType):
+    product_id = graphene.ID()
+    name = graphene.String()
+    quantity = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class CRMReportType(graphene.ObjectType):
+    """
+    Customer, order and revenue figures aggregated in the database.
+    """
+    generated_at = graphene.DateTime()
+    start = graphene.DateTime()
+    end = graphene.DateTime()
+    total_customers = graphene.Int()
+    new_customers = graphene.Int()
+    total_orders = graphene.Int()
+    total_revenue = graphene.Decimal()
+    period_orders = graphene.Int()
+    period_revenue = graphene.Decimal()
+    average_order_value = graphene.Decimal()
+    daily = graphene.List(PeriodStatsType)
+    weekly = graphene.List(PeriodStatsType)
+    top_customers = graphene.List(TopCustomerType)
+    top_products = graphene.List(TopProductType)
+
+
+# Relay connections (keyset paginated, see crm.pagination)
+class CustomerConnection(graphene.relay.Connection):
+    class Meta:
+        node = CustomerType
+
+
+class ProductConnection(graphene.relay.Connection):
+    class Meta:
+        node = ProductType
+
+
+class OrderConnection(graphene.relay.Connection):
+    class Meta:
+        node = OrderType
 
 
 # Input Types for Filtering
@@ -93,14 +186,25 @@ class ProductInput(graphene.InputObjectType):
     name = graphene.String(required=True)
     price = graphene.Decimal(required=True)
     stock = graphene.Int()
+    description = graphene.String()
+
+
+class OrderItemInput(graphene.InputObjectType):
+    """
+    Represents one order line: a product and the quantity ordered.
+    """
+    product_id = graphene.ID(required=True)
+    quantity = graphene.Int()
 
 
 class OrderInput(graphene.InputObjectType):
     """
     Represents the input fields for creating or updating an order.
+    Each entry of product_ids orders one unit; items carry explicit quantities.
     """
     customer_id = graphene.ID(required=True)
-    product_ids = graphene.List(graphene.ID, required=True)
+    product_ids = graphene.List(graphene.ID)
+    items = graphene.List(OrderItemInput)
     order_date = graphene.DateTime()
 
 
@@ -128,6 +232,7 @@ class CreateCustomer(graphene.Mutation):
             )
             customer.full_clean()
             customer.save()
+            invalidate_models(Customer)
             return CreateCustomer(
                 customer=customer, 
                 message="Customer created successfully"
@@ -151,23 +256,10 @@ class BulkCreateCustomers(graphene.Mutation):
     errors = graphene.List(graphene.String)
     
     def mutate(self, info, input):
-        customers = []
-        errors = []
-        
-        with transaction.atomic():
-            for customer_data in input:
-                try:
-                    customer = Customer(
-                        name=customer_data.name,
-                        email=customer_data.email,
-                        phone=customer_data.phone
-                    )
-                    customer.full_clean()
-                    customer.save()
-                    customers.append(customer)
-                except Exception as e:
-                    errors.append(f"Error creating customer {customer_data.name}: {str(e)}")
+        customers, errors = bulk_create_customers(input)
         
+        if customers:
+            invalidate_models(Customer)
         return BulkCreateCustomers(customers=customers, errors=errors)
 
 class CreateProduct(graphene.Mutation):
@@ -190,15 +282,34 @@ class CreateProduct(graphene.Mutation):
             
             product = Product(
                 name=input.name,
+                description=input.description or '',
                 price=input.price,
                 stock=input.stock or 0
             )
             product.full_clean()
             product.save()
+            invalidate_models(Product)
             return CreateProduct(product=product)
         except ValidationError as e:
             raise Exception(f"Validation error: {str(e)}")
 
+class BulkCreateProducts(graphene.Mutation):
+    """
+    Creates multiple new products.
+    """
+    class Arguments:
+        input = graphene.List(ProductInput, required=True)
+    
+    products = graphene.List(ProductType)
+    errors = graphene.List(graphene.String)
+    
+    def mutate(self, info, input):
+        products, errors = bulk_create_products(input)
+        
+        if products:
+            invalidate_models(Product)
+        return BulkCreateProducts(products=products, errors=errors)
+
 class CreateOrder(graphene.Mutation):
     """
     Create an order.
@@ -210,58 +321,52 @@ class CreateOrder(graphene.Mutation):
     
     def mutate(self, info, input):
         try:
-            # Validate customer exists
-            customer = Customer.objects.get(id=input.customer_id)
+            lines = get_order_lines(input.product_ids, input.items)
+            order = place_order(input.customer_id, lines, input.order_date)
+        except OrderPlacementError as e:
+            raise GraphQLError(str(e), extensions={'retryable': e.retryable})
+        invalidate_models(Order, Product)
 
-            # Validate at least one product is provided
-            if not input.product_ids or len(input.product_ids) == 0:
-                raise Exception("At least one product must be selected")
+        return CreateOrder(order=order)
 
-            # Validate products exist
-            products = Product.objects.filter(id__in=input.product_ids)
-            if len(products) != len(input.product_ids):
-                raise Exception("Some product IDs are invalid")
-            
-            # Calculate total amount
-            total_amount = sum(product.price for product in products)
-            
-            # Create order
-            order = Order.objects.create(
-                customer=customer,
-                total_amount=total_amount
-            )
-            order.products.set(products)
-            
-            return CreateOrder(order=order)
-        except Customer.DoesNotExist:
-            raise Exception("Customer not found")
-        except Exception as e:
-            raise Exception(str(e))
+
+class BulkCreateOrders(graphene.Mutation):
+    """
+    Creates multiple new orders.
+    """
+    class Arguments:
+        input = graphene.List(OrderInput, required=True)
+    
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+    
+    def mutate(self, info, input):
+        orders, errors = bulk_create_orders(input)
+        
+        if orders:
+            invalidate_models(Order)
+        return BulkCreateOrders(orders=get_loaders(info).prepare_orders(orders), errors=errors)
 
 
 class UpdateLowStockProducts(graphene.Mutation):
     """
-    Updates products with stock < 10 by incrementing their stock by 10.
+    Updates products with stock below the threshold (default 10) by
+    incrementing their stock (default 10) in a single UPDATE.
     """
     class Arguments:
-        pass
+        threshold = graphene.Int(description="Restock products with stock below this value")
+        increment = graphene.Int(description="Amount added to the stock of each low-stock product")
     
     updated_products = graphene.List(ProductType)
     message = graphene.String()
     
-    def mutate(self, info):
+    def mutate(self, info, threshold=None, increment=None):
         try:
-            # Find products with stock < 10
-            low_stock_products = Product.objects.filter(stock__lt=10)
-            
-            updated_products = []
-            for product in low_stock_products:
-                # Increment stock by 10
-                product.stock += 10
-                product.save()
-                updated_products.append(product)
+            updated_products = restock_low_stock_products(threshold, increment)
             
             message = f"Successfully updated {len(updated_products)} low-stock products"
+            if updated_products:
+                invalidate_models(Product)
             
             return UpdateLowStockProducts(
                 updated_products=updated_products,
@@ -271,93 +376,190 @@ class UpdateLowStockProducts(graphene.Mutation):
             raise Exception(f"Error updating low-stock products: {str(e)}")
 
 
+# Querysets behind the connection fields, shared by sync and async execution
+def customer_queryset(info, filters=None, search=None, order_by=None):
+    """
+    Return ``(queryset, order_by)`` for allCustomers.
+    """
+    queryset = optimize_queryset(Customer.objects.all(), info, connection_node_fields(info))
+    
+    if filters:
+        filter_instance = CustomerFilter(filters, queryset=queryset)
+        queryset = filter_instance.qs
+    
+    if not order_by or order_by.removeprefix('-') not in CustomerFilter.order_by_fields:
+        order_by = None
+    
+    if search:
+        queryset = search_queryset(queryset, search)
+        order_by = order_by or 'search_rank'
+    
+    return queryset, order_by
+
+
+def product_queryset(info, filters=None, search=None, order_by=None):
+    """
+    Return ``(queryset, order_by)`` for allProducts.
+    """
+    queryset = optimize_queryset(Product.objects.all(), info, connection_node_fields(info))
+    
+    if filters:
+        filter_instance = ProductFilter(filters, queryset=queryset)
+        queryset = filter_instance.qs
+    
+    if not order_by or order_by.removeprefix('-') not in ProductFilter.order_by_fields:
+        order_by = None
+    
+    if search:
+        queryset = search_queryset(queryset, search)
+        order_by = order_by or 'search_rank'
+    
+    return queryset, order_by
+
+
+def order_queryset(info, filters=None, order_by=None):
+    """
+    Return ``(queryset, order_by)`` for allOrders.
+    """
+    queryset = optimize_queryset(Order.objects.all(), info, connection_node_fields(info))
+    
+    if filters:
+        filter_instance = OrderFilter(filters, queryset=queryset)
+        queryset = filter_instance.qs
+    
+    if not order_by or order_by.removeprefix('-') not in OrderFilter.order_by_fields:
+        order_by = None
+    
+    return queryset.distinct(), order_by
+
+
+# Async resolution (see crm.loaders.mark_async): graphql-core awaits sibling
+# root fields together, and nested order relations go through AsyncLoaders.
+async def _fetch_async(queryset, prepare=None):
+    rows = [row async for row in queryset]
+    return prepare(rows) if prepare else rows
+
+
+async def _paginate_async(build, info, connection_type, args, page):
+    # Filters and search may read the database (e.g. to build the n-gram
+    # index), so the queryset is built in a worker thread.
+    queryset, order_by = await sync_to_async(build)(info, *args)
+    connection = await apaginate(queryset, connection_type, order_by, **page)
+    if connection_type is OrderConnection:
+        get_loaders(info).prepare_orders(edge.node for edge in connection.edges)
+    return connection
+
+
+async def _customer_lifetime_value_async(customer_id):
+    stats = await CustomerStats.objects.filter(customer_id=customer_id).values_list('revenue_cents', flat=True).afirst()
+    if stats is None and not await Customer.objects.filter(pk=customer_id).aexists():
+        raise Exception("Customer not found")
+    return cents_to_decimal(stats)
+
+
 # Define Query and Mutation classes
 class Query(graphene.ObjectType):
     customers = graphene.List(CustomerType)
     products = graphene.List(ProductType)
     orders = graphene.List(OrderType)
 
-    all_customers = graphene.List(
-        CustomerType,
+    all_customers = graphene.relay.ConnectionField(
+        CustomerConnection,
         filters=CustomerFilterInput(),
+        search=graphene.String(description="Case-insensitive match on name or email, best matches first"),
         order_by=graphene.String(description="Order by field (name, email, created_at). Prefix with '-' for descending order.")
     )
-    all_products = graphene.List(
-        ProductType,
+    all_products = graphene.relay.ConnectionField(
+        ProductConnection,
         filters=ProductFilterInput(),
+        search=graphene.String(description="Case-insensitive match on name, best matches first"),
         order_by=graphene.String(description="Order by field (name, price, stock, created_at). Prefix with '-' for descending order.")
     )
-    all_orders = graphene.List(
-        OrderType,
+    all_orders = graphene.relay.ConnectionField(
+        OrderConnection,
         filters=OrderFilterInput(),
         order_by=graphene.String(description="Order by field (total_amount, order_date). Prefix with '-' for descending order.")
     )
     
+    crm_report = graphene.Field(
+        CRMReportType,
+        start=graphene.DateTime(description="Start of the period (default: CRM_REPORT_DAYS before end)"),
+        end=graphene.DateTime(description="End of the period, exclusive (default: now)"),
+        top=graphene.Int(description="Number of top customers and products", default_value=DEFAULT_TOP),
+    )
+    
+    customer_lifetime_value = graphene.Decimal(
+        customer_id=graphene.ID(required=True),
+        description="Total revenue of all orders of a customer, read from the rollups",
+    )
+    
+    def resolve_customer_lifetime_value(self, info, customer_id):
+        if is_async(info):
+            return _customer_lifetime_value_async(customer_id)
+        stats = CustomerStats.objects.filter(customer_id=customer_id).values_list('revenue_cents', flat=True).first()
+        if stats is None and not Customer.objects.filter(pk=customer_id).exists():
+            raise Exception("Customer not found")
+        return cents_to_decimal(stats)
+    
+    def resolve_crm_report(self, info, start=None, end=None, top=DEFAULT_TOP):
+        if top < 0:
+            raise Exception("top must be a non-negative integer")
+        if is_async(info):
+            return sync_to_async(generate_report)(start, end, top)
+        return generate_report(start, end, top)
+    
     def resolve_customers(self, info):
-        return Customer.objects.all()
+        queryset = optimize_queryset(Customer.objects.all(), info)
+        return _fetch_async(queryset) if is_async(info) else queryset
     
     def resolve_products(self, info):
-        return Product.objects.all()
+        queryset = optimize_queryset(Product.objects.all(), info)
+        return _fetch_async(queryset) if is_async(info) else queryset
     
     def resolve_orders(self, info):
-        return Order.objects.all()
+        queryset = optimize_queryset(Order.objects.all(), info)
+        if is_async(info):
+            return _fetch_async(queryset, get_loaders(info).prepare_orders)
+        return get_loaders(info).prepare_orders(queryset)
     
-    def resolve_all_customers(self, info, filters=None, order_by=None):
+    def resolve_all_customers(self, info, filters=None, search=None, order_by=None, **page):
         """
-        Resolve filtered and ordered customers.
+        Resolve a page of filtered and ordered customers. A search ranks the
+        results by relevance unless order_by is given.
         """
-        queryset = Customer.objects.all()
-        
-        if filters:
-            filter_instance = CustomerFilter(filters, queryset=queryset)
-            queryset = filter_instance.qs
-        
-        if order_by:
-            valid_order_fields = ['name', 'email', 'created_at', '-name', '-email', '-created_at']
-            if order_by in valid_order_fields:
-                queryset = queryset.order_by(order_by)
-        
-        return queryset
+        if is_async(info):
+            return _paginate_async(customer_queryset, info, CustomerConnection, (filters, search, order_by), page)
+        queryset, order_by = customer_queryset(info, filters, search, order_by)
+        return paginate(queryset, CustomerConnection, order_by, **page)
     
-    def resolve_all_products(self, info, filters=None, order_by=None):
+    def resolve_all_products(self, info, filters=None, search=None, order_by=None, **page):
         """
-        Resolve filtered and ordered products.
+        Resolve a page of filtered and ordered products. A search ranks the
+        results by relevance unless order_by is given.
         """
-        queryset = Product.objects.all()
-        
-        if filters:
-            filter_instance = ProductFilter(filters, queryset=queryset)
-            queryset = filter_instance.qs
-        
-        if order_by:
-            valid_order_fields = ['name', 'price', 'stock', 'created_at', '-name', '-price', '-stock', '-created_at']
-            if order_by in valid_order_fields:
-                queryset = queryset.order_by(order_by)
-        
-        return queryset
+        if is_async(info):
+            return _paginate_async(product_queryset, info, ProductConnection, (filters, search, order_by), page)
+        queryset, order_by = product_queryset(info, filters, search, order_by)
+        return paginate(queryset, ProductConnection, order_by, **page)
     
-    def resolve_all_orders(self, info, filters=None, order_by=None):
+    def resolve_all_orders(self, info, filters=None, order_by=None, **page):
         """
-        Resolve filtered and ordered orders.
+        Resolve a page of filtered and ordered orders.
         """
-        queryset = Order.objects.all()
-        
-        if filters:
-            filter_instance = OrderFilter(filters, queryset=queryset)
-            queryset = filter_instance.qs
-        
-        if order_by:
-            valid_order_fields = ['total_amount', 'order_date', '-total_amount', '-order_date']
-            if order_by in valid_order_fields:
-                queryset = queryset.order_by(order_by)
-        
-        return queryset.distinct()
+        if is_async(info):
+            return _paginate_async(order_queryset, info, OrderConnection, (filters, order_by), page)
+        queryset, order_by = order_queryset(info, filters, order_by)
+        connection = paginate(queryset, OrderConnection, order_by, **page)
+        get_loaders(info).prepare_orders(edge.node for edge in connection.edges)
+        return connection
 
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
+    bulk_create_products = BulkCreateProducts.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
 
 
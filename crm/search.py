@@ -0,0 +1,344 @@
+"""
+Indexed substring search for the ``icontains`` filters and the ranked
+``search`` argument.
+
+A leading-wildcard ``LIKE '%term%'`` cannot use a B-tree index, so every
+keystroke in a search box scans the table. The backends here narrow the
+rows with a trigram index first and then apply the original ``icontains``
+condition to the candidates only, so the results are exactly the rows the
+plain filter would return:
+
+* ``FTS5SearchBackend`` keeps an FTS5 ``trigram`` table per model (created
+  by migration 0005) and answers with ``MATCH``.
+* ``NgramSearchBackend`` keeps an in-process trigram inverted index, built
+  from the database on first use and refreshed every
+  ``CRM_SEARCH_NGRAM_TTL`` seconds. Rows inserted after the build are
+  always searched directly, but a row renamed by another process is only
+  found under its new name once the index is refreshed, so use it only
+  when this process is the only one writing customers and products.
+* ``LikeSearchBackend`` is plain ``icontains``, and what ``'auto'`` falls
+  back to without the FTS5 tables.
+
+Terms shorter than three characters have no trigram and always fall back
+to ``icontains``. The indexes are kept in sync by the ``post_save`` and
+``post_delete`` signals connected in ``CrmConfig.ready``; ``bulk_create``
+does not send signals, so the bulk paths call ``index_objects`` themselves.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, Product
+
+# Fields each model can be searched on; the first one drives the ranking.
+SEARCH_FIELDS = {
+    Customer: ('name', 'email'),
+    Product: ('name',),
+}
+
+MIN_TERM_LENGTH = 3
+
+# Beyond this many candidates an IN list is no cheaper than the plain filter.
+MAX_CANDIDATES = 5000
+
+DEFAULT_NGRAM_TTL = 300
+
+
+def search_table(model):
+    return f'{model._meta.db_table}_search'
+
+
+def trigrams(text):
+    return {text[i:i + MIN_TERM_LENGTH] for i in range(len(text) - MIN_TERM_LENGTH + 1)}
+
+
+def _contains(model, field, value):
+    return model.objects.filter(**{f'{field}__icontains': value})
+
+
+class LikeSearchBackend:
+    """
+    No index: every lookup is the plain ``icontains`` filter.
+    """
+    name = 'none'
+
+    def matching(self, model, field, value):
+        """
+        Return a ``values('pk')`` queryset of the ``model`` rows whose
+        ``field`` contains ``value``, case-insensitively.
+        """
+        return _contains(model, field, value).values('pk')
+
+    def index(self, model, objs):
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def rebuild(self, model=None):
+        pass
+
+
+class FTS5SearchBackend(LikeSearchBackend):
+    """
+    SQLite FTS5 ``trigram`` tables whose rowid is the primary key of the
+    indexed row. Writes go through the same connection, so they commit or
+    roll back together with the row they mirror.
+    """
+    name = 'fts5'
+    # Rows per INSERT, well below SQLite's bound parameter limit.
+    batch_size = 500
+
+    @staticmethod
+    def is_available():
+        if connection.vendor != 'sqlite':
+            return False
+        tables = set(connection.introspection.table_names())
+        return all(search_table(model) in tables for model in SEARCH_FIELDS)
+
+    def matching(self, model, field, value):
+        if len(value) < MIN_TERM_LENGTH:
+            return super().matching(model, field, value)
+        qn = connection.ops.quote_name
+        phrase = '"' + value.replace('"', '""') + '"'
+        candidates = RawSQL(
+            f"SELECT rowid FROM {qn(search_table(model))} WHERE {qn(field)} MATCH %s",
+            [phrase],
+        )
+        return _contains(model, field, value).filter(pk__in=candidates).values('pk')
+
+    def index(self, model, objs):
+        fields = SEARCH_FIELDS[model]
+        qn = connection.ops.quote_name
+        columns = ', '.join(qn(field) for field in fields)
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+        objs = list(objs)
+        with connection.cursor() as cursor:
+            for start in range(0, len(objs), self.batch_size):
+                batch = objs[start:start + self.batch_size]
+                params = [
+                    value
+                    for obj in batch
+                    for value in (obj.pk, *(getattr(obj, field) or '' for field in fields))
+                ]
+                cursor.execute(
+                    f"INSERT OR REPLACE INTO {qn(search_table(model))} (rowid, {columns}) "
+                    f"VALUES {', '.join([f'({placeholders})'] * len(batch))}",
+                    params,
+                )
+
+    def remove(self, model, pks):
+        qn = connection.ops.quote_name
+        pks = list(pks)
+        with connection.cursor() as cursor:
+            for start in range(0, len(pks), self.batch_size):
+                batch = pks[start:start + self.batch_size]
+                cursor.execute(
+                    f"DELETE FROM {qn(search_table(model))} WHERE rowid IN ({', '.join(['%s'] * len(batch))})",
+                    batch,
+                )
+
+    def rebuild(self, model=None):
+        for model in [model] if model else SEARCH_FIELDS:
+            qn = connection.ops.quote_name
+            table = qn(search_table(model))
+            columns = ', '.join(qn(field) for field in SEARCH_FIELDS[model])
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {table}")
+                cursor.execute(
+                    f"INSERT INTO {table} (rowid, {columns}) "
+                    f"SELECT {qn(model._meta.pk.column)}, {columns} FROM {qn(model._meta.db_table)}"
+                )
+
+
+class _NgramIndex:
+
+    def __init__(self, rows):
+        self.built_at = time.monotonic()
+        self.max_pk = 0
+        self.texts = {}
+        self.postings = defaultdict(set)
+        for pk, text in rows:
+            self.add(pk, text)
+
+    def add(self, pk, text):
+        self.discard(pk)
+        text = (text or '').lower()
+        self.texts[pk] = text
+        self.max_pk = max(self.max_pk, pk)
+        for gram in trigrams(text):
+            self.postings[gram].add(pk)
+
+    def discard(self, pk):
+        text = self.texts.pop(pk, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            self.postings[gram].discard(pk)
+
+    def candidates(self, value):
+        value = value.lower()
+        grams = sorted(trigrams(value), key=lambda gram: len(self.postings.get(gram, ())))
+        pks = set(self.postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            pks &= self.postings.get(gram, set())
+            if not pks:
+                break
+        return {pk for pk in pks if value in self.texts[pk]}
+
+
+class NgramSearchBackend(LikeSearchBackend):
+    """
+    Per-process trigram inverted index, one per searchable field. Changes
+    are applied once the writing transaction commits. Rows with a primary
+    key above the highest indexed one are matched in the database as well,
+    so inserts by other processes are found at once; their updates show up
+    when the index is rebuilt after its TTL.
+    """
+    name = 'ngram'
+
+    def __init__(self, ttl=DEFAULT_NGRAM_TTL):
+        self.ttl = ttl
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _get_index(self, model, field):
+        key = (model, field)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None or time.monotonic() - index.built_at > self.ttl:
+                index = self._indexes[key] = _NgramIndex(model.objects.values_list('pk', field).iterator())
+            return index
+
+    def matching(self, model, field, value):
+        if len(value) < MIN_TERM_LENGTH:
+            return super().matching(model, field, value)
+        index = self._get_index(model, field)
+        pks = index.candidates(value)
+        if len(pks) > MAX_CANDIDATES:
+            return super().matching(model, field, value)
+        # Rows the index has not seen yet are a range scan on the primary key.
+        unindexed = Q(pk__gt=index.max_pk)
+        return _contains(model, field, value).filter(Q(pk__in=sorted(pks)) | unindexed).values('pk')
+
+    def _apply(self, model, change):
+        def apply():
+            with self._lock:
+                for field in SEARCH_FIELDS[model]:
+                    index = self._indexes.get((model, field))
+                    if index is not None:
+                        change(index, field)
+
+        transaction.on_commit(apply)
+
+    def index(self, model, objs):
+        values = [(obj.pk, {field: getattr(obj, field) for field in SEARCH_FIELDS[model]}) for obj in objs]
+
+        def change(index, field):
+            for pk, texts in values:
+                index.add(pk, texts[field])
+
+        self._apply(model, change)
+
+    def remove(self, model, pks):
+        pks = list(pks)
+
+        def change(index, field):
+            for pk in pks:
+                index.discard(pk)
+
+        self._apply(model, change)
+
+    def rebuild(self, model=None):
+        with self._lock:
+            for key in list(self._indexes):
+                if model is None or key[0] is model:
+                    del self._indexes[key]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Return the backend selected by ``CRM_SEARCH_BACKEND``: ``'auto'`` picks
+    FTS5 when its tables exist and plain ``icontains`` otherwise.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = getattr(settings, 'CRM_SEARCH_BACKEND', 'auto')
+                if name == 'auto':
+                    name = 'fts5' if FTS5SearchBackend.is_available() else 'none'
+                if name == 'fts5':
+                    _backend = FTS5SearchBackend()
+                elif name == 'ngram':
+                    _backend = NgramSearchBackend(getattr(settings, 'CRM_SEARCH_NGRAM_TTL', DEFAULT_NGRAM_TTL))
+                elif name == 'none':
+                    _backend = LikeSearchBackend()
+                else:
+                    raise ValueError(f"Unknown CRM_SEARCH_BACKEND: {name}")
+    return _backend
+
+
+def reset_backend():
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def contains(model, field, value):
+    """
+    Exact equivalent of ``model.objects.filter(<field>__icontains=value)``,
+    as a ``values('pk')`` queryset answered from the search index.
+    """
+    return get_backend().matching(model, field, value)
+
+
+def search(queryset, value):
+    """
+    Filter ``queryset`` to the rows where any search field contains
+    ``value`` and annotate ``search_rank``: 0 for an exact match of the
+    first field, 1 for a prefix match, 2 for a substring match and 3 when
+    only another field matches. Lower is better.
+    """
+    model = queryset.model
+    first, *others = SEARCH_FIELDS[model]
+    condition = Q()
+    for field in SEARCH_FIELDS[model]:
+        condition |= Q(pk__in=contains(model, field, value))
+    return queryset.filter(condition).annotate(search_rank=Case(
+        When(**{f'{first}__iexact': value}, then=Value(0)),
+        When(**{f'{first}__istartswith': value}, then=Value(1)),
+        When(**{f'{first}__icontains': value}, then=Value(2)),
+        default=Value(3),
+        output_field=IntegerField(),
+    ))
+
+
+def index_objects(model, objs):
+    if model in SEARCH_FIELDS:
+        get_backend().index(model, objs)
+
+
+def _post_save(sender, instance, **kwargs):
+    index_objects(sender, [instance])
+
+
+def _post_delete(sender, instance, **kwargs):
+    get_backend().remove(sender, [instance.pk])
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save
+
+    for model in SEARCH_FIELDS:
+        post_save.connect(_post_save, sender=model, dispatch_uid=f'crm.search.save.{model._meta.label_lower}')
+        post_delete.connect(_post_delete, sender=model, dispatch_uid=f'crm.search.delete.{model._meta.label_lower}')
@@ -1,114 +1,83 @@
-import os
-import sys
-import django
-from datetime import datetime
-import requests
-import json
-from celery import shared_task
+"""
+Celery tasks. Importing this module is cheap and has no side effects:
+Django is set up on first call if needed (see crm.bootstrap) and the
+report, cleanup, rollup and job log modules are imported inside the tasks.
+"""
+from datetime import datetime, timedelta
 
-sys.path.append('/home/leone/Coding/ProDevAlx/alx-backend-graphql_crm')
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
-django.setup()
+from celery import shared_task
+from django.utils import timezone
 
-from .models import Customer, Order, Product
+from .bootstrap import entry_point
 
 
 @shared_task
+@entry_point
 def generate_crm_report():
     """
-    Generates a weekly CRM report by querying GraphQL endpoint for:
+    Generates a weekly CRM report with crm.reports.generate_report:
     - Total number of customers
     - Total number of orders
     - Total revenue (sum of total_amount from orders)
+    - Daily/weekly breakdowns and top customers and products for the week
     
-    Logs the report to /tmp/crm_report_log.txt with timestamp.
+    Everything is aggregated in the database. Logs the summary to the job
+    log (see crm.joblog) and returns it.
     """
 
+    from .joblog import job_run
+    from .reports import format_report, generate_report
+
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    try:
-        query = {
-            "query": """
-                query {
-                    customers {
-                        id
-                    }
-                    orders {
-                        id
-                        totalPrice
-                    }
-                }
-            """
-        }
-        
-        response = requests.post(
-            'http://localhost:8000/graphql',
-            json=query,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            if 'data' in data:
-                customers = data['data'].get('customers', [])
-                orders = data['data'].get('orders', [])
-                
-                total_customers = len(customers)
-                total_orders = len(orders)
-                total_revenue = sum(float(order.get('totalPrice', 0)) for order in orders)
-                
-                report_message = f"{timestamp} - Report: {total_customers} customers, {total_orders} orders, ${total_revenue:.2f} revenue"
-                
-                with open('/tmp/crm_report_log.txt', 'a') as log_file:
-                    log_file.write(report_message + '\n')
-                
-                print(f"CRM Report generated successfully: {report_message}")
-                return report_message
-                
-            else:
-                error_message = data.get('errors', [{'message': 'Unknown GraphQL error'}])[0]['message']
-                error_log = f"{timestamp} - GraphQL error: {error_message}"
-                
-                with open('/tmp/crm_report_log.txt', 'a') as log_file:
-                    log_file.write(error_log + '\n')
-                
-                return error_log
-        
-        else:
-            error_log = f"{timestamp} - HTTP error: Status {response.status_code}"
-            
-            with open('/tmp/crm_report_log.txt', 'a') as log_file:
-                log_file.write(error_log + '\n')
-            
-            return error_log
-    
-    except requests.exceptions.RequestException as e:
+    with job_run('generate_crm_report') as run:
         try:
-            total_customers = Customer.objects.count()
-            total_orders = Order.objects.count()
-            total_revenue = sum(order.total_price for order in Order.objects.all())
-            
-            report_message = f"{timestamp} - Report (DB fallback): {total_customers} customers, {total_orders} orders, ${total_revenue:.2f} revenue"
-            
-            with open('/tmp/crm_report_log.txt', 'a') as log_file:
-                log_file.write(report_message + '\n')
-            
-            return report_message
-            
-        except Exception as db_error:
-            error_log = f"{timestamp} - Connection error and DB fallback failed: {str(e)}, {str(db_error)}"
-            
-            with open('/tmp/crm_report_log.txt', 'a') as log_file:
-                log_file.write(error_log + '\n')
-            
-            return error_log
-    
-    except Exception as e:
-        error_log = f"{timestamp} - Error generating report: {str(e)}"
-        
-        with open('/tmp/crm_report_log.txt', 'a') as log_file:
-            log_file.write(error_log + '\n')
-        
-        return error_log
\ No newline at end of file
+            report = generate_report()
+        except Exception as e:
+            run.fail(e)
+            return f"{timestamp} - Error generating report: {str(e)}"
+
+        report_message = format_report(report, timestamp)
+        run.count('customers', report['total_customers'])
+        run.count('orders', report['period_orders'])
+        run.log('report', message=report_message)
+        print(f"CRM Report generated successfully: {report_message}")
+        return report_message
+
+
+@shared_task
+@entry_point
+def reconcile_rollups(days=2):
+    """
+    Rebuilds the order rollups of the last ``days`` full days from the
+    orders. Idempotent, so it is safe to re-run or to run over any range.
+    """
+    from .joblog import job_run
+    from .rollups import rebuild_rollups
+
+    end = timezone.localdate() - timedelta(days=1)
+    start = end - timedelta(days=days - 1)
+    with job_run('reconcile_rollups', start=start, end=end) as run:
+        day_count, customer_count, product_count = rebuild_rollups(start, end)
+        run.count('days', day_count)
+        run.count('customers', customer_count)
+        run.count('products', product_count)
+    return f"Rebuilt rollups for {start}..{end}: {day_count} days, {customer_count} customers, {product_count} products"
+
+
+@shared_task
+@entry_point
+def cleanup_inactive_customers(days=None, batch_size=None, dry_run=False):
+    """
+    Deletes customers without an order in the last ``days`` days in short
+    batched transactions (see crm.cleanup) and records the run in the job
+    log.
+    """
+    from .cleanup import cleanup_inactive_customers as run_cleanup, format_cleanup
+    from .joblog import job_run
+
+    with job_run('cleanup_inactive_customers', dry_run=dry_run) as run:
+        totals = run_cleanup(days=days, batch_size=batch_size, dry_run=dry_run)
+        for key in ('customers', 'orders', 'batches'):
+            run.count(key, totals[key])
+    return format_cleanup(totals)
@@ -1,3 +1,1488 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, router
+from django.db.utils import ConnectionHandler
+from django.db.models import Sum
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from alx_backend_graphql.schema import schema
+from alx_backend_graphql.persisted_queries import document_cache
+from alx_backend_graphql.views import CRMGraphQLView
+from .cache import reset_backend
+from .inventory import restock_low_stock_products
+from .orders import place_order
+from .models import Customer, Product, Order, OrderItem, DailyStats, CustomerStats, ProductStats
+from .pagination import encode_cursor, seek_condition
+from . import search
+from .checks import check_low_stock_threshold
+from .management.commands.check_query_plans import filtered_columns, full_scans_sqlite
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+from .views import export
+from .reports import generate_report
+from .rollups import rebuild_rollups
+from .cleanup import cleanup_inactive_customers
+from .executor import GraphQLExecutionError, InProcessExecutor, get_executor
+from .reminders import RateLimiter, send_order_reminders
+from .loaders import get_loaders, mark_async
+from .instrumentation import metrics
+from .routers import ReadWriteRouter, writer
+from . import bootstrap, cleanup, health
+from .joblog import emit, get_writer, job_run, log_files, read_records
+from .benchmarks import seed as bench_seed
+from .benchmarks.suite import compare_results, run_suite
+
+graphql_logger = logging.getLogger('crm.graphql')
+graphql_log_level = graphql_logger.level
+
+
+def setUpModule():
+    # Keep the per-operation log lines out of the test output; tests that
+    # check them use assertLogs, which lowers the level again.
+    graphql_logger.setLevel(logging.WARNING)
+
+
+def tearDownModule():
+    graphql_logger.setLevel(graphql_log_level)
+
+
+def isolate_job_log(test):
+    """
+    Point the job log and cron run records at a temporary directory for
+    the duration of ``test``; returns the directory.
+    """
+    directory = tempfile.mkdtemp()
+    settings_override = override_settings(
+        CRM_JOB_LOG={'DIR': directory, 'FLUSH_INTERVAL': 0.01},
+        CRM_HEALTH={'CRON_DIR': os.path.join(directory, 'runs')},
+    )
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    return directory
+
+
+def create_orders(count, products_per_order=2):
+    """
+    Create ``count`` orders, each for its own customer and products.
+    """
+    orders = []
+    start = Customer.objects.count()
+    for i in range(start, start + count):
+        customer = Customer.objects.create(name=f"Customer {i}", email=f"customer{i}@example.com")
+        products = [
+            Product.objects.create(name=f"Product {i}-{j}", description="", price=Decimal('9.99'), stock=5)
+            for j in range(products_per_order)
+        ]
+        order = Order.objects.create(customer=customer, total_amount=sum(p.price for p in products))
+        order.products.set(products)
+        orders.append(order)
+    return orders
+
+
+class OrderLoaderQueryCountTests(TestCase):
+    """
+    Resolving nested order relations must cost a constant number of queries.
+    """
+    query = """
+        {
+            orders { id customer { name } products { name } }
+            allOrders(orderBy: "-order_date") { edges { node { id customer { email } products { id } } } }
+        }
+    """
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(self.query, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return len(ctx.captured_queries), result.data
+
+    def test_query_count_is_independent_of_page_size(self):
+        create_orders(3)
+        small, data = self.count_queries()
+        self.assertEqual(len(data['orders']), 3)
+
+        create_orders(30)
+        large, data = self.count_queries()
+        self.assertEqual(len(data['orders']), 33)
+        self.assertEqual(small, large)
+
+    def test_relations_are_resolved(self):
+        order = create_orders(1)[0]
+        _, data = self.count_queries()
+        self.assertEqual(data['orders'][0]['customer']['name'], order.customer.name)
+        self.assertEqual(
+            sorted(p['name'] for p in data['orders'][0]['products']),
+            sorted(order.products.values_list('name', flat=True)),
+        )
+
+
+class QuerysetOptimizerTests(TestCase):
+    """
+    Root resolvers fetch only the columns and relations that were selected.
+    """
+
+    def execute(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(query, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return [q['sql'] for q in ctx.captured_queries], result.data
+
+    def test_scalar_selection_uses_only(self):
+        create_orders(2)
+        queries, data = self.execute('{ allOrders { edges { node { id totalAmount } } } }')
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('order_date', queries[0])
+        self.assertNotIn('customer_id', queries[0])
+        self.assertEqual(len(data['allOrders']['edges']), 2)
+
+    def test_relations_through_fragments_and_aliases(self):
+        order = create_orders(2)[0]
+        queries, data = self.execute("""
+            fragment OrderParts on OrderType { buyer: customer { email } }
+            { orders { ...OrderParts ... on OrderType { items: products { name } } } }
+        """)
+        self.assertEqual(len(queries), 2)
+        self.assertIn('INNER JOIN "crm_customer"', queries[0])
+        self.assertNotIn('"crm_customer"."phone"', queries[0])
+        self.assertEqual(data['orders'][0]['buyer']['email'], order.customer.email)
+        self.assertEqual(len(data['orders'][0]['items']), 2)
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    The all* connections page with (order_by, id) cursors.
+    """
+    query = """
+        query Page($first: Int, $after: String, $last: Int, $before: String) {
+            allProducts(orderBy: "-price", first: $first, after: $after, last: $last, before: $before) {
+                edges { cursor node { name } }
+                pageInfo { hasNextPage hasPreviousPage endCursor startCursor }
+            }
+        }
+    """
+
+    def setUp(self):
+        # Duplicate prices make the id tie-breaker matter.
+        for i in range(7):
+            Product.objects.create(name=f"P{i}", description="", price=Decimal(10 + i // 2), stock=1)
+
+    def page(self, **variables):
+        result = schema.execute(self.query, variable_values=variables, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return result.data['allProducts']
+
+    def test_forward_pages_cover_every_row_once(self):
+        names, after = [], None
+        while True:
+            page = self.page(first=3, after=after)
+            names.extend(edge['node']['name'] for edge in page['edges'])
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        expected = list(Product.objects.order_by('-price', '-pk').values_list('name', flat=True))
+        self.assertEqual(names, expected)
+
+    def test_backward_page(self):
+        first_page = self.page(first=4)
+        previous = self.page(last=2, before=first_page['pageInfo']['endCursor'])
+        self.assertEqual(
+            [edge['node']['name'] for edge in previous['edges']],
+            [edge['node']['name'] for edge in first_page['edges'][1:3]],
+        )
+        self.assertTrue(previous['pageInfo']['hasPreviousPage'])
+
+    @override_settings(CRM_MAX_PAGE_SIZE=5)
+    def test_page_size_is_capped(self):
+        page = self.page(first=1000)
+        self.assertEqual(len(page['edges']), 5)
+        self.assertTrue(page['pageInfo']['hasNextPage'])
+
+
+class QueryCostTests(TestCase):
+    """
+    The /graphql/ view prices documents before running them.
+    """
+
+    def post(self, query, variables=None):
+        request = RequestFactory().post(
+            '/graphql/',
+            data=json.dumps({'query': query, 'variables': variables}),
+            content_type='application/json',
+        )
+        response = CRMGraphQLView.as_view(schema=schema)(request)
+        return response.status_code, json.loads(response.content)
+
+    @override_settings(CRM_MAX_PAGE_SIZE=50)
+    def test_cost_is_reported_in_extensions(self):
+        status, body = self.post('{ allOrders(first: 10) { edges { node { id customer { name } } } } }')
+        self.assertEqual(status, 200)
+        # allOrders (1) + 10 edges * (edge 1 + node 1 + customer 1)
+        self.assertEqual(body['extensions']['cost']['requestedQueryCost'], 31)
+
+    @override_settings(CRM_MAX_QUERY_COST=100)
+    def test_over_budget_query_is_rejected_without_execution(self):
+        create_orders(1)
+        query = """
+            query ($n: Int) {
+                a: allOrders(first: $n) { edges { node { products { id } } } }
+                b: orders { customer { id } }
+            }
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            status, body = self.post(query, {'n': 100})
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(status, 400)
+        self.assertNotIn('data', body)
+        self.assertEqual(body['errors'][0]['extensions']['code'], 'QUERY_TOO_COMPLEX')
+        self.assertGreater(body['extensions']['cost']['requestedQueryCost'], 100)
+
+
+@override_settings(CRM_RESPONSE_CACHE=None)
+class PersistedQueryTests(TestCase):
+    """
+    Documents sent by hash are served from the validated document cache.
+    """
+    query = '{ products { name } }'
+
+    def setUp(self):
+        document_cache.clear()
+
+    def post(self, payload):
+        request = RequestFactory().post('/graphql/', data=json.dumps(payload), content_type='application/json')
+        return json.loads(CRMGraphQLView.as_view(schema=schema)(request).content)
+
+    def persisted(self, sha, query=None):
+        payload = {'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': sha}}}
+        if query:
+            payload['query'] = query
+        return self.post(payload)
+
+    def test_apq_round_trip(self):
+        sha = hashlib.sha256(self.query.encode()).hexdigest()
+
+        body = self.persisted(sha)
+        self.assertEqual(body['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND')
+
+        self.assertEqual(self.persisted(sha, self.query)['data'], {'products': []})
+        self.assertEqual(self.persisted(sha)['data'], {'products': []})
+        self.assertEqual(document_cache.stats()['hits'], 1)
+
+    def test_hash_must_match_query(self):
+        body = self.persisted('0' * 64, self.query)
+        self.assertEqual(body['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_HASH_MISMATCH')
+
+    def test_plain_queries_share_the_cache(self):
+        self.post({'query': self.query})
+        self.post({'query': self.query})
+        stats = document_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_invalid_documents_are_not_cached(self):
+        self.post({'query': '{ nope }'})
+        self.assertEqual(document_cache.stats()['size'], 0)
+
+
+@override_settings(CRM_RESPONSE_CACHE={'BACKEND': 'locmem', 'TTL': 60, 'FIELDS': ['allProducts', 'products']})
+class ResponseCacheTests(TestCase):
+    """
+    Cached reads are served without SQL and dropped when a mutation commits.
+    """
+    query = '{ products { name } }'
+
+    def setUp(self):
+        reset_backend()
+        self.addCleanup(reset_backend)
+        Product.objects.create(name="Desk", description="", price=Decimal('120.00'), stock=3)
+
+    def post(self, query):
+        request = RequestFactory().post(
+            '/graphql/', data=json.dumps({'query': query}), content_type='application/json'
+        )
+        return json.loads(CRMGraphQLView.as_view(schema=schema)(request).content)
+
+    def test_repeated_read_is_cached(self):
+        self.post(self.query)
+        with self.assertNumQueries(0):
+            body = self.post(self.query)
+        self.assertEqual(body['data'], {'products': [{'name': 'Desk'}]})
+
+    def test_mutation_invalidates_on_commit(self):
+        query = '{ products { name stock } }'
+        self.assertEqual(self.post(query)['data']['products'][0]['stock'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('mutation { updateLowStockProducts { message } }')
+        self.assertEqual(self.post(query)['data']['products'][0]['stock'], 13)
+
+    def test_uncached_fields_are_not_stored(self):
+        self.post('{ customers { id } }')
+        with self.assertNumQueries(1):
+            self.post('{ customers { id } }')
+
+
+class BulkCreateCustomersTests(TestCase):
+    """
+    bulkCreateCustomers validates in memory and inserts in chunks.
+    """
+    mutation = """
+        mutation ($input: [CustomerInput]!) {
+            bulkCreateCustomers(input: $input) { customers { id email } errors }
+        }
+    """
+
+    def run_mutation(self, rows):
+        result = schema.execute(self.mutation, variable_values={'input': rows}, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return result.data['bulkCreateCustomers']
+
+    def test_per_row_errors_are_reported(self):
+        Customer.objects.create(name="Existing", email="taken@example.com")
+        data = self.run_mutation([
+            {'name': 'Ann', 'email': 'ann@example.com'},
+            {'name': 'Ann again', 'email': 'ann@example.com'},
+            {'name': 'Taken', 'email': 'taken@example.com'},
+            {'name': 'Bad phone', 'email': 'bad@example.com', 'phone': 'call me'},
+            {'name': 'Bob', 'email': 'bob@example.com', 'phone': '123-456-7890'},
+        ])
+        self.assertEqual([c['email'] for c in data['customers']], ['ann@example.com', 'bob@example.com'])
+        self.assertTrue(all(c['id'] for c in data['customers']))
+        self.assertEqual(len(data['errors']), 3)
+        self.assertEqual(Customer.objects.count(), 3)
+
+    @override_settings(CRM_BULK_CHUNK_SIZE=10)
+    def test_query_count_grows_per_chunk_not_per_row(self):
+        rows = [{'name': f'C{i}', 'email': f'c{i}@example.com'} for i in range(25)]
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.run_mutation(rows)
+        self.assertEqual(len(data['customers']), 25)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "crm_customer" ')]
+        self.assertEqual(len(inserts), 3)
+
+
+class BulkCreateProductsAndOrdersTests(TestCase):
+    """
+    bulkCreateProducts and bulkCreateOrders write in chunks and report per-item errors.
+    """
+
+    def execute(self, query, variables):
+        result = schema.execute(query, variable_values=variables, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_bulk_create_products(self):
+        data = self.execute(
+            """
+            mutation ($input: [ProductInput]!) {
+                bulkCreateProducts(input: $input) { products { name stock } errors }
+            }
+            """,
+            {'input': [
+                {'name': 'Chair', 'price': '49.90', 'stock': 4},
+                {'name': 'Free', 'price': '0'},
+                {'name': 'Negative', 'price': '1.00', 'stock': -1},
+            ]},
+        )['bulkCreateProducts']
+        self.assertEqual(data['products'], [{'name': 'Chair', 'stock': 4}])
+        self.assertEqual(len(data['errors']), 2)
+
+    @override_settings(CRM_BULK_CHUNK_SIZE=5)
+    def test_bulk_create_orders_uses_constant_lookups(self):
+        customers = [Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com") for i in range(3)]
+        products = [
+            Product.objects.create(name=f"P{i}", price=Decimal('2.50') * (i + 1), stock=10) for i in range(4)
+        ]
+        rows = [
+            {'customerId': customers[i % 3].pk, 'productIds': [products[i % 4].pk, products[(i + 1) % 4].pk]}
+            for i in range(12)
+        ]
+        rows.append({'customerId': 999999, 'productIds': [products[0].pk]})
+        rows.append({'customerId': customers[0].pk, 'productIds': [999999]})
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.execute(
+                """
+                mutation ($input: [OrderInput]!) {
+                    bulkCreateOrders(input: $input) {
+                        orders { totalAmount customer { name } products { id } }
+                        errors
+                    }
+                }
+                """,
+                {'input': rows},
+            )['bulkCreateOrders']
+
+        self.assertEqual(len(data['orders']), 12)
+        self.assertEqual(len(data['errors']), 2)
+        self.assertEqual(data['orders'][0]['totalAmount'], '7.50')
+        self.assertEqual(OrderItem.objects.count(), 24)
+        # 2 lookups, 3 order chunks, 5 link chunks, 3 rollup upserts, 2 loader batches and the savepoint
+        self.assertLessEqual(len(ctx.captured_queries), 2 + 3 + 5 + 3 + 2 + 2)
+
+
+class UpdateLowStockProductsTests(TestCase):
+    """
+    updateLowStockProducts restocks with one set-based UPDATE.
+    """
+
+    def test_single_update_statement(self):
+        low = Product.objects.create(name="Low", price=Decimal('1.00'), stock=2)
+        Product.objects.create(name="Fine", price=Decimal('1.00'), stock=50)
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(
+                'mutation { updateLowStockProducts { updatedProducts { name stock } message } }',
+                context_value=SimpleNamespace(),
+            )
+        self.assertIsNone(result.errors)
+        data = result.data['updateLowStockProducts']
+        self.assertEqual(data['updatedProducts'], [{'name': 'Low', 'stock': 12}])
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+        low.refresh_from_db()
+        self.assertEqual(low.stock, 12)
+
+    def test_threshold_and_increment_arguments(self):
+        Product.objects.create(name="A", price=Decimal('1.00'), stock=15)
+        result = schema.execute(
+            'mutation { updateLowStockProducts(threshold: 20, increment: 5) { updatedProducts { stock } } }',
+            context_value=SimpleNamespace(),
+        )
+        self.assertEqual(result.data['updateLowStockProducts']['updatedProducts'], [{'stock': 20}])
+
+    def test_fallback_without_returning(self):
+        Product.objects.create(name="A", price=Decimal('1.00'), stock=5)
+        Product.objects.create(name="B", price=Decimal('1.00'), stock=11)
+        with mock.patch('crm.inventory._supports_update_returning', return_value=False):
+            updated = restock_low_stock_products()
+        self.assertEqual([(p.name, p.stock) for p in updated], [("A", 15)])
+
+
+class PlaceOrderTests(TestCase):
+    """
+    createOrder reserves stock atomically and records per-line quantities.
+    """
+    mutation = """
+        mutation ($input: OrderInput!) {
+            createOrder(input: $input) {
+                order { totalAmount items { product { name } quantity unitPrice } }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.pen = Product.objects.create(name="Pen", price=Decimal('1.50'), stock=5)
+        self.pad = Product.objects.create(name="Pad", price=Decimal('3.00'), stock=1)
+
+    def order(self, **input):
+        input.setdefault('customerId', self.customer.pk)
+        return schema.execute(self.mutation, variable_values={'input': input}, context_value=SimpleNamespace())
+
+    def test_quantities_and_duplicate_ids(self):
+        result = self.order(productIds=[self.pen.pk, self.pen.pk], items=[{'productId': self.pad.pk, 'quantity': 1}])
+        self.assertIsNone(result.errors)
+        order = result.data['createOrder']['order']
+        self.assertEqual(order['totalAmount'], '6.00')
+        self.assertEqual(
+            [(i['product']['name'], i['quantity']) for i in order['items']],
+            [('Pen', 2), ('Pad', 1)],
+        )
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 3)
+
+    def test_out_of_stock_rolls_back_every_line(self):
+        result = self.order(items=[{'productId': self.pen.pk, 'quantity': 2}, {'productId': self.pad.pk, 'quantity': 2}])
+        self.assertIn(f"Insufficient stock for product IDs: {self.pad.pk}", result.errors[0].message)
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_last_unit_is_sold_once(self):
+        self.assertIsNone(self.order(productIds=[self.pad.pk]).errors)
+        self.assertIsNotNone(self.order(productIds=[self.pad.pk]).errors)
+        self.pad.refresh_from_db()
+        self.assertEqual(self.pad.stock, 0)
+
+    def test_invalid_input(self):
+        self.assertEqual(self.order(productIds=[999999]).errors[0].message, "Some product IDs are invalid")
+        self.assertEqual(self.order(customerId=999999, productIds=[self.pen.pk]).errors[0].message, "Customer not found")
+        self.assertEqual(self.order(productIds=[]).errors[0].message, "At least one product must be selected")
+
+    def test_errors_keep_their_own_message(self):
+        with mock.patch('crm.schema.place_order', side_effect=ValueError("Order date is out of range")):
+            self.assertEqual(self.order(productIds=[self.pen.pk]).errors[0].message, "Order date is out of range")
+        self.assertEqual(self.order(customerId='x', productIds=[self.pen.pk]).errors[0].message, "Customer not found")
+
+    def test_lock_timeout_is_retryable(self):
+        locked = OperationalError("database is locked")
+        with mock.patch.object(Customer.objects, 'filter', side_effect=locked):
+            error = self.order(productIds=[self.pen.pk]).errors[0]
+        self.assertEqual(error.message, "The database is busy, please retry the order")
+        self.assertEqual(error.extensions, {'retryable': True})
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 5)
+
+    def test_single_reservation_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            place_order(self.customer.pk, {self.pen.pk: 1, self.pad.pk: 1})
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+
+
+class QueryPlanTests(TestCase):
+
+    def test_filter_combinations_use_indexes(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out, stderr=StringIO())
+        self.assertIn("no full table scans", out.getvalue())
+
+    def test_in_order_scan_must_hold_the_filtered_columns(self):
+        plan = "3 0 0 SCAN crm_customer USING INDEX crm_customer_name_id_idx"
+        queryset = CustomerFilter({'created_at__gte': '2024-01-01'}, queryset=Customer.objects.all()).qs
+        self.assertEqual(filtered_columns(queryset), {('crm_customer', 'created_at')})
+        self.assertEqual(full_scans_sqlite(plan, filtered={('crm_customer', 'created_at')}), [])
+        self.assertEqual(full_scans_sqlite(plan, filtered={('crm_customer', 'phone')}), [plan.split(' ', 3)[-1]])
+        self.assertEqual(full_scans_sqlite(plan, filtered={('crm_order', 'total_amount')}), [plan.split(' ', 3)[-1]])
+
+    def test_cursor_page_seeks_into_index(self):
+        plan = Customer.objects.filter(
+            seek_condition('name', False, encode_cursor('m', 1), forward=True)
+        ).order_by('name', 'pk')[:11].explain()
+        self.assertIn("SEARCH crm_customer USING INDEX crm_customer_name_id_idx", plan)
+
+    def test_low_stock_threshold_matches_partial_index(self):
+        plan = ProductFilter({'low_stock': 'true'}, queryset=Product.objects.all()).qs.explain()
+        self.assertIn("crm_product_low_stock_idx", plan)
+        self.assertEqual(check_low_stock_threshold(None), [])
+        with override_settings(CRM_LOW_STOCK_THRESHOLD=20):
+            self.assertEqual([w.id for w in check_low_stock_threshold(None)], ['crm.W001'])
+
+
+class SearchTests(TestCase):
+    """
+    Indexed search returns exactly the icontains results.
+    """
+    terms = ['ali', 'ALICE', 'al', 'smith', 'example', 'bob', 'zz', 'e@x']
+
+    def setUp(self):
+        search.reset_backend()
+        self.addCleanup(search.reset_backend)
+        for name, email in [
+            ("Alice", "alice@example.com"),
+            ("Alicia Smith", "asmith@example.com"),
+            ("Malia", "malia@x.org"),
+            ("Bob", "bob@alice.dev"),
+        ]:
+            Customer.objects.create(name=name, email=email)
+
+    def assert_matches_icontains(self):
+        for term in self.terms:
+            for field in ('name', 'email'):
+                expected = set(Customer.objects.filter(**{f'{field}__icontains': term}).values_list('pk', flat=True))
+                found = set(Customer.objects.filter(pk__in=search.contains(Customer, field, term)).values_list('pk', flat=True))
+                self.assertEqual(found, expected, (term, field))
+
+    def test_fts5_backend(self):
+        self.assertEqual(search.get_backend().name, 'fts5')
+        self.assert_matches_icontains()
+
+    @override_settings(CRM_SEARCH_BACKEND='ngram')
+    def test_ngram_backend(self):
+        # setUp picked the backend before this override applied.
+        search.reset_backend()
+        self.assertEqual(search.get_backend().name, 'ngram')
+        self.assert_matches_icontains()
+        # Changes reach the in-process index when the transaction commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.filter(name="Malia").get().delete()
+            Customer.objects.create(name="Alina", email="alina@example.com")
+        self.assert_matches_icontains()
+        # Rows inserted by another process (no signals here) are found at once.
+        Customer.objects.bulk_create([Customer(name="Alison", email="alison@example.com")])
+        self.assert_matches_icontains()
+
+    def test_auto_without_fts5_uses_icontains(self):
+        search.reset_backend()
+        with mock.patch.object(search.FTS5SearchBackend, 'is_available', return_value=False):
+            self.assertEqual(search.get_backend().name, 'none')
+        self.assert_matches_icontains()
+
+    def test_index_follows_updates_and_bulk_inserts(self):
+        customer = Customer.objects.get(name="Bob")
+        customer.name = "Roberto"
+        customer.save()
+        schema.execute(
+            'mutation { bulkCreateCustomers(input: [{name: "Bobby Tables", email: "bt@example.com"}]) { errors } }',
+            context_value=SimpleNamespace(),
+        )
+        names = Customer.objects.filter(pk__in=search.contains(Customer, 'name', 'bob')).values_list('name', flat=True)
+        self.assertEqual(list(names), ["Bobby Tables"])
+
+    def test_filters_use_search(self):
+        order = Order.objects.create(customer=Customer.objects.get(name="Malia"))
+        product = Product.objects.create(name="Widget", price=Decimal('1.00'))
+        OrderItem.objects.create(order=order, product=product)
+        self.assertEqual(list(CustomerFilter({'email': 'EXAMPLE'}).qs.order_by('name').values_list('name', flat=True)),
+                         ["Alice", "Alicia Smith"])
+        self.assertEqual(list(OrderFilter({'customer_name': 'lia'}).qs), [order])
+        self.assertEqual(list(OrderFilter({'product_name': 'idge'}).qs), [order])
+        self.assertEqual(list(OrderFilter({'product_name': 'gadget'}).qs), [])
+
+    def test_ranked_search_argument(self):
+        query = 'query { allCustomers(search: "ali", first: 2) { edges { node { name } } pageInfo { hasNextPage endCursor } } }'
+        result = schema.execute(query, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        page = result.data['allCustomers']
+        self.assertEqual([edge['node']['name'] for edge in page['edges']], ["Alice", "Alicia Smith"])
+        rest = schema.execute(
+            'query($after: String) { allCustomers(search: "ali", after: $after) { edges { node { name } } } }',
+            variable_values={'after': page['pageInfo']['endCursor']},
+            context_value=SimpleNamespace(),
+        )
+        # Malia matches in the middle of the name, Bob only by email.
+        self.assertEqual([edge['node']['name'] for edge in rest.data['allCustomers']['edges']], ["Malia", "Bob"])
+
+
+class ExportTests(TestCase):
+    """
+    /export/<resource>/ streams filtered rows as NDJSON or CSV.
+    """
+
+    def get(self, resource, **params):
+        response = export(RequestFactory().get(f'/export/{resource}/', params), resource)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_orders_with_items(self):
+        orders = create_orders(5)
+        with CaptureQueriesContext(connection) as ctx:
+            with override_settings(CRM_EXPORT_CHUNK_SIZE=2):
+                body = self.get('orders')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [order.pk for order in orders])
+        self.assertEqual(len(rows[0]['items']), 2)
+        self.assertEqual(rows[0]['customer_name'], orders[0].customer.name)
+        self.assertEqual(rows[0]['total_amount'], '19.98')
+        # One orders query plus one OrderItem query per chunk of two orders.
+        self.assertEqual(len(ctx.captured_queries), 1 + 3)
+
+    def test_csv_uses_filters(self):
+        Customer.objects.create(name="Alice", email="alice@example.com")
+        Customer.objects.create(name="Bob", email="bob@example.com")
+        body = self.get('customers', format='csv', name='ali')
+        self.assertEqual(body.splitlines(), [
+            'id,name,email,phone,created_at',
+            f'{Customer.objects.get(name="Alice").pk},Alice,alice@example.com,,'
+            f'{Customer.objects.get(name="Alice").created_at.isoformat()}',
+        ])
+
+    def test_invalid_requests(self):
+        request = RequestFactory().get('/export/products/', {'price__gte': 'cheap'})
+        self.assertEqual(export(request, 'products').status_code, 400)
+        request = RequestFactory().get('/export/products/', {'format': 'xml'})
+        self.assertEqual(export(request, 'products').status_code, 400)
+
+
+class CRMReportTests(TestCase):
+    """
+    The report is aggregated in a fixed number of queries with exact totals.
+    """
+
+    def setUp(self):
+        self.now = datetime.datetime(2024, 3, 14, 12, tzinfo=datetime.timezone.utc)
+        ann = Customer.objects.create(name="Ann", email="ann@example.com")
+        bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        pen = Product.objects.create(name="Pen", price=Decimal('0.10'), stock=100)
+        pad = Product.objects.create(name="Pad", price=Decimal('19.99'), stock=100)
+        for days_ago, customer, lines in [
+            (0, ann, [(pen, 3)]),
+            (1, ann, [(pad, 1), (pen, 1)]),
+            (1, bob, [(pad, 2)]),
+            (30, bob, [(pad, 5)]),
+        ]:
+            order = Order.objects.create(
+                customer=customer,
+                order_date=self.now - datetime.timedelta(days=days_ago),
+                total_amount=sum(product.price * quantity for product, quantity in lines),
+            )
+            for product, quantity in lines:
+                OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=product.price)
+        # Orders created directly bypass the rollup hooks.
+        rebuild_rollups()
+
+    def test_report(self):
+        with CaptureQueriesContext(connection) as ctx:
+            report = generate_report(end=self.now + datetime.timedelta(hours=1))
+        # The partial first and last days are read from the orders.
+        self.assertEqual(len(ctx.captured_queries), 6)
+        self.assertEqual(report['total_orders'], 4)
+        self.assertEqual(report['total_revenue'], Decimal('160.32'))
+        self.assertEqual(report['period_orders'], 3)
+        self.assertEqual(report['period_revenue'], Decimal('60.37'))
+        self.assertEqual(report['average_order_value'], Decimal('20.12'))
+        self.assertEqual(
+            [(row['period'], row['orders'], row['revenue']) for row in report['daily']],
+            [(datetime.date(2024, 3, 13), 2, Decimal('60.07')), (datetime.date(2024, 3, 14), 1, Decimal('0.30'))],
+        )
+        self.assertEqual([row['period'] for row in report['weekly']], [datetime.date(2024, 3, 11)])
+        self.assertEqual([row['name'] for row in report['top_customers']], ["Bob", "Ann"])
+        self.assertEqual(
+            [(row['name'], row['quantity'], row['revenue']) for row in report['top_products']],
+            [("Pad", 3, Decimal('59.97')), ("Pen", 4, Decimal('0.40'))],
+        )
+
+    def test_period_is_exact(self):
+        midnight = datetime.datetime(2024, 3, 14, tzinfo=datetime.timezone.utc)
+        # Whole days only: the rollups answer, and the order on the end day is left out.
+        with CaptureQueriesContext(connection) as ctx:
+            report = generate_report(start=midnight - datetime.timedelta(days=7), end=midnight)
+        self.assertEqual(len(ctx.captured_queries), 5)
+        self.assertEqual(report['period_orders'], 2)
+        self.assertEqual(sum(row['orders'] for row in report['top_customers']), 2)
+        self.assertEqual([row['period'] for row in report['daily']], [datetime.date(2024, 3, 13)])
+
+        # A start after midnight leaves out the earlier orders of its day.
+        report = generate_report(
+            start=self.now - datetime.timedelta(hours=23), end=midnight + datetime.timedelta(days=1),
+        )
+        self.assertEqual(report['period_orders'], 1)
+        self.assertEqual(report['period_revenue'], Decimal('0.30'))
+        self.assertEqual(sum(row['orders'] for row in report['top_customers']), 1)
+
+    def test_crm_report_field(self):
+        result = schema.execute(
+            """
+            query($end: DateTime) {
+                crmReport(end: $end, top: 1) {
+                    totalCustomers periodRevenue
+                    daily { period orders revenue }
+                    topProducts { name quantity revenue }
+                }
+            }
+            """,
+            variable_values={'end': (self.now + datetime.timedelta(hours=1)).isoformat()},
+            context_value=SimpleNamespace(),
+        )
+        self.assertIsNone(result.errors)
+        report = result.data['crmReport']
+        self.assertEqual(report['totalCustomers'], 2)
+        self.assertEqual(report['periodRevenue'], '60.37')
+        self.assertEqual(report['daily'][0], {'period': '2024-03-13', 'orders': 2, 'revenue': '60.07'})
+        self.assertEqual(report['topProducts'], [{'name': 'Pad', 'quantity': 3, 'revenue': '59.97'}])
+
+
+class RollupTests(TestCase):
+    """
+    Order creation updates the rollups; rebuilding them gives the same rows.
+    """
+
+    def setUp(self):
+        self.ann = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.pen = Product.objects.create(name="Pen", price=Decimal('0.10'), stock=100)
+        self.pad = Product.objects.create(name="Pad", price=Decimal('19.99'), stock=100)
+
+    def snapshot(self):
+        return [
+            sorted(model.objects.values_list('pk', 'orders', 'units', 'revenue_cents'))
+            for model in (DailyStats, CustomerStats, ProductStats)
+        ]
+
+    def test_order_paths_update_rollups(self):
+        place_order(self.ann.pk, {self.pen.pk: 3, self.pad.pk: 1})
+        result = schema.execute(
+            'mutation($id: ID!) { bulkCreateOrders(input: [{customerId: $id, productIds: [%d, %d]}]) { errors } }'
+            % (self.pad.pk, self.pad.pk),
+            variable_values={'id': self.ann.pk},
+            context_value=SimpleNamespace(),
+        )
+        self.assertIsNone(result.errors)
+        stats = CustomerStats.objects.get(customer=self.ann)
+        self.assertEqual((stats.orders, stats.units, stats.revenue), (2, 6, Decimal('60.27')))
+        self.assertEqual(ProductStats.objects.get(product=self.pad).units, 3)
+        self.assertEqual(DailyStats.objects.get().orders, 2)
+
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(self.snapshot(), incremental)
+        today = timezone.localdate()
+        rebuild_rollups(today, today)
+        rebuild_rollups(today, today)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_customer_lifetime_value(self):
+        query = 'query($id: ID!) { customerLifetimeValue(customerId: $id) }'
+        result = schema.execute(query, variable_values={'id': self.ann.pk}, context_value=SimpleNamespace())
+        self.assertEqual(result.data['customerLifetimeValue'], '0.00')
+        place_order(self.ann.pk, {self.pad.pk: 2})
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(query, variable_values={'id': self.ann.pk}, context_value=SimpleNamespace())
+        self.assertEqual(result.data['customerLifetimeValue'], '39.98')
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+
+class CleanupInactiveCustomersTests(TestCase):
+    """
+    Inactive customers are found with one anti-join per batch and deleted set-wise.
+    """
+
+    def setUp(self):
+        isolate_job_log(self)
+        self.pen = Product.objects.create(name="Pen", price=Decimal('1.00'), stock=100)
+        self.active = Customer.objects.create(name="Active", email="active@example.com")
+        place_order(self.active.pk, {self.pen.pk: 1})
+        old = timezone.now() - datetime.timedelta(days=400)
+        for i in range(5):
+            customer = Customer.objects.create(name=f"Old {i}", email=f"old{i}@example.com")
+            if i % 2:
+                place_order(customer.pk, {self.pen.pk: 2}, order_date=old)
+        self.old_orders = Order.objects.filter(order_date__lt=timezone.now() - datetime.timedelta(days=365))
+
+    def test_dry_run_deletes_nothing(self):
+        totals = cleanup_inactive_customers(batch_size=2, dry_run=True)
+        self.assertEqual((totals['customers'], totals['orders'], totals['batches']), (5, 2, 3))
+        self.assertEqual(Customer.objects.count(), 6)
+
+    def test_batched_delete(self):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('cleanup_inactive_customers', batch_size=2, stdout=out)
+        self.assertEqual(list(Customer.objects.values_list('name', flat=True)), ["Active"])
+        self.assertFalse(self.old_orders.exists())
+        self.assertEqual(OrderItem.objects.count(), 1)
+        self.assertIn("Deleted 5 inactive customers (2 orders) in 3 batches", out.getvalue())
+        # One per batch plus the empty last page, and the re-check of each batch.
+        selects = [q for q in ctx.captured_queries if 'NOT EXISTS' in q['sql']]
+        self.assertEqual(len(selects), 7)
+        # The deleted orders are taken out of the rollups.
+        self.assertEqual(ProductStats.objects.get(product=self.pen).units, 1)
+        self.assertEqual(sum(DailyStats.objects.values_list('orders', flat=True)), 1)
+        run = [r for r in read_records('cleanup_inactive_customers') if r['event'] == 'run'][-1]
+        self.assertEqual(run['counts'], {'customers': 5, 'orders': 2, 'batches': 3})
+
+    def test_customer_ordering_during_cleanup_is_kept(self):
+        delete_batch = cleanup._delete_batch
+
+        def order_then_delete(ids, cutoff):
+            # A customer of the selected batch places an order meanwhile.
+            place_order(ids[0], {self.pen.pk: 1})
+            return delete_batch(ids, cutoff)
+
+        with mock.patch.object(cleanup, '_delete_batch', order_then_delete), \
+                mock.patch.object(cleanup, 'invalidate_models') as invalidate_models:
+            totals = cleanup_inactive_customers(batch_size=10)
+        self.assertEqual(totals['customers'], 4)
+        kept = Customer.objects.exclude(pk=self.active.pk).get()
+        self.assertEqual((kept.name, kept.orders.count()), ("Old 0", 1))
+        invalidate_models.assert_called_once_with(Customer, Order)
+
+
+class InProcessExecutorTests(TestCase):
+    """
+    Cron documents run against the schema directly, without an HTTP round trip.
+    """
+
+    def test_query_returns_data(self):
+        self.assertEqual(get_executor('inprocess').execute('{ hello }'), {'hello': "Hello, GraphQL!"})
+
+    def test_document_is_parsed_once(self):
+        executor = InProcessExecutor()
+        document_cache.clear()
+        executor.execute('{ hello }')
+        misses = document_cache.misses
+        executor.execute('{ hello }')
+        self.assertEqual(document_cache.misses, misses)
+
+    def test_errors_raise(self):
+        with self.assertRaises(GraphQLExecutionError) as ctx:
+            get_executor('inprocess').execute('{ nope }')
+        self.assertIn("nope", ctx.exception.errors[0])
+        with self.assertRaises(GraphQLExecutionError):
+            get_executor('inprocess').execute('{ customerLifetimeValue(customerId: 999) }')
+
+    def test_mutation(self):
+        Product.objects.create(name="Low", price=Decimal('1.00'), stock=2)
+        data = get_executor('inprocess').execute(
+            'mutation { updateLowStockProducts { updatedProducts { name stock } } }'
+        )
+        self.assertEqual(data['updateLowStockProducts']['updatedProducts'], [{'name': 'Low', 'stock': 12}])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            get_executor('carrier-pigeon')
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_executor', iterations=2, warmup=0, mode=['inprocess'], stdout=out)
+        self.assertIn("heartbeat", out.getvalue())
+        self.assertIn("recent_orders", out.getvalue())
+
+
+class RecordingSender:
+
+    def __init__(self, failures=0):
+        self.sent = []
+        self.failures = failures
+
+    def send(self, reminder):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("SMTP unavailable")
+        self.sent.append(reminder)
+
+
+class OrderReminderTests(TestCase):
+    """
+    Reminders are paged by email, sent once per customer and never resent.
+    """
+
+    def setUp(self):
+        isolate_job_log(self)
+        self.pen = Product.objects.create(name="Pen", price=Decimal('1.00'), stock=100)
+        self.now = timezone.now()
+        for i in range(5):
+            customer = Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com")
+            place_order(customer.pk, {self.pen.pk: 1}, order_date=self.now - datetime.timedelta(days=1))
+            if i % 2:
+                place_order(customer.pk, {self.pen.pk: 1}, order_date=self.now - datetime.timedelta(days=2))
+        old = Customer.objects.create(name="Old", email="old@example.com")
+        place_order(old.pk, {self.pen.pk: 1}, order_date=self.now - datetime.timedelta(days=30))
+        directory = tempfile.mkdtemp()
+        self.watermark = os.path.join(directory, 'watermark.json')
+
+    def send(self, sender, **options):
+        options = {'now': self.now, 'watermark': self.watermark, 'rate': 0, 'backoff': 0, 'batch_size': 2, **options}
+        return send_order_reminders(sender=sender, **options)
+
+    def test_one_reminder_per_customer(self):
+        sender = RecordingSender()
+        with CaptureQueriesContext(connection) as ctx:
+            totals = self.send(sender)
+        self.assertEqual((totals['customers'], totals['orders'], totals['sent'], totals['batches']), (5, 7, 5, 3))
+        self.assertEqual(sorted(r.email for r in sender.sent), [f"c{i}@example.com" for i in range(5)])
+        self.assertEqual(len(next(r for r in sender.sent if r.email == "c1@example.com").order_ids), 2)
+        # Two queries per page plus the empty last page.
+        self.assertEqual(len(ctx.captured_queries), 7)
+
+    def test_rerun_does_not_resend(self):
+        self.send(RecordingSender())
+        sender = RecordingSender()
+        self.assertEqual(self.send(sender, now=self.now + datetime.timedelta(hours=1))['sent'], 0)
+        customer = Customer.objects.get(email="c0@example.com")
+        place_order(customer.pk, {self.pen.pk: 1}, order_date=self.now + datetime.timedelta(minutes=90))
+        self.send(sender, now=self.now + datetime.timedelta(hours=2))
+        self.assertEqual([r.email for r in sender.sent], ["c0@example.com"])
+
+    def test_resumes_interrupted_run(self):
+        class Crash(Exception):
+            pass
+
+        def crash(totals):
+            if totals['batches'] == 1:
+                raise Crash()
+
+        with self.assertRaises(Crash):
+            send_order_reminders(
+                now=self.now, sender=RecordingSender(), progress=crash,
+                watermark=self.watermark, rate=0, batch_size=2,
+            )
+        sender = RecordingSender()
+        totals = self.send(sender)
+        self.assertEqual(sorted(r.email for r in sender.sent), [f"c{i}@example.com" for i in range(2, 5)])
+        self.assertEqual(totals['customers'], 3)
+
+    def test_retries_failed_sends(self):
+        sender = RecordingSender(failures=2)
+        totals = self.send(sender, workers=1, retries=2)
+        self.assertEqual((totals['sent'], totals['failed']), (5, 0))
+        sender = RecordingSender(failures=100)
+        totals = self.send(sender, retries=1, watermark=self.watermark + '2')
+        self.assertEqual(totals['failed'], 5)
+        self.assertIn("SMTP unavailable", totals['errors'][0])
+
+    def test_dry_run_command(self):
+        out = StringIO()
+        call_command('send_order_reminders', dry_run=True, watermark=self.watermark, stdout=out)
+        self.assertIn("for 7 orders to 5 customers", out.getvalue())
+        self.assertFalse(os.path.exists(self.watermark))
+
+    def test_file_sender_logs_under_the_run(self):
+        call_command('send_order_reminders', watermark=self.watermark, rate=0, stdout=StringIO())
+        records = list(read_records('send_order_reminders'))
+        reminders = [r for r in records if r['event'] == 'reminder']
+        run = records[-1]
+        self.assertEqual(len(reminders), 5)
+        self.assertEqual({r['run_id'] for r in reminders}, {run['run_id']})
+        self.assertEqual((run['status'], run['counts']['sent'], run['dry_run']), ('ok', 5, False))
+
+    def test_rate_limiter_spaces_calls(self):
+        limiter = RateLimiter(200)
+        started = time.monotonic()
+        for _ in range(5):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - started, 4 / 200)
+
+
+class AsyncExecutionTests(TestCase):
+    """
+    The async view resolves root fields with the async ORM and AsyncLoaders.
+    """
+
+    def setUp(self):
+        self.pen = Product.objects.create(name="Pen", price=Decimal('1.50'), stock=100)
+        self.ink = Product.objects.create(name="Ink", price=Decimal('4.00'), stock=100)
+        for i in range(3):
+            customer = Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com")
+            place_order(customer.pk, {self.pen.pk: 1, self.ink.pk: i + 1})
+
+    async def post(self, query, variables=None):
+        response = await self.async_client.post(
+            '/graphql/async/', {'query': query, 'variables': variables}, content_type='application/json',
+        )
+        return response.status_code, json.loads(response.content)
+
+    async def test_sibling_root_fields(self):
+        query = """
+            { customers { name } products { name }
+              orders { customer { name } items { quantity product { name } } } }
+        """
+        status, body = await self.post(query)
+        self.assertEqual(status, 200, body)
+        sync = await sync_to_async(schema.execute)(query, context_value=SimpleNamespace())
+        self.assertEqual(body['data'], sync.data)
+        self.assertEqual(len(body['data']['orders']), 3)
+
+    def test_batches_nested_relations(self):
+        with CaptureQueriesContext(connection) as ctx:
+            status, body = async_to_sync(self.post)('{ orders { customer { name } products { name } items { quantity } } }')
+        self.assertEqual(status, 200, body)
+        with CaptureQueriesContext(connection) as sync_ctx:
+            schema.execute(
+                '{ orders { customer { name } products { name } items { quantity } } }',
+                context_value=SimpleNamespace(),
+            )
+        self.assertEqual(len(ctx.captured_queries), len(sync_ctx.captured_queries))
+
+    def test_async_loader_batches_one_tick(self):
+        orders = list(Order.objects.order_by('pk'))
+        context = mark_async(SimpleNamespace())
+        info = SimpleNamespace(context=context)
+
+        async def load():
+            loaders = get_loaders(info)
+            futures = [loaders.customer.load(order.customer_id) for order in orders]
+            items = await loaders.order_items.load_many([order.pk for order in orders])
+            return [customer.name for customer in await asyncio.gather(*futures)], items
+
+        with CaptureQueriesContext(connection) as ctx:
+            names, items = async_to_sync(load)()
+        self.assertEqual(names, ["C0", "C1", "C2"])
+        self.assertEqual([len(lines) for lines in items], [2, 2, 2])
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    async def test_connections_and_lifetime_value(self):
+        customer = await Customer.objects.aget(name="C1")
+        status, body = await self.post("""
+            query ($id: ID!) {
+                allCustomers(first: 2, orderBy: "name") { edges { node { name } } pageInfo { hasNextPage } }
+                allOrders(first: 1, orderBy: "-total_amount") { edges { node { totalAmount customer { name } } } }
+                allProducts(search: "pen") { edges { node { name } } }
+                customerLifetimeValue(customerId: $id)
+                crmReport { totalOrders }
+            }
+        """, {'id': customer.pk})
+        self.assertEqual(status, 200, body)
+        data = body['data']
+        self.assertEqual([e['node']['name'] for e in data['allCustomers']['edges']], ["C0", "C1"])
+        self.assertTrue(data['allCustomers']['pageInfo']['hasNextPage'])
+        self.assertEqual(data['allOrders']['edges'][0]['node']['customer']['name'], "C2")
+        self.assertEqual([e['node']['name'] for e in data['allProducts']['edges']], ["Pen"])
+        self.assertEqual(Decimal(data['customerLifetimeValue']), Decimal('9.50'))
+        self.assertEqual(data['crmReport']['totalOrders'], 3)
+
+    async def test_errors_and_mutations(self):
+        status, body = await self.post('{ customerLifetimeValue(customerId: 999) }')
+        self.assertEqual(body['errors'][0]['message'], "Customer not found")
+        status, body = await self.post('mutation { updateLowStockProducts(threshold: 200) { message } }')
+        self.assertEqual(status, 200, body)
+        self.assertEqual(await Product.objects.filter(stock__gt=100).acount(), 2)
+
+
+class InstrumentationTests(TestCase):
+    """
+    Root fields are timed and charged with their SQL; tracing is opt-in per request.
+    """
+
+    def setUp(self):
+        pen = Product.objects.create(name="Pen", price=Decimal('1.00'), stock=5)
+        for i in range(2):
+            customer = Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com")
+            place_order(customer.pk, {pen.pk: 1})
+        metrics.clear()
+
+    def post(self, query, **headers):
+        request = RequestFactory().post(
+            '/graphql/', json.dumps({'query': query}), content_type='application/json', headers=headers,
+        )
+        return json.loads(CRMGraphQLView.as_view(schema=schema)(request).content)
+
+    def test_tracing_extension_on_request(self):
+        query = '{ customers { name } orders { customer { name } items { quantity } } }'
+        body = self.post(query)
+        self.assertNotIn('tracing', body['extensions'])
+
+        body = self.post(query, **{'X-CRM-Trace': '1'})
+        tracing = body['extensions']['tracing']
+        self.assertEqual(tracing['version'], 1)
+        paths = [resolver['path'] for resolver in tracing['execution']['resolvers']]
+        self.assertIn(['customers'], paths)
+        self.assertIn(['orders', 0, 'customer', 'name'], paths)
+        by_field = tracing['sql']['byField']
+        self.assertEqual(by_field['Query.customers']['count'], 1)
+        self.assertEqual(tracing['sql']['count'], by_field['Query.customers']['count'] + by_field['Query.orders']['count'])
+
+    def test_log_and_metrics(self):
+        with self.assertLogs('crm.graphql', 'INFO') as logs:
+            self.post('query Names { customers { name } products { name } }')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['operation'], "Names")
+        self.assertEqual(set(entry['fields']), {'Query.customers', 'Query.products'})
+        self.assertEqual(entry['fields']['Query.customers']['sql_queries'], 1)
+        self.assertEqual(metrics.get('crm_graphql_requests_total'), 1)
+        self.assertEqual(metrics.get('crm_graphql_sql_queries_total', field='Query.products'), 1)
+
+        self.post('mutation { updateLowStockProducts { message } }')
+        self.assertEqual(metrics.get('crm_graphql_field_calls_total', field='Mutation.updateLowStockProducts'), 1)
+        response = self.client.get('/metrics/')
+        self.assertContains(response, 'crm_graphql_field_calls_total{field="Query.customers"} 1')
+        self.assertContains(response, '# TYPE crm_graphql_requests_total counter')
+
+    def test_async_view_and_executor(self):
+        async def post():
+            return await self.async_client.post(
+                '/graphql/async/', {'query': '{ customers { name } orders { customer { name } } }'},
+                content_type='application/json', headers={'X-CRM-Trace': 'yes'},
+            )
+
+        body = json.loads(async_to_sync(post)().content)
+        self.assertGreaterEqual(body['extensions']['tracing']['sql']['byField']['Query.orders']['count'], 1)
+        get_executor('inprocess').execute('{ hello }')
+        self.assertEqual(metrics.get('crm_graphql_field_calls_total', field='Query.hello'), 1)
+        # Nothing is attributed once the operation is over.
+        Customer.objects.count()
+        self.assertEqual(metrics.get('crm_graphql_requests_total'), 2)
+
+
+@mock.patch.dict(bench_seed.SCALES, {'test': (30, 12, 40)})
+class BenchmarkSuiteTests(TestCase):
+    """
+    The benchmark suite seeds deterministic data and leaves it as it found it.
+    """
+
+    def test_seed_and_run(self):
+        bench_seed.seed_database('test', seed=1)
+        self.assertEqual(bench_seed.current_volumes(), (30, 12, 40))
+        self.assertEqual(DailyStats.objects.aggregate(total=Sum('orders'))['total'], 40)
+        stock = list(Product.objects.order_by('pk').values_list('stock', flat=True))
+
+        results = run_suite(
+            iterations={'all_orders': 3, 'bulk_create_customers': 2, 'create_order': 5, 'update_low_stock': 2},
+            scale='test', concurrency=1, bulk_rows=50,
+        )
+        self.assertEqual(results['meta']['volumes'], {'customers': 30, 'products': 12, 'orders': 40})
+        for name, figures in results['scenarios'].items():
+            self.assertEqual(figures['errors'], 0, figures['first_error'])
+            self.assertGreater(figures['sql_per_op'], 0)
+            self.assertGreater(figures['throughput'], 0)
+        self.assertEqual(results['scenarios']['create_order']['count'], 5)
+        self.assertEqual(bench_seed.current_volumes(), (30, 12, 40))
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('stock', flat=True)), stock)
+        self.assertEqual(DailyStats.objects.aggregate(total=Sum('orders'))['total'], 40)
+
+        slower = json.loads(json.dumps(results))
+        slower['scenarios']['all_orders']['p50_ms'] *= 2
+        rows = {(name, figure): change for name, figure, _, _, change in compare_results(results, slower)}
+        self.assertAlmostEqual(rows['all_orders', 'p50_ms'], -1.0)
+        self.assertEqual(rows['all_orders', 'sql_per_op'], 0)
+
+
+    def test_seed_is_reproducible(self):
+        def orders():
+            first = Customer.objects.order_by('pk').values_list('pk', flat=True).first()
+            return [
+                (customer_id - first, order_date, total)
+                for customer_id, order_date, total in Order.objects.order_by('pk').values_list(
+                    'customer_id', 'order_date', 'total_amount',
+                )
+            ]
+
+        bench_seed.seed_database('test', seed=7)
+        seeded = orders()
+        bench_seed.reset_database()
+        bench_seed.seed_database('test', seed=7)
+        self.assertEqual(orders(), seeded)
+        self.assertLessEqual(max(order_date for _, order_date, _ in seeded), bench_seed.REFERENCE_TIME)
+
+
+class SQLiteProductionModeTests(TestCase):
+    """
+    The production SQLite backend applies its pragmas and takes the write
+    lock up front; the router keeps mutations on the writer.
+    """
+
+    def test_backend(self):
+        path = os.path.join(tempfile.mkdtemp(), 'crm.sqlite3')
+        options = {'timeout': 1, 'pragmas': {'journal_mode': 'wal', 'synchronous': 'normal'}}
+        handler = ConnectionHandler({
+            'default': {'ENGINE': 'crm.backends.sqlite3', 'NAME': path,
+                       'OPTIONS': dict(options, transaction_mode='IMMEDIATE')},
+            'reader': {'ENGINE': 'crm.backends.sqlite3', 'NAME': path,
+                       'OPTIONS': dict(options, pragmas=dict(options['pragmas'], query_only='on'))},
+        })
+        try:
+            with handler['default'].cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)
+                cursor.execute('CREATE TABLE t (x integer)')
+            with CaptureQueriesContext(handler['default']) as queries:
+                # What transaction.atomic() runs to open the transaction.
+                handler['default']._start_transaction_under_autocommit()
+                handler['default'].cursor().execute('COMMIT')
+            self.assertEqual(queries.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+            with self.assertRaisesMessage(Exception, 'readonly'):
+                handler['reader'].cursor().execute('INSERT INTO t VALUES (2)')
+        finally:
+            handler.close_all()
+
+    @override_settings(DATABASE_ROUTERS=['crm.routers.ReadWriteRouter'])
+    def test_reads_in_transaction_stay_on_writer(self):
+        # TestCase runs every test inside a transaction on default.
+        with mock.patch.dict(settings.DATABASES, {'replica': settings.DATABASES['default']}):
+            self.assertEqual(router.db_for_read(Customer), 'default')
+
+
+@override_settings(DATABASE_ROUTERS=['crm.routers.ReadWriteRouter'])
+class ReadWriteRouterTests(SimpleTestCase):
+
+    def test_routing(self):
+        with mock.patch.dict(settings.DATABASES, {'replica': settings.DATABASES['default']}):
+            self.assertEqual(router.db_for_read(Customer), 'replica')
+            self.assertEqual(router.db_for_write(Customer), 'default')
+            with writer():
+                self.assertEqual(router.db_for_read(Customer), 'default')
+            self.assertEqual(router.db_for_read(Customer), 'replica')
+        self.assertFalse(ReadWriteRouter().allow_migrate('replica', 'crm'))
+        # Without a replica configured everything stays on default.
+        without_replica = {alias: config for alias, config in settings.DATABASES.items() if alias != 'replica'}
+        with mock.patch.dict(settings.DATABASES, without_replica, clear=True):
+            self.assertEqual(router.db_for_read(Customer), 'default')
+
+
+class HealthTests(TestCase):
+    """
+    /healthz and /readyz answer from cached checks without GraphQL.
+    """
+
+    def setUp(self):
+        health.clear()
+        self.addCleanup(health.clear)
+        self.cron_dir = tempfile.mkdtemp()
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen()
+        self.addCleanup(self.listener.close)
+        port = self.listener.getsockname()[1]
+        config = {'CRON_DIR': self.cron_dir, 'CRON_MAX_AGE': {'log_crm_heartbeat': 60}}
+        settings_override = override_settings(CRM_HEALTH=config, CELERY_BROKER_URL=f'redis://127.0.0.1:{port}/0')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_healthz_is_cached(self):
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['checks']['database']['status'], 'ok')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/healthz').json()['status'], 'ok')
+
+    def test_readyz(self):
+        body = self.client.get('/readyz').json()
+        self.assertEqual(body['status'], 'ok')
+        self.assertEqual(body['checks']['broker']['status'], 'ok')
+        self.assertEqual(body['checks']['cron']['jobs']['log_crm_heartbeat']['status'], 'unknown')
+
+        health.record_run('log_crm_heartbeat')
+        old = time.time() - 120
+        os.utime(os.path.join(self.cron_dir, 'log_crm_heartbeat'), (old, old))
+        health.clear()
+        body = self.client.get('/readyz').json()
+        self.assertEqual(body['status'], 'degraded')
+        self.assertEqual(body['checks']['cron']['jobs']['log_crm_heartbeat']['status'], 'stale')
+
+    def test_broker_down(self):
+        port = self.listener.getsockname()[1]
+        self.listener.close()
+        with override_settings(CELERY_BROKER_URL=f'redis://127.0.0.1:{port}/0'):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['broker']['status'], 'error')
+        # Liveness does not depend on the broker.
+        self.assertEqual(self.client.get('/healthz').status_code, 200)
+
+
+class JobLogTests(TestCase):
+    """
+    Job runs are logged as batched JSON lines, rotated and read back.
+    """
+
+    def setUp(self):
+        self.directory = isolate_job_log(self)
+
+    def test_run_records(self):
+        with job_run('nightly', dry_run=True) as run:
+            run.count('rows', 2)
+            run.count('rows')
+            run.log('step', table='crm_order')
+        with self.assertRaises(ValueError):
+            with job_run('nightly'):
+                raise ValueError("boom")
+
+        step, ok, failed = read_records('nightly')
+        self.assertEqual((step['event'], step['table'], step['run_id']), ('step', 'crm_order', ok['run_id']))
+        self.assertEqual((ok['status'], ok['counts'], ok['dry_run']), ('ok', {'rows': 3}, True))
+        self.assertGreaterEqual(ok['duration_ms'], 0)
+        self.assertEqual((failed['status'], failed['error']), ('error', 'boom'))
+        self.assertNotEqual(failed['run_id'], ok['run_id'])
+        # The run is recorded for the cron check of /readyz.
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'runs', 'nightly')))
+
+    def test_rotation(self):
+        with override_settings(CRM_JOB_LOG={'DIR': self.directory, 'MAX_BYTES': 300, 'BACKUP_COUNT': 2}):
+            for i in range(30):
+                emit('busy', 'tick', n=i)
+                get_writer().flush()
+            files = log_files('busy')
+            self.assertEqual(len(files), 3)
+            self.assertTrue(all(path.endswith('.gz') for path in files[:2]))
+            numbers = [record['n'] for record in read_records('busy')]
+            self.assertEqual(numbers, sorted(numbers))
+            self.assertEqual(numbers[-1], 29)
+            self.assertLess(len(numbers), 30)
+
+        with override_settings(CRM_JOB_LOG={'DIR': self.directory, 'ROTATE_SECONDS': 0}):
+            emit('daily', 'tick')
+            get_writer().flush()
+            emit('daily', 'tick')
+            get_writer().flush()
+            self.assertEqual(len(log_files('daily')), 2)
+
+    def test_command(self):
+        for fail in (False, False, True):
+            try:
+                with job_run('report') as run:
+                    run.count('orders', 10)
+                    if fail:
+                        raise RuntimeError("no database")
+            except RuntimeError:
+                pass
+        with job_run('heartbeat'):
+            pass
+
+        out = StringIO()
+        call_command('job_logs', summary=True, json=True, stdout=out)
+        summary = json.loads(out.getvalue())
+        self.assertEqual(sorted(summary), ['heartbeat', 'report'])
+        self.assertEqual((summary['report']['runs'], summary['report']['errors']), (3, 1))
+        self.assertEqual(summary['report']['counts'], {'orders': 30})
+        self.assertEqual(summary['report']['last_status'], 'error')
+
+        out = StringIO()
+        call_command('job_logs', job='report', status='error', since='1h', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn("report", lines[0])
+        self.assertIn("error", lines[0])
+        self.assertIn("no database", lines[0])
+
+        with self.assertRaises(CommandError):
+            call_command('job_logs', since='yesterday')
+
+
+class JobImportTests(SimpleTestCase):
+    """
+    Job modules import without setting Django up or loading heavy modules.
+    """
+
+    HEAVY_MODULES = ('requests', 'graphene', 'graphql', 'crm.models', 'alx_backend_graphql.schema')
+    HEAVY_PACKAGES = ('django.db.models', 'graphene', 'graphql', 'requests')
+
+    @staticmethod
+    def imported_below(importtime, parents):
+        """
+        Names of the modules ``python -X importtime`` reports as imported
+        (directly or not) by one of ``parents``.
+        """
+        # Each line comes after the modules it imported, indented deeper.
+        rows = []
+        for line in importtime.splitlines():
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            name = line.rsplit('|', 1)[1]
+            rows.append((len(name) - len(name.lstrip()), name.strip()))
+        below = set()
+        for index, (depth, name) in enumerate(rows):
+            if name not in parents:
+                continue
+            for child_depth, child in reversed(rows[:index]):
+                if child_depth <= depth:
+                    break
+                below.add(child)
+        return below
+
+    def test_import_is_side_effect_free(self):
+        # Checked on the import tree rather than a wall-clock budget, which
+        # would be flaky on busy machines.
+        code = (
+            "import sys\n"
+            "import crm.cron, crm.tasks\n"
+            "from django.apps import apps\n"
+            f"print(apps.ready, [name for name in {self.HEAVY_MODULES!r} if name in sys.modules])\n"
+        )
+        env = {key: value for key, value in os.environ.items() if key != 'DJANGO_SETTINGS_MODULE'}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "False []")
+        below = self.imported_below(result.stderr, {'crm.cron', 'crm.tasks'})
+        self.assertIn('crm.bootstrap', below)
+        heavy = sorted(
+            name for name in below
+            if any(name == package or name.startswith(package + '.') for package in self.HEAVY_PACKAGES)
+        )
+        self.assertEqual(heavy, [])
+
+    def test_warm_start_once_per_process(self):
+        with mock.patch.object(bootstrap, '_warm', False):
+            with override_settings(CRM_WORKER_WARM_START=False):
+                self.assertFalse(bootstrap.warm_start())
+            self.assertTrue(bootstrap.warm_start())
+            self.assertFalse(bootstrap.warm_start())
+        self.assertIn('crm.reports', sys.modules)
@@ -1,3 +1,169 @@
-from django.shortcuts import render
+"""
+Streaming exports of customers, products and orders.
 
-# Create your views here.
+``GET /export/<resource>/?format=ndjson|csv&<filters>`` streams every
+matching row without building the result in memory. Filters are the
+query-string form of ``CustomerFilter``, ``ProductFilter`` and
+``OrderFilter`` (e.g. ``?name=ali&created_at__gte=2024-01-01``).
+
+Rows are read with ``iterator(chunk_size=...)`` (a server-side cursor on
+PostgreSQL), order lines are fetched with one query per chunk of orders,
+and each chunk is encoded and handed to the ``StreamingHttpResponse``
+before the next one is read, so memory stays flat whatever the table size.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_safe
+
+from .filters import CustomerFilter, ProductFilter, OrderFilter
+from . import health
+from .instrumentation import metrics as graphql_metrics
+from .models import Customer, Product, Order, OrderItem
+
+DEFAULT_EXPORT_CHUNK_SIZE = 2000
+
+# resource: (model, filterset, exported columns); `a__b` is exported as `a_b`
+EXPORTS = {
+    'customers': (Customer, CustomerFilter, ['id', 'name', 'email', 'phone', 'created_at']),
+    'products': (Product, ProductFilter, ['id', 'name', 'description', 'price', 'stock', 'created_at']),
+    'orders': (Order, OrderFilter, [
+        'id', 'customer_id', 'customer__name', 'customer__email', 'total_amount', 'order_date',
+    ]),
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def get_export_chunk_size():
+    return getattr(settings, 'CRM_EXPORT_CHUNK_SIZE', DEFAULT_EXPORT_CHUNK_SIZE)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_rows(resource, queryset, chunk_size):
+    """
+    Yield lists of row dicts, one list per chunk of ``chunk_size`` rows.
+    Orders carry an ``items`` list of ``{product_id, quantity, unit_price}``.
+    """
+    columns = EXPORTS[resource][2]
+    names = [column.replace('__', '_') for column in columns]
+    rows = queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    for chunk in _chunks(rows, chunk_size):
+        chunk = [dict(zip(names, row)) for row in chunk]
+        if resource == 'orders':
+            items = {row['id']: [] for row in chunk}
+            lines = (
+                OrderItem.objects
+                .filter(order_id__in=list(items))
+                .order_by('order_id', 'pk')
+                .values_list('order_id', 'product_id', 'quantity', 'unit_price')
+            )
+            for order_id, product_id, quantity, unit_price in lines:
+                items[order_id].append({'product_id': product_id, 'quantity': quantity, 'unit_price': unit_price})
+            for row in chunk:
+                row['items'] = items[row['id']]
+        yield chunk
+
+
+def encode_ndjson(chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in chunk)
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the line instead of storing it.
+    """
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        # Order lines as product_id:quantity pairs
+        return ';'.join(f"{item['product_id']}:{item['quantity']}" for item in value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(chunks, header):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for chunk in chunks:
+        yield ''.join(writer.writerow([_csv_value(row[name]) for name in header]) for row in chunk)
+
+
+@require_GET
+def export(request, resource):
+    """
+    Stream ``resource`` as NDJSON (default) or CSV.
+    """
+    if resource not in EXPORTS:
+        raise Http404(f"Unknown export: {resource}")
+    model, filterset_class, columns = EXPORTS[resource]
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        return JsonResponse({'errors': {'format': [f"Unsupported format: {export_format}"]}}, status=400)
+
+    filterset = filterset_class(request.GET, queryset=model.objects.all())
+    if not filterset.is_valid():
+        return JsonResponse({'errors': filterset.errors}, status=400)
+    queryset = filterset.qs
+    if resource == 'orders':
+        queryset = queryset.distinct()
+
+    chunks = export_rows(resource, queryset, get_export_chunk_size())
+    if export_format == 'csv':
+        header = [column.replace('__', '_') for column in columns]
+        if resource == 'orders':
+            header.append('items')
+        content = encode_csv(chunks, header)
+    else:
+        content = encode_ndjson(chunks)
+
+    response = StreamingHttpResponse(content, content_type=FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{resource}.{export_format}"'
+    return response
+
+
+@require_GET
+def metrics(request):
+    """
+    GraphQL counters in the Prometheus text exposition format.
+    """
+    return HttpResponse(graphql_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _health_response(report):
+    return JsonResponse(report, status=503 if report['status'] == health.ERROR else 200)
+
+
+@require_safe
+def healthz(request):
+    """
+    Liveness: the process answers and reaches the database (see crm.health).
+    """
+    return _health_response(health.liveness())
+
+
+@require_safe
+def readyz(request):
+    """
+    Readiness: database, Celery broker and the age of the cron jobs.
+    """
+    return _health_response(health.readiness())